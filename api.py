@@ -1,13 +1,20 @@
-from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Header
+from pydantic import BaseModel, Field
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from core.chat_engine import ChatEngine
-from config import logger, validate_config
+from config import ADMIN_TOKEN, OVERLOAD_RESPONSE, OVERLOAD_RETRY_AFTER, logger, validate_config
+from utils.executors import shutdown_executors
+from utils.deadline import request_deadline
+import asyncio
+import hmac
 import os
+import json
 
 # Initialize Limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -39,6 +46,7 @@ chat_engine = ChatEngine()
 # Request model
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = Field(default=None, max_length=128)  # Keeps conversation context per visitor
 
 # Response model
 class ChatResponse(BaseModel):
@@ -59,27 +67,118 @@ async def startup_event():
     else:
         logger.error("❌ Failed to initialize chat engine")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release upstream connections and worker threads on shutdown"""
+    chat_engine.knowledge_base.stop_watching()
+    await chat_engine.response_generator.aclose()
+    shutdown_executors()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"status": "online", "service": "Alfred AI Assistant"}
 
+async def _admit(chat_request: ChatRequest):
+    """
+    Admission control: None when the request may go upstream
+    Otherwise the answer to serve without the LLM, or a 503 with Retry-After when there is none
+    """
+    if not chat_engine.is_overloaded():
+        return None
+    response = await chat_engine.aoverload_response(
+        chat_request.message, session_id=chat_request.session_id, fallback=OVERLOAD_RESPONSE == "fallback"
+    )
+    if response is not None:
+        return response
+    logger.warning("🚦 Upstream saturated, shedding request with 503")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service is busy, please retry shortly"},
+        headers={"Retry-After": str(OVERLOAD_RETRY_AFTER)}
+    )
+
 @app.post("/chat", response_model=ChatResponse)
 @limiter.limit("10/hour")
-async def chat(request: Request, chat_request: ChatRequest):
+async def chat(request: Request, chat_request: ChatRequest, x_request_timeout: Optional[float] = Header(default=None)):
     """
     Process a chat message and return the response
+    Answered within REQUEST_DEADLINE seconds, or the X-Request-Timeout header's (capped at REQUEST_DEADLINE_MAX)
     """
+    deadline = request_deadline(x_request_timeout)
     if not chat_request.message:
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
     try:
-        response = chat_engine.chat(chat_request.message)
+        # Shed load up front when upstream is saturated; fast rejection beats a slow timeout
+        response = await _admit(chat_request)
+        if isinstance(response, JSONResponse):
+            return response
+        if response is None:
+            response = await chat_engine.achat(
+                chat_request.message, session_id=chat_request.session_id, deadline=deadline
+            )
         return {"response": response}
     except Exception as e:
         logger.error(f"Error processing chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+@limiter.limit("10/hour")
+async def chat_stream(request: Request, chat_request: ChatRequest,
+                      x_request_timeout: Optional[float] = Header(default=None)):
+    """
+    Process a chat message and stream the response as Server-Sent Events
+    Each event carries {"token": "..."}; the stream ends with a "done" event
+    The same deadline as /chat applies to the whole stream
+    """
+    deadline = request_deadline(x_request_timeout)
+    if not chat_request.message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    # Decided before the stream starts, so a rejection is a real 503 rather than an SSE error event
+    shed_response = await _admit(chat_request)
+    if isinstance(shed_response, JSONResponse):
+        return shed_response
+    
+    async def event_stream():
+        try:
+            if shed_response is not None:
+                yield f"data: {json.dumps({'token': shed_response})}\n\n"
+            else:
+                async for piece in chat_engine.astream_chat(
+                    chat_request.message, session_id=chat_request.session_id, deadline=deadline
+                ):
+                    yield f"data: {json.dumps({'token': piece})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming chat: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/admin/reload")
+async def admin_reload(force: bool = False, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Rebuild the knowledge base from the current portfolio data and swap it in without downtime
+    Requires ADMIN_TOKEN to be configured and sent as the X-Admin-Token header
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    
+    # Build on a background thread (not the CPU pool) so chat traffic keeps its workers
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, lambda: chat_engine.knowledge_base.reload(force=force))
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return result
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -7,6 +7,7 @@ Main application with refined, clean UI
 import gradio as gr
 import requests
 import json
+import uuid
 from config import SERVER_PORT, SERVER_HOST, PERPLEXITY_API_KEY
 import os
 
@@ -20,10 +21,10 @@ def create_gradio_interface():
     Returns:
         gr.Blocks: Refined Gradio interface
     """
-    def respond(message, history):
+    def respond(message, history, session_id):
         """Handle user messages and generate responses via API"""
         try:
-            response = requests.post(API_URL, json={"message": message})
+            response = requests.post(API_URL, json={"message": message, "session_id": session_id})
             
             if response.status_code == 200:
                 bot_response = response.json().get("response", "Error: Empty response")
@@ -178,6 +179,9 @@ def create_gradio_interface():
         </div>
         """)
         
+        # One conversation session per browser tab, so the API keeps context per visitor
+        session_id = gr.State(lambda: uuid.uuid4().hex)
+        
         # Main chat interface
         with gr.Column(elem_classes="chat-container"):
             chatbot = gr.Chatbot(
@@ -213,14 +217,14 @@ def create_gradio_interface():
         """)
         
         # Event handlers
-        def send_message(message, history):
+        def send_message(message, history, session_id):
             if message.strip():
-                return respond(message, history)
+                return respond(message, history, session_id)
             return history, ""
         
-        msg.submit(send_message, [msg, chatbot], [chatbot, msg])
-        send_btn.click(send_message, [msg, chatbot], [chatbot, msg])
-        clear_btn.click(lambda: ([], ""), outputs=[chatbot, msg])
+        msg.submit(send_message, [msg, chatbot, session_id], [chatbot, msg])
+        send_btn.click(send_message, [msg, chatbot, session_id], [chatbot, msg])
+        clear_btn.click(lambda: ([], "", uuid.uuid4().hex), outputs=[chatbot, msg, session_id])
     
     return demo
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Vector index recall vs latency benchmark
+Builds each ANN index type over the same vectors and reports recall@k against exact
+(flat) search, per-query latency, build time and index size for a sweep of nprobe / efSearch
+
+Usage:
+    python benchmarks/bench_ann_recall.py [--size 200000] [--queries 1000] [--k 5]
+    python benchmarks/bench_ann_recall.py --index-dir index/   # use real document vectors
+"""
+
+import argparse
+import os
+import sys
+import time
+import faiss
+import numpy as np
+
+# Add parent directory to path to allow importing core modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.ann_index import build_ann_index, set_search_params
+from search.index_store import read_index_dir
+
+# Query-time settings swept per index type
+SWEEPS = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128)]
+}
+
+
+def clustered_vectors(n, dimension, rng, clusters=1000):
+    """Normalized float32 vectors drawn around random centres (closer to real embeddings than uniform noise)"""
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_vectors(args, rng):
+    """Corpus and query vectors, synthetic or from a saved index directory"""
+    if args.index_dir:
+        corpus = np.ascontiguousarray(read_index_dir(args.index_dir)["vectors"], dtype=np.float32)
+    else:
+        corpus = clustered_vectors(args.size, args.dimension, rng)
+
+    # Queries are perturbed corpus vectors, so each has real near neighbours
+    queries = corpus[rng.integers(0, len(corpus), args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return corpus, queries
+
+
+def time_queries(index, queries, k):
+    """(ids, per-query latencies in ms) searching one query at a time, as the API does"""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids[i] = index.search(query.reshape(1, -1), k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return ids, latencies
+
+
+def recall(found, truth):
+    """Mean fraction of the true top k that were returned"""
+    return np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", default=list(SWEEPS))
+    parser.add_argument("--index-dir", default=None, help="Benchmark the vectors of a saved index directory")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    corpus, queries = load_vectors(args, rng)
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, recall@{args.k}\n")
+
+    truth = faiss.IndexFlatIP(corpus.shape[1])
+    truth.add(corpus)
+    _, true_ids = truth.search(queries, args.k)
+
+    print(f"{'index':>9} {'setting':>14} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'size MB':>8}")
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = build_ann_index(corpus.copy(), index_type)
+        build_seconds = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 1024 / 1024
+
+        for params in SWEEPS[index_type]:
+            set_search_params(index, **params)
+            found, latencies = time_queries(index, queries, args.k)
+            setting = ", ".join(f"{name}={value}" for name, value in params.items()) or "exact"
+            print(f"{index_type:>9} {setting:>14} {recall(found, true_ids):>7.3f} "
+                  f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} "
+                  f"{build_seconds:>8.1f} {size_mb:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
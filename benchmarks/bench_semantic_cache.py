@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Semantic cache lookup benchmark
+Compares the brute-force matrix backend with the FAISS backend at growing cache sizes
+
+Usage:
+    python benchmarks/bench_semantic_cache.py [--sizes 1000 10000 100000] [--queries 500]
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Add parent directory to path to allow importing core modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import SemanticCache
+
+RESPONSE = "Surya is a Full Stack & GenAI Developer with experience in React, Node.js, Python and AWS."
+
+
+def random_unit_vectors(n, dimension, rng):
+    """Random L2-normalized float32 vectors"""
+    vectors = rng.standard_normal((n, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def bench_backend(backend, size, queries, rng):
+    """Fill a cache with `size` entries and time `queries` lookups (half hits, half misses)"""
+    cache = SemanticCache(max_dynamic_cache=size, backend=backend, persistent_path=None)
+    dimension = cache._embeddings.shape[1]
+    
+    # Bypass add_to_dynamic_cache's duplicate scan so filling stays O(n)
+    vectors = random_unit_vectors(size, dimension, rng)
+    for i in range(size):
+        cache._insert(f"cached question {i}", vectors[i], RESPONSE)
+    
+    hits = vectors[rng.integers(0, size, queries // 2)]
+    misses = random_unit_vectors(queries - len(hits), dimension, rng)
+    probes = np.vstack([hits, misses])
+    
+    latencies = []
+    found = 0
+    for vector in probes:
+        start = time.perf_counter()
+        slot, similarity = cache._best_dynamic_slot(vector)
+        latencies.append(time.perf_counter() - start)
+        found += similarity >= cache.similarity_threshold
+    
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": np.percentile(latencies, 50),
+        "p99_ms": np.percentile(latencies, 99),
+        "hit_rate": found / len(probes)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(42)
+    
+    print(f"{'entries':>10} {'backend':>8} {'p50 ms':>9} {'p99 ms':>9} {'hit rate':>9}")
+    for size in args.sizes:
+        for backend in ("matrix", "faiss"):
+            result = bench_backend(backend, size, args.queries, rng)
+            print(f"{size:>10} {backend:>8} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['hit_rate']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
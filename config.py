@@ -47,24 +47,130 @@ def validate_config():
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-FAISS_INDEX_PATH = os.path.join(BASE_DIR, "faiss_index.bin")
-FAISS_DATA_PATH = os.path.join(BASE_DIR, "faiss_data.pkl")
+# Memory-mapped index directory (vectors, document blob, metadata; see search/index_store.py)
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join(BASE_DIR, "index"))
+# Seconds between checks of data/portfolio_data.py for changes (0 = only reload via /admin/reload)
+KB_WATCH_INTERVAL = float(os.getenv("KB_WATCH_INTERVAL", "0"))
+# Embeddings of indexed documents keyed by content hash, reused by incremental rebuilds
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(BASE_DIR, "embedding_cache.npz"))
+RERANK_KEYWORDS_PATH = os.getenv("RERANK_KEYWORDS_PATH", os.path.join(BASE_DIR, "data", "rerank_keywords.json"))
 
 # Models
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_LRU_SIZE = int(os.getenv("EMBEDDING_LRU_SIZE", "1024"))
 PERPLEXITY_MODEL = os.getenv("PERPLEXITY_MODEL", "sonar")
 
 # API Keys
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # Enables admin endpoints (sent as X-Admin-Token)
+
+# Upstream HTTP client (pooled, keep-alive)
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "20"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "10"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "60"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() == "true"
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "30"))
+
+# Upstream resilience: retries with jittered backoff, a retry budget and a circuit breaker
+UPSTREAM_MAX_ATTEMPTS = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))  # Seconds; doubles per attempt
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))  # Retries allowed per request in the window
+RETRY_BUDGET_MIN_RETRIES = int(os.getenv("RETRY_BUDGET_MIN_RETRIES", "3"))  # Always allowed per window
+RETRY_BUDGET_WINDOW = float(os.getenv("RETRY_BUDGET_WINDOW", "10"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # Consecutive failures that open the circuit
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))  # Seconds before probing upstream again
+
+# Hedged upstream requests: a second identical call once the first exceeds the rolling latency percentile
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))  # Most hedges per request over HEDGE_WINDOW
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # Latency samples needed before hedging
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.25"))
+HEDGE_WINDOW = float(os.getenv("HEDGE_WINDOW", "60"))
+
+# Upstream bulkhead and API admission control
+UPSTREAM_MAX_CONCURRENT = int(os.getenv("UPSTREAM_MAX_CONCURRENT", "8"))  # Upstream calls in flight per worker
+UPSTREAM_QUEUE_SIZE = int(os.getenv("UPSTREAM_QUEUE_SIZE", "32"))  # Calls allowed to wait for a slot
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "10"))  # Seconds a call may wait for a slot
+OVERLOAD_RESPONSE = os.getenv("OVERLOAD_RESPONSE", "reject")  # When saturated: "reject" (503) or "fallback" (answer from context)
+OVERLOAD_RETRY_AFTER = int(os.getenv("OVERLOAD_RETRY_AFTER", "5"))  # Retry-After seconds on a 503
+
+# End-to-end request deadline (clients may ask for another with the X-Request-Timeout header)
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))  # Seconds per chat request (0 = no deadline)
+REQUEST_DEADLINE_MAX = float(os.getenv("REQUEST_DEADLINE_MAX", "120"))  # Longest deadline a client may ask for
 
 # Server Settings
 SERVER_PORT = int(os.getenv("SERVER_PORT", 7871))
 SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
 
+# Threads for CPU-bound stages (embedding, FAISS, cache) in the async pipeline
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+RETRIEVAL_EXECUTOR_WORKERS = int(os.getenv("RETRIEVAL_EXECUTOR_WORKERS", "8"))
+
+# Offline index build (build-index command)
+INDEX_BUILD_WORKERS = int(os.getenv("INDEX_BUILD_WORKERS", str(min(4, os.cpu_count() or 1))))  # Encoder processes
+INDEX_BUILD_BATCH_SIZE = int(os.getenv("INDEX_BUILD_BATCH_SIZE", "256"))  # Documents per encode call
+
+# Vector index type ("auto", "flat", "ivf_flat", "ivf_pq" or "hnsw"); see search/ann_index.py
+ANN_INDEX_TYPE = os.getenv("ANN_INDEX_TYPE", "auto")
+ANN_FLAT_MAX_DOCS = int(os.getenv("ANN_FLAT_MAX_DOCS", "50000"))  # "auto" keeps exact search up to this size
+ANN_MEMORY_BUDGET_MB = float(os.getenv("ANN_MEMORY_BUDGET_MB", "1024"))  # "auto" picks the best index that fits
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # IVF clusters (0 = about 4 * sqrt(n))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))  # IVF clusters scanned per query
+ANN_PQ_M = int(os.getenv("ANN_PQ_M", "16"))  # IVF-PQ sub-quantizers (bytes per vector)
+ANN_HNSW_M = int(os.getenv("ANN_HNSW_M", "32"))
+ANN_HNSW_EF_CONSTRUCTION = int(os.getenv("ANN_HNSW_EF_CONSTRUCTION", "200"))
+ANN_HNSW_EF_SEARCH = int(os.getenv("ANN_HNSW_EF_SEARCH", "64"))
+
 # Search Parameters
 SEARCH_TOP_K = 3
 SEARCH_SCORE_THRESHOLD = 0.5
 
+# Document chunking (characters; chunks end on sentence boundaries where possible)
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "400"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "80"))  # Trailing text repeated at the start of the next chunk
+
+# Keyword search (BM25)
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+KEYWORD_FIELD_BOOST = float(os.getenv("KEYWORD_FIELD_BOOST", "2.0"))  # Weight of metadata keywords vs body text
+
+# Hybrid retrieval and fusion
+HYBRID_CONCURRENT = os.getenv("HYBRID_CONCURRENT", "true").lower() == "true"  # Run retrievers in parallel
+RETRIEVER_TIMEOUT = float(os.getenv("RETRIEVER_TIMEOUT", "2.0"))  # Seconds before a retriever is skipped
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "5"))  # Candidates per retriever (0 = same as k)
+FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")  # "rrf" or "weighted"
+RRF_K = int(os.getenv("RRF_K", "60"))
+FUSION_VECTOR_WEIGHT = float(os.getenv("FUSION_VECTOR_WEIGHT", "1.0"))
+FUSION_KEYWORD_WEIGHT = float(os.getenv("FUSION_KEYWORD_WEIGHT", "1.0"))
+# Restrict retrieval to the categories matching the query intent: "off", "soft" (boost) or "hard" (only those)
+INTENT_FILTER_MODE = os.getenv("INTENT_FILTER_MODE", "off")
+FUSION_INTENT_WEIGHT = float(os.getenv("FUSION_INTENT_WEIGHT", "1.0"))  # Weight of the intent-filtered retriever in "soft" mode
+
+# Semantic Cache
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+SEMANTIC_CACHE_BACKEND = os.getenv("SEMANTIC_CACHE_BACKEND", "matrix")  # "matrix" or "faiss"
+SEMANTIC_CACHE_HNSW_THRESHOLD = int(os.getenv("SEMANTIC_CACHE_HNSW_THRESHOLD", "20000"))
+SEMANTIC_CACHE_HNSW_M = int(os.getenv("SEMANTIC_CACHE_HNSW_M", "32"))
+SEMANTIC_CACHE_HNSW_EF_SEARCH = int(os.getenv("SEMANTIC_CACHE_HNSW_EF_SEARCH", "64"))
+# Shared on-disk tier (set to an empty string to keep the cache in memory only)
+SEMANTIC_CACHE_DB_PATH = os.getenv("SEMANTIC_CACHE_DB_PATH", os.path.join(BASE_DIR, "semantic_cache.db"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+SEMANTIC_CACHE_SYNC_INTERVAL = float(os.getenv("SEMANTIC_CACHE_SYNC_INTERVAL", "5"))
+
+# Request coalescing: concurrent matching questions wait for one answer instead of each calling upstream
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "30"))  # Seconds before a follower answers on its own
+
+# Conversation Sessions
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "5"))
+SESSION_MAX_TOKENS = int(os.getenv("SESSION_MAX_TOKENS", "1500"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_TOTAL_TOKENS = int(os.getenv("SESSION_MAX_TOTAL_TOKENS", "5000000"))
+
 # Generation Parameters
 MAX_TOKENS = 500
 MAX_RESPONSE_TOKENS = 500
@@ -4,10 +4,17 @@ Orchestrates the conversation flow with caching and greeting detection
 """
 
 from core.knowledge_base import KnowledgeBase
+from core.session_store import SessionStore
 from llm.response_generator import ResponseGenerator
-from config import logger
-from utils.query_expander import expand_query, classify_query_intent
+from llm.resilience import DegradedResponse
+from config import INTENT_FILTER_MODE, SINGLE_FLIGHT_ENABLED, SINGLE_FLIGHT_WAIT_TIMEOUT, logger
+from utils.query_expander import expand_query, classify_query_intent, intent_filters
 from utils.cache import SemanticCache, is_greeting_only, get_greeting_response
+from utils.embedding_registry import get_registry_stats
+from utils.embedding_context import EmbeddingContext, get_embedding_lru
+from utils.executors import run_in_cpu_executor
+from utils.single_flight import SingleFlight, history_scope
+from utils.deadline import DeadlineExceeded, cap_timeout, request_deadline
 
 
 class ChatEngine:
@@ -18,22 +25,39 @@ class ChatEngine:
         self.knowledge_base = KnowledgeBase()
         self.response_generator = ResponseGenerator()
         self.semantic_cache = SemanticCache()
-        self.history = []  # Store conversation history
-        self.max_history = 5  # Keep last 5 turns
+        self.sessions = SessionStore()  # Conversation history per client session
         self.is_ready = False
+        
+        # Concurrent matching questions share one answer (same similarity bar as the cache)
+        self.single_flight = SingleFlight(self.semantic_cache.similarity_threshold) if SINGLE_FLIGHT_ENABLED else None
+        
+        # Learned answers are only valid for the knowledge base version they came from
+        self.knowledge_base.add_reload_listener(self.semantic_cache.set_kb_version)
     
     def initialize(self):
         """Initialize the chat engine"""
         if not self.knowledge_base.initialize():
             logger.error("Failed to initialize knowledge base")
             return False
+        
+        # Reload on portfolio edits when KB_WATCH_INTERVAL is set
+        self.knowledge_base.start_watching()
             
         self.is_ready = True
         logger.info("Chat engine initialized successfully")
         return True
     
-    def chat(self, message):
-        """Process a chat message and generate response"""
+    def chat(self, message, session_id=None, deadline=None):
+        """
+        Process a chat message and generate response
+        
+        Args:
+            message: User's message
+            session_id: Client session whose history gives context (None = stateless)
+            deadline: Request Deadline bounding every stage (None = REQUEST_DEADLINE from now);
+                when it runs out the answer is built from the retrieved context
+        """
+        deadline = deadline or request_deadline()
         if not self.is_ready:
             return "I'm not ready yet. Please wait for initialization to complete."
         
@@ -42,45 +66,308 @@ class ChatEngine:
             logger.info("🎯 Greeting detected - returning instant response")
             return get_greeting_response()
         
+        # One embedding context per request so each string is encoded at most once
+        embeddings = EmbeddingContext()
+        kb_version = self.knowledge_base.version
+        
         # Check semantic cache
-        cached_response = self.semantic_cache.get_cached_response(message)
+        cached_response = self.semantic_cache.get_cached_response(message, embeddings=embeddings)
         if cached_response:
             return cached_response
         
-        # Expand query for better search results using history
-        expanded_query = expand_query(message, self.history)
-        query_intent = classify_query_intent(message)
+        # The same question already being answered: wait for that answer instead of repeating the work
+        flight, leader = self._join_flight(message, session_id, embeddings, kb_version)
+        if not leader:
+            response = flight.result(cap_timeout(deadline, SINGLE_FLIGHT_WAIT_TIMEOUT))
+            if response is not None:
+                self._record_turn(session_id, message, response)
+                return response
         
-        logger.info(f"Original query: {message}")
-        logger.info(f"Expanded query: {expanded_query}")
-        logger.info(f"Query intent: {query_intent}")
+        response = None
+        try:
+            response = self._answer(message, session_id, embeddings, kb_version, deadline)
+            return response
+        finally:
+            if leader and flight is not None:
+                self.single_flight.complete(flight, response)
+    
+    def _answer(self, message, session_id, embeddings, kb_version, deadline=None):
+        """Retrieval and generation for a message that missed the cache"""
+        if self._deadline_passed(deadline):
+            return self._get_fallback_response([])
+        
+        # Expand query for better search results using history
+        history = self._get_history(session_id)
+        expanded_query, filters = self._expand_query(message, history)
         
-        # Search for relevant contexts (optimized k value after re-ranking improvements)
-        contexts = self.knowledge_base.search(expanded_query, k=10)
+        # Search for relevant contexts (the prompt uses the top 5, so fused search needs no more)
+        contexts = self.knowledge_base.search(
+            expanded_query, k=5, embeddings=embeddings, filters=filters, deadline=deadline
+        )
         
         if not contexts:
-            return "I don't have enough information to answer that question about Surya's portfolio. Please try asking about his skills, experience, projects, education, or contact information."
+            return self._get_no_context_response()
         
         # Generate response using LLM with history
         try:
-            response = self.response_generator.generate_response(message, contexts, history=self.history)
+            response = self.response_generator.generate_response(message, contexts, history=history, deadline=deadline)
             
             # Add to dynamic cache for future use
-            self.semantic_cache.add_to_dynamic_cache(message, response)
+            self.semantic_cache.add_to_dynamic_cache(message, response, embeddings=embeddings, kb_version=kb_version)
             
-            # Update history
-            self.history.append({"role": "user", "content": message})
-            self.history.append({"role": "assistant", "content": response})
+            self._record_turn(session_id, message, response)
+            return response
+        except DegradedResponse as e:
+            logger.warning(f"⚡ {e}, not caching the answer")
+            return e.text
+        except DeadlineExceeded as e:
+            logger.warning(f"⏳ {e}, answering from context")
+            return self._get_fallback_response(contexts)
+        except Exception as e:
+            logger.error(f"Response generation failed: {e}")
+            return self._get_fallback_response(contexts)
+    
+    async def achat(self, message, session_id=None, deadline=None):
+        """
+        Async version of chat for the API
+        CPU-bound stages run on the shared executor and the upstream call is non-blocking,
+        so one slow request never stalls the event loop
+        """
+        deadline = deadline or request_deadline()
+        kb_version = self.knowledge_base.version
+        instant_response, embeddings = await self._acheck_instant(message)
+        if instant_response is not None:
+            return instant_response
+        
+        flight, leader = self._join_flight(message, session_id, embeddings, kb_version)
+        if not leader:
+            response = await flight.async_result(cap_timeout(deadline, SINGLE_FLIGHT_WAIT_TIMEOUT))
+            if response is not None:
+                self._record_turn(session_id, message, response)
+                return response
+        
+        response = None
+        try:
+            response = await self._aanswer(message, session_id, embeddings, kb_version, deadline)
+            return response
+        finally:
+            if leader and flight is not None:
+                self.single_flight.complete(flight, response)
+    
+    async def _aanswer(self, message, session_id, embeddings, kb_version, deadline=None):
+        """Async retrieval and generation for a message that missed the cache"""
+        no_context_response, history, contexts = await self._aretrieve(message, session_id, embeddings, deadline)
+        if no_context_response is not None:
+            return no_context_response
+        
+        # Generate response using LLM with history
+        try:
+            response = await self.response_generator.agenerate_response(
+                message, contexts, history=history, deadline=deadline
+            )
             
-            # Trim history if needed
-            if len(self.history) > self.max_history * 2:
-                self.history = self.history[-self.max_history * 2:]
+            # Add to dynamic cache for future use
+            await run_in_cpu_executor(
+                self.semantic_cache.add_to_dynamic_cache, message, response,
+                embeddings=embeddings, kb_version=kb_version
+            )
             
+            self._record_turn(session_id, message, response)
             return response
+        except DegradedResponse as e:
+            logger.warning(f"⚡ {e}, not caching the answer")
+            return e.text
+        except DeadlineExceeded as e:
+            logger.warning(f"⏳ {e}, answering from context")
+            return self._get_fallback_response(contexts)
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
             return self._get_fallback_response(contexts)
     
+    async def astream_chat(self, message, session_id=None, deadline=None):
+        """
+        Stream the answer to a chat message as text pieces
+        Instant answers, and answers shared from a matching in-flight request, arrive as one piece
+        """
+        deadline = deadline or request_deadline()
+        kb_version = self.knowledge_base.version
+        instant_response, embeddings = await self._acheck_instant(message)
+        if instant_response is not None:
+            yield instant_response
+            return
+        
+        flight, leader = self._join_flight(message, session_id, embeddings, kb_version)
+        if not leader:
+            response = await flight.async_result(cap_timeout(deadline, SINGLE_FLIGHT_WAIT_TIMEOUT))
+            if response is not None:
+                self._record_turn(session_id, message, response)
+                yield response
+                return
+        
+        # Followers only get the answer if the stream completes (not if the client goes away)
+        response = None
+        try:
+            no_context_response, history, contexts = await self._aretrieve(message, session_id, embeddings, deadline)
+            if no_context_response is not None:
+                response = no_context_response
+                yield response
+                return
+            
+            pieces = []
+            try:
+                async for piece in self.response_generator.astream_response(
+                    message, contexts, history=history, deadline=deadline
+                ):
+                    pieces.append(piece)
+                    yield piece
+            except DegradedResponse as e:
+                # Shown, and shared with followers, but never cached
+                logger.warning(f"⚡ {e}, not caching the answer")
+                response = e.text
+                yield response
+                return
+            except Exception as e:
+                if isinstance(e, DeadlineExceeded):
+                    logger.warning(f"⏳ {e}, ending the stream")
+                else:
+                    logger.error(f"Response streaming failed: {e}")
+                if not pieces:
+                    response = self._get_fallback_response(contexts)
+                    yield response
+                return
+            
+            # Cache and remember the full answer once the stream has finished
+            response = "".join(pieces)
+            await run_in_cpu_executor(
+                self.semantic_cache.add_to_dynamic_cache, message, response,
+                embeddings=embeddings, kb_version=kb_version
+            )
+            self._record_turn(session_id, message, response)
+        finally:
+            if leader and flight is not None:
+                self.single_flight.complete(flight, response)
+    
+    async def _acheck_instant(self, message):
+        """
+        Front of the async pipeline: readiness, greeting and cache
+        
+        Returns:
+            (instant_response, embeddings) where instant_response is set when the message can be
+            answered without retrieval or the LLM
+        """
+        if not self.is_ready:
+            return "I'm not ready yet. Please wait for initialization to complete.", None
+        
+        # Check for greeting only
+        if is_greeting_only(message):
+            logger.info("🎯 Greeting detected - returning instant response")
+            return get_greeting_response(), None
+        
+        # One embedding context per request so each string is encoded at most once
+        embeddings = EmbeddingContext()
+        
+        # Check semantic cache
+        cached_response = await run_in_cpu_executor(
+            self.semantic_cache.get_cached_response, message, embeddings=embeddings
+        )
+        return cached_response, embeddings
+    
+    def is_overloaded(self):
+        """Whether the upstream bulkhead would turn a new LLM call away right now"""
+        return self.response_generator.bulkhead.is_full()
+    
+    async def aoverload_response(self, message, session_id=None, fallback=False):
+        """
+        Answer without the LLM while upstream is saturated
+        
+        Returns:
+            An instant or cached answer, else (with fallback) one built from retrieved context;
+            None when the request should be rejected
+        """
+        instant_response, embeddings = await self._acheck_instant(message)
+        if instant_response is not None or not fallback:
+            return instant_response
+        
+        logger.warning("🚦 Upstream saturated, answering from context")
+        no_context_response, _, contexts = await self._aretrieve(message, session_id, embeddings)
+        return no_context_response or self._get_fallback_response(contexts)
+    
+    async def _aretrieve(self, message, session_id, embeddings, deadline=None):
+        """
+        Async retrieval for a message that missed the cache
+        
+        Returns:
+            (no_context_response, history, contexts) where no_context_response is set when
+            nothing relevant was found or the deadline passed before retrieval
+        """
+        if self._deadline_passed(deadline):
+            return self._get_fallback_response([]), [], []
+        
+        # Expand query for better search results using history
+        history = self._get_history(session_id)
+        expanded_query, filters = self._expand_query(message, history)
+        
+        # Search for relevant contexts
+        contexts = await run_in_cpu_executor(
+            self.knowledge_base.search, expanded_query, k=5, embeddings=embeddings, filters=filters, deadline=deadline
+        )
+        
+        if not contexts:
+            return self._get_no_context_response(), history, contexts
+        
+        return None, history, contexts
+    
+    def _deadline_passed(self, deadline):
+        """Whether the request's deadline ran out before retrieval could start"""
+        if deadline is None or not deadline.expired():
+            return False
+        logger.warning(f"⏳ {deadline.seconds:.1f}s request deadline passed before retrieval")
+        return True
+    
+    def _join_flight(self, message, session_id, embeddings, kb_version):
+        """
+        (flight, is_leader) for a cache miss; every request leads when coalescing is off
+        Only requests with the same conversation history share an answer, so one visitor's
+        conversation never shapes another's reply
+        """
+        if self.single_flight is None:
+            return None, True
+        scope = (kb_version, history_scope(self._get_history(session_id)))
+        return self.single_flight.join(message, embeddings.embed(message), scope=scope)
+    
+    def _expand_query(self, message, history):
+        """
+        Expand the query with history and log how it was interpreted
+        
+        Returns:
+            (expanded_query, filters) where filters restrict search to the intent's categories
+            (None unless INTENT_FILTER_MODE is enabled)
+        """
+        expanded_query = expand_query(message, history)
+        query_intent = classify_query_intent(message)
+        
+        logger.info(f"Original query: {message}")
+        logger.info(f"Expanded query: {expanded_query}")
+        logger.info(f"Query intent: {query_intent}")
+        
+        filters = intent_filters(query_intent) if INTENT_FILTER_MODE != "off" else None
+        return expanded_query, filters
+    
+    def _get_history(self, session_id):
+        """Conversation history for a session (empty for stateless requests)"""
+        if session_id is None:
+            return []
+        return list(self.sessions.get_history(session_id))
+    
+    def _record_turn(self, session_id, message, response):
+        """Append a turn to the session's history (no-op for stateless requests)"""
+        if session_id is not None:
+            self.sessions.append_turn(session_id, message, response)
+    
+    def _get_no_context_response(self):
+        """Response when the knowledge base has nothing relevant"""
+        return "I don't have enough information to answer that question about Surya's portfolio. Please try asking about his skills, experience, projects, education, or contact information."
+    
     def _get_fallback_response(self, contexts):
         """Generate a fallback response when LLM fails"""
         if contexts:
@@ -91,5 +378,10 @@ class ChatEngine:
         """Get chat engine status"""
         return {
             "ready": self.is_ready,
-            "knowledge_base": self.knowledge_base.get_status()
+            "knowledge_base": self.knowledge_base.get_status(),
+            "embedding_models": get_registry_stats(),
+            "embedding_lru": get_embedding_lru().get_stats(),
+            "sessions": self.sessions.get_stats(),
+            "upstream": self.response_generator.get_upstream_stats(),
+            "single_flight": self.single_flight.get_stats() if self.single_flight else None
         }
\ No newline at end of file
@@ -3,10 +3,13 @@ Knowledge base management for Boku AI Assistant
 Optimized for efficiency
 """
 
+import importlib
 import os
-from data.portfolio_data import get_portfolio_data
+import threading
+from data import portfolio_data
 from search.hybrid_search import HybridSearch
-from config import FAISS_INDEX_PATH, FAISS_DATA_PATH, logger
+from search.embedding_cache import portfolio_fingerprint
+from config import INDEX_DIR, KB_WATCH_INTERVAL, INTENT_FILTER_MODE, logger
 
 
 class KnowledgeBase:
@@ -16,46 +19,168 @@ class KnowledgeBase:
         """Initialize the knowledge base"""
         self.search_engine = HybridSearch()
         self.is_initialized = False
+        self.version = None  # Content fingerprint of the live index
+        self.generation = 0  # Bumped every time a new index is swapped in
+        
+        self._reload_lock = threading.Lock()
+        self._listeners = []  # Called with the new version after every swap
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
     
     def initialize(self):
         """Initialize the knowledge base"""
         try:
-            # Check if index files exist
-            if os.path.exists(FAISS_INDEX_PATH) and os.path.exists(FAISS_DATA_PATH):
-                # Load existing index
-                self.search_engine.initialize(
-                    faiss_index_path=FAISS_INDEX_PATH,
-                    data_path=FAISS_DATA_PATH
-                )
-                logger.info("✅ Loaded existing knowledge base")
+            # Load the saved index if there is one; it is rebuilt (re-embedding only
+            # changed documents) when it no longer matches the portfolio data
+            engine, rebuilt = self._build_engine(portfolio_data.get_portfolio_data())
+            
+            if rebuilt:
+                self._save(engine)
+                logger.info("✅ Built knowledge base")
             else:
-                # Create new index from portfolio data
-                portfolio_data = get_portfolio_data()
-                self.search_engine.initialize(portfolio_data=portfolio_data)
-                self.search_engine.save_index(FAISS_INDEX_PATH, FAISS_DATA_PATH)
-                logger.info("✅ Created new knowledge base")
+                logger.info("✅ Loaded existing knowledge base")
             
+            self._swap(engine)
             self.is_initialized = True
             return True
-            
+        
         except Exception as e:
             logger.error(f"❌ Failed to initialize knowledge base: {e}")
             return False
     
-    def search(self, query, k=10):
-        """Search the knowledge base"""
+    def reload(self, force=False):
+        """
+        Rebuild from the current portfolio data and swap the new index in
+        
+        Runs in the calling thread; searches keep using the old index until the swap,
+        and searches already running finish on it
+        
+        Args:
+            force: Rebuild even if the portfolio data looks unchanged
+        
+        Returns:
+            Dict describing the outcome (reloaded, version, generation and a reason or error)
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return self._reload_result(False, reason="reload already in progress")
+        
+        try:
+            # Pick up edits to data/portfolio_data.py without restarting
+            importlib.reload(portfolio_data)
+            data = portfolio_data.get_portfolio_data()
+            
+            if not force and self.is_initialized and portfolio_fingerprint(data)[:16] == self.version:
+                return self._reload_result(False, reason="unchanged")
+            
+            logger.info("🔄 Reloading knowledge base...")
+            engine, rebuilt = self._build_engine(data)
+            self._validate(engine)
+            if rebuilt:
+                self._save(engine)
+            
+            self._swap(engine)
+            self.is_initialized = True
+            logger.info(f"✅ Knowledge base reloaded (version {self.version}, generation {self.generation})")
+            return self._reload_result(True)
+        
+        except Exception as e:
+            logger.error(f"❌ Knowledge base reload failed, keeping version {self.version}: {e}")
+            return self._reload_result(False, error=str(e))
+        finally:
+            self._reload_lock.release()
+    
+    def _build_engine(self, data):
+        """Build a search engine for the given portfolio data without touching the live one"""
+        engine = HybridSearch()
+        rebuilt = engine.initialize(
+            portfolio_data=data,
+            index_dir=INDEX_DIR if os.path.exists(INDEX_DIR) else None
+        )
+        return engine, rebuilt
+    
+    def _save(self, engine):
+        """Persist a rebuilt index; a failed save only costs the next start a rebuild"""
+        try:
+            engine.save_index(INDEX_DIR)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not save the index to {INDEX_DIR}, serving it from memory: {e}")
+    
+    def _validate(self, engine):
+        """Sanity-check a freshly built engine before it goes live"""
+        vector_search = engine.vector_search
+        if not vector_search.documents_data:
+            raise ValueError("new index has no documents")
+        if vector_search.faiss_index.ntotal != len(vector_search.chunks):
+            raise ValueError("new index and chunk store disagree on size")
+        if not engine.search("experience", k=1):
+            raise ValueError("new index returned no results for a smoke query")
+    
+    def _swap(self, engine):
+        """Make an engine live; one reference assignment, so readers see the old or new engine, never a mix"""
+        self.search_engine = engine
+        self.version = engine.vector_search.fingerprint[:16]
+        self.generation += 1
+        
+        for listener in self._listeners:
+            listener(self.version)
+    
+    def _reload_result(self, reloaded, **details):
+        """Outcome of a reload request"""
+        return {"reloaded": reloaded, "version": self.version, "generation": self.generation, **details}
+    
+    def add_reload_listener(self, listener):
+        """Call listener(version) whenever a new index goes live (e.g. to re-key caches)"""
+        self._listeners.append(listener)
+        if self.version is not None:
+            listener(self.version)
+    
+    def start_watching(self, interval=KB_WATCH_INTERVAL):
+        """Poll data/portfolio_data.py and reload when it changes"""
+        if interval <= 0 or self._watch_thread is not None:
+            return
+        
+        def watch():
+            path = portfolio_data.__file__
+            last_mtime = os.path.getmtime(path)
+            while not self._watch_stop.wait(interval):
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    self.reload()
+        
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=watch, name="boku-kb-watch", daemon=True)
+        self._watch_thread.start()
+        logger.info(f"👀 Watching portfolio data for changes every {interval}s")
+    
+    def stop_watching(self):
+        """Stop the file watcher"""
+        self._watch_stop.set()
+        self._watch_thread = None
+    
+    def search(self, query, k=10, embeddings=None, filters=None, filter_mode=INTENT_FILTER_MODE, deadline=None):
+        """Search the knowledge base, optionally restricted (or boosted) by metadata filters and bounded by a request deadline"""
         if not self.is_initialized:
             return []
         
-        return self.search_engine.search(query, k)
+        # Read the engine once: a concurrent reload swaps the attribute, not the engine we hold
+        engine = self.search_engine
+        return engine.search(query, k, embeddings=embeddings, filters=filters, filter_mode=filter_mode, deadline=deadline)
     
     def get_status(self):
         """Get knowledge base status"""
         if not self.is_initialized:
             return {"status": "not_initialized"}
         
+        engine = self.search_engine
         return {
             "status": "initialized",
-            "documents_count": len(self.search_engine.vector_search.documents_data),
-            "index_type": type(self.search_engine.vector_search.faiss_index).__name__
-        }
\ No newline at end of file
+            "version": self.version,
+            "generation": self.generation,
+            "documents_count": len(engine.vector_search.documents_data),
+            "chunks_count": len(engine.vector_search.chunks),
+            "index_type": type(engine.vector_search.faiss_index).__name__
+        }
@@ -0,0 +1,114 @@
+"""
+Per-session conversation history with bounded memory
+Reads are lock-free; writes replace a session's immutable history under a lock
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, Tuple
+from config import (
+    SESSION_MAX_TURNS,
+    SESSION_MAX_TOKENS,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_TOTAL_TOKENS,
+    logger
+)
+
+# Immutable snapshot of one session; swapped wholesale so readers never need the lock
+_Session = namedtuple("_Session", ["history", "tokens", "updated_at"])
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for memory accounting"""
+    return len(text) // 4 + 1
+
+
+class SessionStore:
+    """Conversation histories keyed by client-supplied session id"""
+
+    def __init__(self, max_turns=SESSION_MAX_TURNS, max_tokens=SESSION_MAX_TOKENS,
+                 ttl_seconds=SESSION_TTL_SECONDS, max_total_tokens=SESSION_MAX_TOTAL_TOKENS):
+        """
+        Args:
+            max_turns: Turns (user + assistant message pairs) kept per session
+            max_tokens: Estimated tokens of history kept per session
+            ttl_seconds: Idle time after which a session expires
+            max_total_tokens: Global cap; least recently active sessions are evicted above it
+        """
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.ttl_seconds = ttl_seconds
+        self.max_total_tokens = max_total_tokens
+
+        self._sessions: Dict[str, _Session] = {}
+        self._recency = OrderedDict()  # Session ids, least recently written first
+        self._total_tokens = 0
+        self._lock = threading.Lock()
+
+    def get_history(self, session_id: str) -> Tuple[dict, ...]:
+        """Return the session's history (empty if unknown or expired) without taking the lock"""
+        session = self._sessions.get(session_id)
+        if session is None or time.time() - session.updated_at > self.ttl_seconds:
+            return ()
+        return session.history
+
+    def append_turn(self, session_id: str, user_message: str, assistant_message: str):
+        """Add a user/assistant turn, trimming the session and evicting others as needed"""
+        turn = (
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": assistant_message}
+        )
+        now = time.time()
+
+        with self._lock:
+            self._expire(now)
+
+            old = self._sessions.get(session_id)
+            history = (old.history if old else ()) + turn
+            history = history[-self.max_turns * 2:]
+
+            # Drop the oldest turns while over the per-session token budget, keeping the latest one
+            tokens = sum(estimate_tokens(m["content"]) for m in history)
+            while tokens > self.max_tokens and len(history) > 2:
+                tokens -= estimate_tokens(history[0]["content"]) + estimate_tokens(history[1]["content"])
+                history = history[2:]
+
+            self._total_tokens += tokens - (old.tokens if old else 0)
+            self._sessions[session_id] = _Session(history, tokens, now)
+            self._recency[session_id] = None
+            self._recency.move_to_end(session_id)
+
+            # Evict least recently active sessions above the global memory cap
+            while self._total_tokens > self.max_total_tokens and len(self._recency) > 1:
+                evicted_id, _ = self._recency.popitem(last=False)
+                self._total_tokens -= self._sessions.pop(evicted_id).tokens
+                logger.info(f"🗑️  Evicted session {evicted_id[:8]}... (memory cap)")
+
+    def clear(self, session_id: str):
+        """Forget a session"""
+        with self._lock:
+            self._remove(session_id)
+
+    def _expire(self, now: float):
+        """Drop idle sessions from the front of the recency order (caller holds the lock)"""
+        while self._recency:
+            session_id = next(iter(self._recency))
+            if now - self._sessions[session_id].updated_at <= self.ttl_seconds:
+                break
+            self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        """Remove a session and release its tokens (caller holds the lock)"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._recency.pop(session_id, None)
+            self._total_tokens -= session.tokens
+
+    def get_stats(self) -> Dict:
+        """Get session store statistics"""
+        return {
+            "sessions": len(self._sessions),
+            "total_tokens": self._total_tokens,
+            "max_total_tokens": self.max_total_tokens
+        }
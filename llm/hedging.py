@@ -0,0 +1,163 @@
+"""
+Hedged upstream requests
+When a call runs past the rolling p95 latency, an identical second call is fired and the
+first to succeed wins; a hedge-ratio cap bounds the extra upstream cost
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+import numpy as np
+from config import (
+    HEDGE_PERCENTILE,
+    HEDGE_MAX_RATIO,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MIN_DELAY,
+    HEDGE_WINDOW,
+    logger
+)
+
+# Latency samples kept for the rolling percentile
+_LATENCY_SAMPLES = 200
+
+
+class HedgePolicy:
+    """Rolling upstream latency and the hedge-ratio cap"""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_ratio: float = HEDGE_MAX_RATIO,
+                 min_samples: int = HEDGE_MIN_SAMPLES, min_delay: float = HEDGE_MIN_DELAY, window: float = HEDGE_WINDOW):
+        """
+        Args:
+            percentile: Latency percentile after which a request is hedged
+            max_ratio: Most hedges allowed per request over the window
+            min_samples: Latency samples needed before hedging starts
+            min_delay: Never hedge sooner than this many seconds
+            window: Seconds over which the hedge ratio is measured
+        """
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+        self._requests = deque()
+        self._hedges = deque()
+        self._wins = 0
+
+    def _expire(self, now: float):
+        """Drop requests and hedges older than the window (caller holds the lock)"""
+        for events in (self._requests, self._hedges):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_latency(self, seconds: float):
+        """Add the latency of a successful upstream call"""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, float(np.percentile(self._latencies, self.percentile)))
+
+    def record_request(self):
+        """Count a primary request"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._requests.append(now)
+
+    def try_acquire_hedge(self) -> bool:
+        """Take a hedge if it keeps hedges within max_ratio of recent requests"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if len(self._hedges) + 1 > self.max_ratio * len(self._requests):
+                return False
+            self._hedges.append(now)
+            return True
+
+    def record_hedge_win(self):
+        """Count a hedge that answered before the original request"""
+        with self._lock:
+            self._wins += 1
+
+    def get_stats(self) -> Dict:
+        """Get hedging statistics"""
+        delay = self.hedge_delay()
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "hedge_delay": delay,
+                "requests": len(self._requests),
+                "hedges": len(self._hedges),
+                "hedge_wins": self._wins
+            }
+
+
+async def hedged(call, policy: HedgePolicy, bulkhead=None):
+    """
+    Run call() (a coroutine factory), hedging it with a second call() if it is slow
+
+    Returns the first successful result; the other call is cancelled. If every call
+    fails, the first call's error is raised
+
+    Args:
+        bulkhead: Optional upstream Bulkhead; the hedge needs a free slot of its own (it is
+            skipped rather than queued), so hedging never exceeds the concurrency limit
+    """
+    policy.record_request()
+    delay = policy.hedge_delay()
+    started = time.monotonic()
+    primary = asyncio.ensure_future(call())
+    if delay is None:
+        return await primary
+
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and (bulkhead is None or bulkhead.try_acquire()):
+            if policy.try_acquire_hedge():
+                logger.info(f"🏁 Upstream slower than p{policy.percentile:.0f} ({delay:.2f}s), hedging")
+                hedge = asyncio.ensure_future(call())
+                if bulkhead is not None:
+                    hedge.add_done_callback(lambda _: bulkhead.release())
+                tasks.append(hedge)
+            elif bulkhead is not None:
+                bulkhead.release()
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        policy.record_hedge_win()
+                    return task.result()
+        return primary.result()  # Every call failed: raise the original error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                if task is primary:
+                    # It took at least this long; dropping the sample would drag the percentile down
+                    policy.record_latency(time.monotonic() - started)
+
+
+_policy = None
+_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """Get the process-wide hedge policy (upstream latency is shared by every caller)"""
+    global _policy
+    if _policy is None:
+        with _lock:
+            if _policy is None:
+                _policy = HedgePolicy()
+    return _policy
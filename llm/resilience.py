@@ -0,0 +1,379 @@
+"""
+Resilience primitives for upstream LLM calls
+Retryable-error classification, exponential backoff with jitter, a process-wide retry
+budget, a circuit breaker that fails fast while upstream is unhealthy and a bulkhead
+that bounds concurrent upstream calls
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+import httpx
+from config import (
+    UPSTREAM_BACKOFF_BASE,
+    UPSTREAM_BACKOFF_MAX,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MIN_RETRIES,
+    RETRY_BUDGET_WINDOW,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    UPSTREAM_MAX_CONCURRENT,
+    UPSTREAM_QUEUE_SIZE,
+    UPSTREAM_QUEUE_TIMEOUT,
+    logger
+)
+
+# Statuses worth retrying: request timeout, too early, rate limited, and server errors
+_RETRYABLE_STATUSES = {408, 425, 429}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed upstream call may succeed if repeated (timeouts, transport errors, 429 and 5xx)"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in _RETRYABLE_STATUSES or status >= 500
+    return isinstance(error, httpx.TransportError)  # Includes every timeout
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After in seconds), if it said"""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+    try:
+        return max(0.0, float(error.response.headers.get("retry-after", "")))
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, base: float = UPSTREAM_BACKOFF_BASE, cap: float = UPSTREAM_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests, so retries can't multiply load during an outage
+
+    Within the rolling window, retries are allowed while they stay under
+    max(min_retries, ratio * requests)
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, min_retries: int = RETRY_BUDGET_MIN_RETRIES,
+                 window: float = RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._requests = deque()
+        self._retries = deque()
+        self._rejected = 0
+
+    def _expire(self, now: float):
+        """Drop events older than the window (caller holds the lock)"""
+        for events in (self._requests, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        """Count a first attempt"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._requests.append(now)
+
+    def try_acquire_retry(self) -> bool:
+        """Spend one retry if the budget allows it"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if len(self._retries) >= max(self.min_retries, self.ratio * len(self._requests)):
+                self._rejected += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def get_stats(self) -> Dict:
+        """Get retry budget statistics"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "requests": len(self._requests),
+                "retries": len(self._retries),
+                "rejected": self._rejected
+            }
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed: calls go through. After failure_threshold consecutive failures it opens and calls
+    are refused for reset_timeout seconds. Then it is half-open: one probe call goes through,
+    closing the circuit on success or re-opening it on failure
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None  # When the half-open probe was let through
+        self._short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        """Current state (an open circuit reads as half-open once reset_timeout has passed)"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream now (half-open lets a single probe through)"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_started = None
+            # A probe that never reported back (e.g. cancelled) is replaced after reset_timeout
+            if self._state == self.HALF_OPEN and (self._probe_started is None
+                                                  or now - self._probe_started >= self.reset_timeout):
+                self._probe_started = now
+                logger.info("🔄 Circuit half-open, probing upstream")
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record_success(self):
+        """Upstream answered: close the circuit"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("✅ Upstream recovered, circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        """Upstream failed in a way that says it is unhealthy"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                logger.warning(f"⚡ Upstream unhealthy after {self._failures} failures, circuit open for {self.reset_timeout}s")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+    def get_stats(self) -> Dict:
+        """Get circuit breaker statistics"""
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "short_circuited": self._short_circuited
+            }
+
+
+class UpstreamOverloaded(Exception):
+    """Raised when the upstream bulkhead's queue is full or a queued call waited too long"""
+
+
+class DegradedResponse(Exception):
+    """
+    Raised when upstream couldn't answer (circuit open, retries exhausted, unusable reply)
+
+    text holds the answer built from context to show instead; it must never be cached
+    """
+
+    def __init__(self, text: str):
+        super().__init__("upstream unavailable, answered from context")
+        self.text = text
+
+
+class _Waiter:
+    """A queued caller: a thread (event) or a coroutine (future on its loop)"""
+
+    def __init__(self, event=None, loop=None, future=None):
+        self.event = event
+        self.loop = loop
+        self.future = future
+
+    def grant(self):
+        """Hand this waiter a slot (caller holds the bulkhead lock)"""
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class Bulkhead:
+    """
+    Bounds concurrent upstream calls, with a bounded FIFO queue for callers waiting on a slot
+
+    Shared by threads (slot) and coroutines (aslot); a released slot is handed straight to
+    the longest waiter. Callers that find the queue full, or wait longer than queue_timeout,
+    get UpstreamOverloaded instead of piling onto a saturated upstream
+    """
+
+    def __init__(self, max_concurrent: int = UPSTREAM_MAX_CONCURRENT, max_queue: int = UPSTREAM_QUEUE_SIZE,
+                 queue_timeout: float = UPSTREAM_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+        self._rejected = 0
+        self._timed_out = 0
+
+    def is_full(self) -> bool:
+        """Whether a new caller would be rejected right now"""
+        with self._lock:
+            return self._active >= self.max_concurrent and len(self._waiters) >= self.max_queue
+
+    def _enter(self, waiter: _Waiter) -> bool:
+        """Take a free slot (True) or join the queue (False); raises if the queue is full"""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return True
+            if len(self._waiters) >= self.max_queue:
+                self._rejected += 1
+                raise UpstreamOverloaded(f"{self._active} upstream calls running and {len(self._waiters)} queued")
+            self._waiters.append(waiter)
+            return False
+
+    def _leave_queue(self, waiter: _Waiter) -> bool:
+        """Remove a waiter that gave up; False if it was granted a slot in the meantime"""
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                return False
+            self._timed_out += 1
+            return True
+
+    def release(self):
+        """Give a slot back, handing it to the next waiter if there is one"""
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().grant()  # The slot passes on; _active is unchanged
+            else:
+                self._active -= 1
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without waiting (False when none is free or callers are queued)"""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None):
+        """Block until a slot is free (raises UpstreamOverloaded)"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        waiter = _Waiter(event=threading.Event())
+        if self._enter(waiter):
+            return
+        if not waiter.event.wait(max(0.0, timeout)) and self._leave_queue(waiter):
+            raise UpstreamOverloaded(f"waited {timeout:.1f}s for an upstream slot")
+
+    async def aacquire(self, timeout: Optional[float] = None):
+        """Await a free slot without blocking the event loop (raises UpstreamOverloaded)"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        waiter = _Waiter(loop=asyncio.get_running_loop())
+        waiter.future = waiter.loop.create_future()
+        if self._enter(waiter):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            if self._leave_queue(waiter):
+                raise UpstreamOverloaded(f"waited {timeout:.1f}s for an upstream slot")
+        except asyncio.CancelledError:
+            if not self._leave_queue(waiter):
+                self.release()  # Granted just as we were cancelled: pass the slot on
+            raise
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """Hold a slot for a blocking call"""
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, timeout: Optional[float] = None):
+        """Hold a slot for a non-blocking call"""
+        await self.aacquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict:
+        """Get bulkhead statistics"""
+        with self._lock:
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out
+            }
+
+
+_retry_budget = None
+_circuit_breaker = None
+_bulkhead = None
+_lock = threading.Lock()
+
+
+def get_retry_budget() -> RetryBudget:
+    """Get the process-wide upstream retry budget"""
+    global _retry_budget
+    if _retry_budget is None:
+        with _lock:
+            if _retry_budget is None:
+                _retry_budget = RetryBudget()
+    return _retry_budget
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get the process-wide upstream circuit breaker"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        with _lock:
+            if _circuit_breaker is None:
+                _circuit_breaker = CircuitBreaker()
+    return _circuit_breaker
+
+
+def get_upstream_bulkhead() -> Bulkhead:
+    """Get the process-wide upstream concurrency limit"""
+    global _bulkhead
+    if _bulkhead is None:
+        with _lock:
+            if _bulkhead is None:
+                _bulkhead = Bulkhead()
+    return _bulkhead
@@ -4,9 +4,11 @@ Optimized for natural conversation and efficient processing
 """
 
 import time
+import asyncio
 import datetime
 import random
-import requests
+import httpx
+import json
 import re
 from config import (
     PERPLEXITY_MODEL,
@@ -14,8 +16,30 @@ from config import (
     TEMPERATURE,
     MAX_RESPONSE_TOKENS,
     MIN_RESPONSE_LENGTH,
+    UPSTREAM_MAX_CONNECTIONS,
+    UPSTREAM_MAX_KEEPALIVE,
+    UPSTREAM_KEEPALIVE_EXPIRY,
+    UPSTREAM_HTTP2,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_READ_TIMEOUT,
+    UPSTREAM_MAX_ATTEMPTS,
+    UPSTREAM_BACKOFF_MAX,
+    HEDGE_ENABLED,
     logger
 )
+from utils.executors import run_in_cpu_executor
+from utils.deadline import DeadlineExceeded, cap_timeout, check_deadline
+from llm.resilience import (
+    DegradedResponse,
+    backoff_delay,
+    get_circuit_breaker,
+    get_retry_budget,
+    get_upstream_bulkhead,
+    is_retryable,
+    retry_after
+)
+from llm.hedging import get_hedge_policy, hedged
+from llm.stream_cleaner import StreamingCleaner, THINK_BLOCK, CITATION_MARKERS
 
 
 class ResponseGenerator:
@@ -30,6 +54,16 @@ class ResponseGenerator:
         self.api_url = "https://api.perplexity.ai/chat/completions"
         self.vector_store = vector_store
         
+        # Long-lived pooled clients so requests reuse keep-alive connections
+        self.client = httpx.Client(**self._client_options())
+        self._async_client = None  # Created lazily inside the running event loop
+        
+        # Shared by every generator in the process: upstream health is a process-wide fact
+        self.breaker = get_circuit_breaker()
+        self.retry_budget = get_retry_budget()
+        self.hedge_policy = get_hedge_policy()
+        self.bulkhead = get_upstream_bulkhead()  # Raises UpstreamOverloaded when saturated
+        
         if not self.api_key:
             logger.warning("⚠️  PERPLEXITY_API_KEY not found in environment variables")
         else:
@@ -38,23 +72,45 @@ class ResponseGenerator:
             # Test the API connection
             self._test_api_connection()
     
+    def _client_options(self):
+        """Connection pool, timeout and protocol settings shared by both HTTP clients"""
+        http2 = UPSTREAM_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx needs it for HTTP/2)
+            except ImportError:
+                logger.warning("⚠️  UPSTREAM_HTTP2 is set but the 'h2' package is missing; using HTTP/1.1")
+                http2 = False
+        
+        return {
+            "http2": http2,
+            "limits": httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+            ),
+            "timeout": httpx.Timeout(
+                UPSTREAM_READ_TIMEOUT,
+                connect=UPSTREAM_CONNECT_TIMEOUT
+            ),
+            "headers": {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            }
+        }
+    
     def _test_api_connection(self):
         """Test the Perplexity API connection"""
         try:
             logger.info("🔍 Testing Perplexity API connection...")
             
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
             payload = {
                 "model": self.model,
                 "messages": [{"role": "user", "content": "Hello"}],
                 "max_tokens": 10
             }
             
-            response = requests.post(self.api_url, json=payload, headers=headers, timeout=10)
+            response = self.client.post(self.api_url, json=payload, timeout=10)
             
             if response.status_code == 200:
                 logger.info("✅ API connection successful!")
@@ -84,8 +140,14 @@ class ResponseGenerator:
         ]
         return random.choice(greetings)
     
-    def generate_response(self, query, context=None, num_contexts=5, history=None):
-        """Generate response using Perplexity AI API"""
+    def generate_response(self, query, context=None, num_contexts=5, history=None, deadline=None):
+        """
+        Generate response using Perplexity AI API
+        With a deadline, upstream waits are bounded by the time left (raises DeadlineExceeded)
+        
+        Raises:
+            DegradedResponse: upstream couldn't answer; its text is a fallback built from context
+        """
         # Handle greetings
         if self._is_greeting(query):
             logger.info("👋 Detected greeting - using creative response")
@@ -102,7 +164,115 @@ class ResponseGenerator:
         messages = self._create_messages(query, context_text, history)
         
         # Generate response with retry logic
-        return self._generate_with_retry(messages, query, context)
+        return self._generate_with_retry(messages, query, context, deadline)
+    
+    async def agenerate_response(self, query, context=None, num_contexts=5, history=None, deadline=None):
+        """Async version of generate_response that never blocks the event loop"""
+        # Handle greetings
+        if self._is_greeting(query):
+            logger.info("👋 Detected greeting - using creative response")
+            return self._get_creative_greeting()
+        
+        # Retrieve context from vector store if not provided (CPU-bound, so off the loop)
+        if context is None and self.vector_store is not None:
+            logger.info(f"🔍 Retrieving top {num_contexts} contexts from vector store...")
+            context = await run_in_cpu_executor(self.vector_store.search, query, top_k=num_contexts)
+            logger.info(f"✅ Retrieved {len(context)} relevant contexts")
+        
+        # Format context and create messages
+        context_text = self._format_context(context, num_contexts)
+        messages = self._create_messages(query, context_text, history)
+        
+        # Generate response with retry logic
+        return await self._agenerate_with_retry(messages, query, context, deadline)
+    
+    async def astream_response(self, query, context=None, num_contexts=5, history=None, deadline=None):
+        """
+        Stream a response as cleaned text pieces while the upstream model generates it
+        Falls back to a regular (retried) request if the stream fails before producing text;
+        raises DegradedResponse, before any text, when upstream can't answer
+        """
+        # Handle greetings
+        if self._is_greeting(query):
+            logger.info("👋 Detected greeting - using creative response")
+            yield self._get_creative_greeting()
+            return
+        
+        # Format context and create messages
+        context_text = self._format_context(context, num_contexts)
+        messages = self._create_messages(query, context_text, history)
+        payload = dict(self._build_payload(messages), stream=True)
+        
+        cleaner = StreamingCleaner()
+        emitted = False
+        async with self.bulkhead.aslot(cap_timeout(deadline, self.bulkhead.queue_timeout)):
+            # Checked once the slot is held, so a granted half-open probe always reports back
+            if not self.breaker.allow_request():
+                logger.warning("⚡ Upstream circuit open, answering from context")
+                raise self._degraded(query, context)
+            
+            try:
+                logger.info("🔄 Streaming response...")
+                async with self._get_async_client().stream("POST", self.api_url, json=payload,
+                                                           timeout=self._attempt_timeout(deadline)) as response:
+                    response.raise_for_status()
+                    lines = response.aiter_lines()
+                    while True:
+                        try:
+                            line = await self._next_line(lines, deadline)
+                        except StopAsyncIteration:
+                            break
+                        delta = self._parse_stream_line(line)
+                        if delta:
+                            piece = cleaner.feed(delta)
+                            if piece:
+                                emitted = True
+                                yield piece
+                
+                self.breaker.record_success()
+                piece = cleaner.flush()
+                if piece:
+                    emitted = True
+                    yield piece
+            except (httpx.HTTPError, ValueError) as e:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded("request deadline passed while streaming") from e  # Our budget, not upstream health
+                logger.error(f"❌ Streaming error: {e}")
+                if is_retryable(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()  # Upstream answered; the request itself was the problem
+                if emitted:
+                    return
+        
+        # Outside the slot: the regular request takes its own
+        if not emitted:
+            logger.warning("⚠️  Stream produced no text, falling back to a regular request")
+            yield await self._agenerate_with_retry(messages, query, context, deadline)
+    
+    async def _next_line(self, lines, deadline):
+        """
+        Next line of a streamed response, waiting no longer than the request's remaining time
+        (httpx read timeouts apply per read, so a trickling stream could otherwise outlive the deadline)
+        """
+        if deadline is None:
+            return await lines.__anext__()
+        try:
+            return await asyncio.wait_for(lines.__anext__(), deadline.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("request deadline passed while streaming") from None
+    
+    def _parse_stream_line(self, line):
+        """Extract the content delta from one server-sent event line (None if there is none)"""
+        if not line.startswith("data:"):
+            return None
+        
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            return None
+        
+        choices = json.loads(data).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content")
     
     def _format_context(self, context, num_contexts):
         """Format context in a readable way"""
@@ -185,80 +355,194 @@ Answer:"""
         
         return messages
     
-    def _generate_with_retry(self, messages, query, context):
-        """Generate response with retry logic"""
-        max_retries = 3
-        retry_delay = 2
+    def _build_payload(self, messages):
+        """Build the payload for a chat completion request"""
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": MAX_RESPONSE_TOKENS,
+            "temperature": TEMPERATURE
+        }
+    
+    def _parse_completion(self, data, query, context):
+        """Extract and clean the answer from a completion response"""
+        logger.info("✅ API response received successfully")
         
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"🔄 Generating response (attempt {attempt + 1}/{max_retries})...")
-                
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                payload = {
-                    "model": self.model,
-                    "messages": messages,
-                    "max_tokens": MAX_RESPONSE_TOKENS,
-                    "temperature": TEMPERATURE
-                }
-                
-                response = requests.post(
-                    self.api_url,
-                    json=payload,
-                    headers=headers,
-                    timeout=30
-                )
-                response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-                
-                data = response.json()
-                logger.info("✅ API response received successfully")
-                
-                if "choices" in data and len(data["choices"]) > 0:
-                    generated_text = data["choices"][0]["message"]["content"]
-                    logger.info(f"📝 Generated response ({len(generated_text)} chars)")
-                    
-                    # Simple cleanup instead of aggressive processing
-                    answer = self._clean_response(generated_text)
-                    
-                    if answer and len(answer) > 5:
-                        return answer
-                    else:
-                        logger.warning(f"⚠️  Answer too short, using fallback")
-                        return self._get_smart_fallback(query, context)
-                else:
-                    logger.warning(f"⚠️  Unexpected API response format: {data}")
-                    return self._get_smart_fallback(query, context)
+        if "choices" in data and len(data["choices"]) > 0:
+            generated_text = data["choices"][0]["message"]["content"]
+            logger.info(f"📝 Generated response ({len(generated_text)} chars)")
+            
+            # Simple cleanup instead of aggressive processing
+            answer = self._clean_response(generated_text)
+            
+            if answer and len(answer) > 5:
+                return answer
+            else:
+                logger.warning(f"⚠️  Answer too short, using fallback")
+                raise self._degraded(query, context)
+        else:
+            logger.warning(f"⚠️  Unexpected API response format: {data}")
+            raise self._degraded(query, context)
+    
+    def _generate_with_retry(self, messages, query, context, deadline=None):
+        """Generate response, retrying transient upstream failures with backoff (fallback when upstream is down)"""
+        with self.bulkhead.slot(cap_timeout(deadline, self.bulkhead.queue_timeout)):
+            if not self.breaker.allow_request():
+                logger.warning("⚡ Upstream circuit open, answering from context")
+                raise self._degraded(query, context)
+            
+            payload = self._build_payload(messages)
+            self.retry_budget.record_request()
+            
+            for attempt in range(UPSTREAM_MAX_ATTEMPTS):
+                check_deadline(deadline, f"upstream attempt {attempt + 1}")
+                try:
+                    logger.info(f"🔄 Generating response (attempt {attempt + 1}/{UPSTREAM_MAX_ATTEMPTS})...")
                     
-            except requests.exceptions.Timeout:
-                logger.warning(f"⏳ Request timeout (attempt {attempt + 1}/{max_retries})...")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+                    response = self.client.post(self.api_url, json=payload, timeout=self._attempt_timeout(deadline))
+                    response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+                    data = response.json()
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt, deadline)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
                     continue
-                else:
-                    logger.error("❌ All retry attempts failed due to timeout.")
-                    return self._get_smart_fallback(query, context)
-            except requests.exceptions.RequestException as e:
-                logger.error(f"❌ API Error (attempt {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    logger.error("❌ All retry attempts failed due to API errors.")
-                    return self._get_smart_fallback(query, context)
-            except Exception as e:
-                logger.error(f"⚠️  An unexpected error occurred (attempt {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+                
+                self.breaker.record_success()
+                return self._parse_completion(data, query, context)
+            
+            raise self._degraded(query, context)
+    
+    def _retry_delay(self, error, attempt, deadline=None):
+        """
+        Record a failed attempt and decide whether to retry it
+        
+        Returns:
+            Seconds to wait before the next attempt, or None to give up and fall back
+        
+        Raises:
+            DeadlineExceeded: the request's deadline cut the attempt short or leaves no time to retry
+        """
+        if deadline is not None and deadline.expired():
+            # Timed out on our own budget: says nothing about upstream health
+            raise DeadlineExceeded("request deadline passed during the upstream call") from error
+        
+        if isinstance(error, httpx.TimeoutException):
+            logger.warning(f"⏳ Request timeout (attempt {attempt + 1}/{UPSTREAM_MAX_ATTEMPTS})")
+        elif isinstance(error, httpx.HTTPError):
+            logger.error(f"❌ API Error (attempt {attempt + 1}/{UPSTREAM_MAX_ATTEMPTS}): {error}")
+        else:
+            logger.error(f"⚠️  An unexpected error occurred (attempt {attempt + 1}/{UPSTREAM_MAX_ATTEMPTS}): {error}")
+        
+        if not is_retryable(error):
+            # Upstream is up (it answered); repeating the same request won't help
+            self.breaker.record_success()
+            logger.error("❌ Error is not retryable, using fallback")
+            return None
+        
+        self.breaker.record_failure()
+        if attempt >= UPSTREAM_MAX_ATTEMPTS - 1:
+            logger.error("❌ All retry attempts failed.")
+            return None
+        
+        delay = backoff_delay(attempt)
+        requested = retry_after(error)
+        if requested is not None:
+            if requested > UPSTREAM_BACKOFF_MAX:
+                logger.error(f"❌ Upstream asked to wait {requested:.0f}s, using fallback")
+                return None
+            delay = max(delay, requested)
+        
+        if deadline is not None and delay >= deadline.remaining():
+            raise DeadlineExceeded(f"no time left to retry the upstream call after {delay:.2f}s backoff") from error
+        if not self.breaker.allow_request():
+            logger.warning("⚡ Upstream circuit opened, using fallback")
+            return None
+        if not self.retry_budget.try_acquire_retry():
+            logger.warning("⚠️  Retry budget exhausted, using fallback")
+            return None
+        
+        logger.info(f"🔄 Retrying in {delay:.2f}s")
+        return delay
+    
+    def _attempt_timeout(self, deadline):
+        """HTTP timeout for one upstream attempt, shortened to the request's remaining time"""
+        if deadline is None:
+            return httpx.USE_CLIENT_DEFAULT
+        return httpx.Timeout(
+            deadline.cap(UPSTREAM_READ_TIMEOUT),
+            connect=deadline.cap(UPSTREAM_CONNECT_TIMEOUT)
+        )
+    
+    def get_upstream_stats(self):
+        """Circuit breaker, retry budget, hedging and bulkhead statistics"""
+        return {
+            "circuit": self.breaker.get_stats(),
+            "retry_budget": self.retry_budget.get_stats(),
+            "hedging": dict(self.hedge_policy.get_stats(), enabled=HEDGE_ENABLED),
+            "bulkhead": self.bulkhead.get_stats()
+        }
+    
+    def _get_async_client(self):
+        """Get the non-blocking HTTP client, creating it on first use"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(**self._client_options())
+        return self._async_client
+    
+    async def _agenerate_with_retry(self, messages, query, context, deadline=None):
+        """Async version of _generate_with_retry using a non-blocking HTTP client"""
+        async with self.bulkhead.aslot(cap_timeout(deadline, self.bulkhead.queue_timeout)):
+            if not self.breaker.allow_request():
+                logger.warning("⚡ Upstream circuit open, answering from context")
+                raise self._degraded(query, context)
+            
+            payload = self._build_payload(messages)
+            client = self._get_async_client()
+            self.retry_budget.record_request()
+            
+            for attempt in range(UPSTREAM_MAX_ATTEMPTS):
+                check_deadline(deadline, f"upstream attempt {attempt + 1}")
+                try:
+                    logger.info(f"🔄 Generating response (attempt {attempt + 1}/{UPSTREAM_MAX_ATTEMPTS})...")
+                    
+                    response = await self._apost(client, payload, self._attempt_timeout(deadline))
+                    data = response.json()
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt, deadline)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
                     continue
-                else:
-                    logger.error("❌ All retry attempts failed due to unexpected errors.")
-                    return self._get_smart_fallback(query, context)
+                
+                self.breaker.record_success()
+                return self._parse_completion(data, query, context)
+            
+            raise self._degraded(query, context)
+    
+    async def _apost(self, client, payload, timeout=httpx.USE_CLIENT_DEFAULT):
+        """POST a completion request, recording its latency; hedged when HEDGE_ENABLED"""
+        async def call():
+            start = time.monotonic()
+            response = await client.post(self.api_url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            self.hedge_policy.record_latency(time.monotonic() - start)
+            return response
         
-        return self._get_smart_fallback(query, context)
+        if not HEDGE_ENABLED:
+            return await call()
+        return await hedged(call, self.hedge_policy, self.bulkhead)
+    
+    def close(self):
+        """Close the pooled sync HTTP client"""
+        self.client.close()
+    
+    async def aclose(self):
+        """Close both pooled HTTP clients (called on application shutdown)"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self.close()
     
     def _clean_response(self, text):
         """Basic cleanup of the response"""
@@ -266,17 +550,21 @@ Answer:"""
             return ""
             
         # Remove any potential thinking tags (though prompt should prevent this)
-        text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+        text = THINK_BLOCK.sub('', text)
         
         # Remove citation markers
-        text = re.sub(r'\[Info \d+\]', '', text)
-        text = re.sub(r'\[\d+\]', '', text)
+        for pattern in CITATION_MARKERS:
+            text = pattern.sub('', text)
         
         # Remove extra whitespace
         text = re.sub(r'\s+', ' ', text).strip()
         
         return text
     
+    def _degraded(self, query, context):
+        """DegradedResponse carrying the context-based fallback, so callers know not to cache it"""
+        return DegradedResponse(self._get_smart_fallback(query, context))
+    
     def _get_smart_fallback(self, query, context):
         """Generate a smarter fallback response using context directly"""
         if context and len(context) > 0:
@@ -0,0 +1,72 @@
+"""
+Incremental response cleanup for streamed completions
+Applies the same rules as ResponseGenerator._clean_response to text arriving in pieces
+"""
+
+import re
+
+THINK_BLOCK = re.compile(r'<think>.*?</think>', flags=re.DOTALL)
+CITATION_MARKERS = (re.compile(r'\[Info \d+\]'), re.compile(r'\[\d+\]'))
+
+# Longest unclosed "[..." or "<..." tail worth holding back as a possible marker
+MAX_MARKER_LENGTH = 16
+
+
+class StreamingCleaner:
+    """Strips <think> blocks and citation markers from a token stream and normalizes whitespace"""
+
+    def __init__(self):
+        """Start with an empty buffer"""
+        self._buffer = ""
+        self._started = False  # Any visible text emitted yet
+        self._pending_space = False  # Whitespace seen after the last emitted text
+
+    def feed(self, chunk):
+        """Add a chunk from the stream and return whatever text is now safe to emit"""
+        self._buffer += chunk
+        return self._drain(final=False)
+
+    def flush(self):
+        """Emit everything still buffered at the end of the stream"""
+        return self._drain(final=True)
+
+    def _drain(self, final):
+        """Emit the buffered prefix that can no longer be part of a marker or think block"""
+        text = THINK_BLOCK.sub('', self._buffer)
+        for pattern in CITATION_MARKERS:
+            text = pattern.sub('', text)
+        cut = len(text)
+
+        if not final:
+            # Hold everything from an unterminated think block
+            open_think = text.find('<think>')
+            if open_think != -1:
+                cut = open_think
+
+            # ...and from the first unclosed bracket that could still become a marker
+            for i in range(max(0, cut - MAX_MARKER_LENGTH), cut):
+                if text[i] in '[<' and not re.search(r'[\]>]', text[i:cut]):
+                    cut = i
+                    break
+
+        self._buffer = text[cut:]
+        return self._emit(text[:cut])
+
+    def _emit(self, text):
+        """Collapse whitespace, carrying spacing across chunks"""
+        if not text:
+            return ""
+
+        collapsed = re.sub(r'\s+', ' ', text)
+        leading = collapsed.startswith(' ')
+        trailing = collapsed.endswith(' ')
+        words = collapsed.strip(' ')
+
+        if not words:
+            self._pending_space = True
+            return ""
+
+        out = " " if self._started and (self._pending_space or leading) else ""
+        self._started = True
+        self._pending_space = trailing
+        return out + words
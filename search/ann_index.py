@@ -0,0 +1,166 @@
+"""
+FAISS index factory for document vectors
+Builds Flat, IVF-Flat, IVF-PQ or HNSW inner-product indexes and picks one automatically
+from the corpus size and memory budget
+"""
+
+import math
+import faiss
+import numpy as np
+from config import (
+    ANN_INDEX_TYPE,
+    ANN_FLAT_MAX_DOCS,
+    ANN_MEMORY_BUDGET_MB,
+    ANN_NLIST,
+    ANN_NPROBE,
+    ANN_PQ_M,
+    ANN_HNSW_M,
+    ANN_HNSW_EF_CONSTRUCTION,
+    ANN_HNSW_EF_SEARCH,
+    logger
+)
+from search.index_store import MmapFlatIndex
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Training points per IVF cluster (FAISS warns below ~39) and per PQ centroid
+_TRAIN_POINTS_PER_LIST = 64
+_PQ_BITS = 8
+_MIN_PQ_TRAIN = 1 << _PQ_BITS
+
+
+def default_nlist(n: int) -> int:
+    """IVF cluster count for a corpus of n vectors"""
+    if ANN_NLIST:
+        return ANN_NLIST
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def pq_subquantizers(dimension: int, m: int = ANN_PQ_M) -> int:
+    """Largest sub-quantizer count <= m that divides the dimension"""
+    for candidate in range(min(m, dimension), 0, -1):
+        if dimension % candidate == 0:
+            return candidate
+    return 1
+
+
+def estimate_memory_mb(index_type: str, n: int, dimension: int) -> float:
+    """Approximate resident size of an index type for n vectors"""
+    vector_bytes = 4 * dimension
+    if index_type == "hnsw":
+        per_vector = vector_bytes + ANN_HNSW_M * 2 * 4  # Vectors plus ~2M neighbour links on layer 0
+    elif index_type == "ivf_flat":
+        per_vector = vector_bytes + 8  # Vectors plus stored ids
+    elif index_type == "ivf_pq":
+        per_vector = pq_subquantizers(dimension) + 8
+    else:
+        per_vector = vector_bytes
+    return n * per_vector / 1024 / 1024
+
+
+def choose_index_type(n: int, dimension: int, memory_budget_mb: float = ANN_MEMORY_BUDGET_MB) -> str:
+    """
+    Pick an index type for a corpus
+
+    Exact search while the corpus is small; otherwise the most accurate approximate
+    index that fits the memory budget (HNSW, then IVF-Flat, then IVF-PQ)
+    """
+    if n <= ANN_FLAT_MAX_DOCS:
+        return "flat"
+    for index_type in ("hnsw", "ivf_flat"):
+        if estimate_memory_mb(index_type, n, dimension) <= memory_budget_mb:
+            return index_type
+    return "ivf_pq"
+
+
+def build_ann_index(vectors: np.ndarray, index_type: str = ANN_INDEX_TYPE):
+    """
+    Build and fill an inner-product index over normalized vectors
+
+    Args:
+        vectors: (n, d) float32 array, already L2-normalized
+        index_type: One of INDEX_TYPES, or "auto" to choose from corpus size and memory budget
+
+    Returns:
+        FAISS index with search parameters (nprobe / efSearch) applied
+    """
+    n, dimension = vectors.shape
+    if index_type == "auto":
+        index_type = choose_index_type(n, dimension)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown ANN index type: {index_type}")
+
+    # IVF needs enough vectors to train its clusters (and PQ codebooks)
+    nlist = default_nlist(n)
+    if index_type in ("ivf_flat", "ivf_pq") and (n < nlist * 39 or (index_type == "ivf_pq" and n < _MIN_PQ_TRAIN)):
+        logger.warning(f"⚠️  {n} vectors are too few to train {index_type}, using flat")
+        index_type = "flat"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, ANN_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ANN_HNSW_EF_CONSTRUCTION
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_subquantizers(dimension), _PQ_BITS,
+                                     faiss.METRIC_INNER_PRODUCT)
+
+        # Train on a sample; more points than this barely changes the clusters
+        sample_size = min(n, max(nlist * _TRAIN_POINTS_PER_LIST, _MIN_PQ_TRAIN * 40))
+        sample = vectors if sample_size == n else vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+        index.train(np.ascontiguousarray(sample))
+
+    index.add(vectors)
+    set_search_params(index)
+
+    logger.info(f"✅ Built {index_type} index over {n} vectors (~{estimate_memory_mb(index_type, n, dimension):.0f} MB)")
+    return index
+
+
+def set_search_params(index, nprobe: int = ANN_NPROBE, ef_search: int = ANN_HNSW_EF_SEARCH):
+    """Apply query-time accuracy/speed knobs (nprobe for IVF, efSearch for HNSW); others are unaffected"""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+        return index
+
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except (RuntimeError, TypeError):
+        return index
+    ivf.nprobe = min(nprobe, ivf.nlist)
+    return index
+
+
+def index_type_name(index) -> str:
+    """Factory name of a built index (for status and reports)"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def filtered_search(index, queries: np.ndarray, k: int, allowed_ids: np.ndarray):
+    """
+    Search only among allowed_ids, enforced inside the index rather than by post-filtering
+
+    The memory-mapped flat index scores just those rows; FAISS indexes get an ID selector
+    (keeping their configured nprobe / efSearch)
+    """
+    if isinstance(index, MmapFlatIndex):
+        return index.search(queries, k, subset=allowed_ids)
+
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(allowed_ids, dtype=np.int64))
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    elif isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
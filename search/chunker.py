@@ -0,0 +1,125 @@
+"""
+Sentence-aware document chunking
+Documents are split into overlapping chunks for indexing; search hits on chunks are
+mapped back to their parent documents and their spans merged for the prompt
+"""
+
+import re
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+from config import CHUNK_SIZE, CHUNK_OVERLAP
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the sentences of text, without surrounding whitespace"""
+    spans = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text.rstrip())))
+    return [(start, end) for start, end in spans if end > start]
+
+
+def _split_long(text: str, start: int, end: int, size: int) -> List[Tuple[int, int]]:
+    """Split a span longer than size on whitespace (or hard, if there is none)"""
+    pieces = []
+    while end - start > size:
+        cut = text.rfind(" ", start + 1, start + size + 1)
+        if cut <= start:
+            cut = start + size
+        pieces.append((start, cut))
+        start = cut
+        while start < end and text[start].isspace():
+            start += 1
+    if end > start:
+        pieces.append((start, end))
+    return pieces
+
+
+def chunk_spans(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """
+    Split text into chunks of whole sentences
+
+    Args:
+        size: Maximum chunk length in characters (longer sentences are split on words)
+        overlap: Up to this many characters of trailing sentences are repeated at the start of the next chunk
+
+    Returns:
+        (start, end) spans into text; always at least one
+    """
+    sentences = [piece for start, end in sentence_spans(text) for piece in _split_long(text, start, end, size)]
+    if not sentences:
+        return [(0, len(text))]
+
+    chunks = []
+    first = 0
+    while True:
+        last = first
+        while last + 1 < len(sentences) and sentences[last + 1][1] - sentences[first][0] <= size:
+            last += 1
+        chunks.append((sentences[first][0], sentences[last][1]))
+        if last == len(sentences) - 1:
+            return chunks
+
+        # Start the next chunk with the sentences that fit in the overlap, always moving forward
+        following = last + 1
+        while following - 1 > first and sentences[last][1] - sentences[following - 1][0] <= overlap:
+            following -= 1
+        first = following
+
+
+def chunk_documents(documents: Sequence[str], size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> np.ndarray:
+    """(n_chunks, 3) int64 array of (parent document row, start, end) for every chunk, in document order"""
+    rows = [(parent, start, end) for parent, text in enumerate(documents)
+            for start, end in chunk_spans(text, size, overlap)]
+    return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+
+def merge_spans(spans: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sorted union of overlapping or touching spans"""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def group_by_parent(chunk_ids: Sequence[int], chunks: np.ndarray) -> Dict[int, List[int]]:
+    """Parent document row -> its hit chunk ids, parents in order of their first hit (dict order)"""
+    parents = {}
+    for chunk_id in chunk_ids:
+        parents.setdefault(int(chunks[chunk_id, 0]), []).append(int(chunk_id))
+    return parents
+
+
+def chunking_settings(size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Dict:
+    """Chunking parameters, stored with an index so a settings change triggers a rebuild"""
+    return {"size": size, "overlap": overlap}
+
+
+def whole_documents(documents: Sequence[str]) -> np.ndarray:
+    """Chunk rows for indexing every document as a single chunk"""
+    return np.array([(parent, 0, len(text)) for parent, text in enumerate(documents)], dtype=np.int64).reshape(-1, 3)
+
+
+class ChunkTexts:
+    """Read-only sequence of chunk texts, sliced from the parent documents on access"""
+
+    def __init__(self, documents: Sequence[str], chunks: np.ndarray):
+        self._documents = documents
+        self._chunks = chunks
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __getitem__(self, index) -> str:
+        parent, start, end = self._chunks[index]
+        return self._documents[int(parent)][int(start):int(end)]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
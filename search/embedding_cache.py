@@ -0,0 +1,92 @@
+"""
+On-disk document embedding cache keyed by content hash
+Lets index rebuilds re-embed only documents whose text actually changed
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Dict, List, Optional
+from config import logger
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of a document's text (what its embedding depends on)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def corpus_fingerprint(ids: List[str], hashes: List[str], metadatas: List[Dict]) -> str:
+    """Hash of everything the index stores, used to detect a stale index at startup"""
+    digest = hashlib.sha256()
+    for doc_id, text_hash, metadata in zip(ids, hashes, metadatas):
+        digest.update(f"{doc_id}\0{text_hash}\0".encode("utf-8"))
+        digest.update(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def portfolio_fingerprint(portfolio_data: List[Dict]) -> str:
+    """Corpus fingerprint of {"id", "text", "metadata"} documents"""
+    return corpus_fingerprint(
+        [item.get("id", str(i)) for i, item in enumerate(portfolio_data)],
+        [content_hash(item["text"]) for item in portfolio_data],
+        [item["metadata"] for item in portfolio_data]
+    )
+
+
+class EmbeddingCache:
+    """Embeddings of previously indexed documents, stored as an .npz (no pickle)"""
+
+    def __init__(self, path: str, model_name: str):
+        """
+        Args:
+            path: .npz file holding the cache (created on first save)
+            model_name: Embedding model; entries written by another model are ignored
+        """
+        self.path = path
+        self.model_name = model_name
+        self._rows: Dict[str, int] = {}
+        self._vectors = None
+        self._load()
+
+    def _load(self):
+        """Read the cache file if it exists and matches the model"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if str(data["model"]) != self.model_name:
+                    logger.info(f"🔄 Embedding cache was built with {data['model']}, ignoring it")
+                    return
+                hashes = data["hashes"]
+                self._vectors = data["vectors"]
+            self._rows = {str(h): i for i, h in enumerate(hashes)}
+        except Exception as e:
+            logger.warning(f"⚠️  Could not read embedding cache {self.path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, text_hash: str) -> Optional[np.ndarray]:
+        """Cached embedding for a content hash, or None"""
+        row = self._rows.get(text_hash)
+        return None if row is None else self._vectors[row]
+
+    def save(self, hashes: List[str], vectors: np.ndarray):
+        """Replace the cache with the current corpus (entries for deleted documents are dropped)"""
+        if not self.path:
+            return
+        self._rows = {h: i for i, h in enumerate(hashes)}
+        self._vectors = vectors
+
+        # Write to a temp file of our own and rename, so neither a crash nor a concurrent build
+        # (another worker saving at the same time) ever leaves a truncated or mixed cache
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, model=np.array(self.model_name), hashes=np.array(hashes, dtype=str), vectors=vectors)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
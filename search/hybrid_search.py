@@ -3,8 +3,29 @@ Hybrid search combining vector and keyword search
 Optimized for efficiency
 """
 
+import time
+import numpy as np
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from search.vector_search import VectorSearch
 from search.keyword_search import KeywordSearch
+from search.reranker import Reranker
+from search.chunker import ChunkTexts, group_by_parent
+from utils.executors import get_retrieval_executor
+from utils.deadline import cap_timeout
+from utils.embedding_context import EmbeddingContext
+from config import (
+    HYBRID_CONCURRENT,
+    RETRIEVER_TIMEOUT,
+    HYBRID_CANDIDATES,
+    FUSION_METHOD,
+    RRF_K,
+    FUSION_VECTOR_WEIGHT,
+    FUSION_KEYWORD_WEIGHT,
+    FUSION_INTENT_WEIGHT,
+    logger
+)
+
+_NO_HITS = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
 
 
 class HybridSearch:
@@ -14,146 +35,168 @@ class HybridSearch:
         """Initialize hybrid search system"""
         self.vector_search = VectorSearch()
         self.keyword_search = None
+        self.reranker = Reranker()
     
-    def initialize(self, portfolio_data=None, faiss_index_path=None, data_path=None):
-        """Initialize the search system"""
-        if portfolio_data:
-            # Create new index from portfolio data
+    def initialize(self, portfolio_data=None, index_dir=None):
+        """
+        Initialize the search system
+        
+        With both portfolio data and an index directory, the saved index is loaded and rebuilt
+        incrementally only if it no longer matches the portfolio data
+        
+        Returns:
+            True if the index was (re)built and should be saved, False if loaded as-is
+        """
+        loaded = bool(index_dir) and self.vector_search.load_index(index_dir)
+        rebuilt = False
+        
+        if portfolio_data and (not loaded or self.vector_search.is_stale(portfolio_data)):
+            if loaded:
+                logger.info("🔄 Saved index is out of date with the portfolio data, rebuilding")
             self.vector_search.create_index(portfolio_data)
-            self.keyword_search = KeywordSearch(
-                self.vector_search.documents_data,
-                self.vector_search.metadatas_data
-            )
-        elif faiss_index_path and data_path:
-            # Load existing index
-            if self.vector_search.load_index(faiss_index_path, data_path):
-                self.keyword_search = KeywordSearch(
-                    self.vector_search.documents_data,
-                    self.vector_search.metadatas_data
-                )
-            else:
+            rebuilt = True
+        elif not loaded:
+            if index_dir:
                 raise ValueError("Failed to load existing index")
-        else:
-            raise ValueError("Either portfolio_data or index paths must be provided")
+            raise ValueError("Either portfolio_data or index_dir must be provided")
+        
+        # Both retrievers work on the same chunks, so their hits fuse by chunk id
+        chunks = self.vector_search.chunks
+        metadatas = self.vector_search.metadatas_data
+        self.keyword_search = KeywordSearch(
+            ChunkTexts(self.vector_search.documents_data, chunks),
+            [metadatas[parent] for parent in chunks[:, 0]]
+        )
+        
+        # Document-side re-rank features are computed once per index
+        self.reranker.index(self.vector_search.documents_data)
+        return rebuilt
     
-    def save_index(self, faiss_index_path, data_path):
+    def save_index(self, index_dir):
         """Save the search index"""
-        self.vector_search.save_index(faiss_index_path, data_path)
+        self.vector_search.save_index(index_dir)
     
-    def search(self, query, k=10):
-        """Perform hybrid search combining vector and keyword search"""
-        # Get vector search results
-        vector_results = self.vector_search.search(query, k)
-        
-        # Get keyword search results
-        keyword_results = self.keyword_search.search(query, k)
-        
-        # Combine and deduplicate
-        combined = []
-        seen = set()
-        
-        # Add keyword results first (they're more precise for exact matches)
-        for result in keyword_results:
-            if result not in seen:
-                combined.append(result)
-                seen.add(result)
-        
-        # Add vector results that aren't already included
-        for result in vector_results:
-            if result not in seen:
-                combined.append(result)
-                seen.add(result)
-        
-        # Re-rank results based on query relevance
-        return self._rerank_results(query, combined[:k])
+    def search(self, query, k=10, embeddings=None, filters=None, filter_mode="hard", deadline=None):
+        """
+        Perform hybrid search: fuse vector and keyword chunk scores, group the chunks by
+        document, then re-rank the top k documents
+        
+        Args:
+            filters: Optional metadata filters ({field: value or values})
+            filter_mode: "hard" searches only matching documents; "soft" adds a filtered vector
+                retriever to the fusion so matching documents are boosted but others still compete
+            deadline: Optional request Deadline; retrievers get at most its remaining time and
+                re-ranking is skipped once it has passed
+        """
+        candidates = HYBRID_CANDIDATES or k
+        
+        mask = None
+        if filters and filter_mode in ("hard", "soft"):
+            mask = self.vector_search.metadata_mask(filters)
+            if filter_mode == "hard" and not mask.any():
+                logger.warning(f"⚠️  No documents match {filters}, searching without filters")
+                mask = None
+        
+        # (name, retriever, mask, fusion weight); hard filters are enforced inside both retrievers
+        hard_mask = mask if filter_mode == "hard" else None
+        retrievers = [
+            ("vector", self._vector_candidates, hard_mask, FUSION_VECTOR_WEIGHT),
+            ("keyword", self._keyword_candidates, hard_mask, FUSION_KEYWORD_WEIGHT)
+        ]
+        if filter_mode == "soft" and mask is not None:
+            retrievers.append(("intent", self._vector_candidates, mask, FUSION_INTENT_WEIGHT))
+        
+        # Encode the query once up front: concurrent vector retrievers would otherwise both miss
+        # the request's embedding context and encode it twice
+        embeddings = embeddings or EmbeddingContext(self.vector_search.embedding_model)
+        embeddings.embed(query)
+        
+        # Get scored candidates from every retriever
+        if HYBRID_CONCURRENT:
+            results = self._retrieve_concurrently(retrievers, query, candidates, embeddings,
+                                                  timeout=cap_timeout(deadline, RETRIEVER_TIMEOUT))
+        else:
+            results = [fn(query, candidates, embeddings, retriever_mask) for _, fn, retriever_mask, _ in retrievers]
+        
+        # Fuse by chunk id, so a chunk found by several retrievers is counted once
+        chunk_ids, _ = self._fuse_scores([
+            (ids, scores, weight) for (ids, scores), (_, _, _, weight) in zip(results, retrievers)
+        ])
+        
+        # Each document appears once, ranked by its best chunk, with all its hit chunks
+        hits = group_by_parent(chunk_ids, self.vector_search.chunks)
+        
+        # Re-rank the top k documents by query relevance (ties keep fused order)
+        doc_ids = list(hits)[:k]
+        if deadline is not None and deadline.expired():
+            logger.warning("⏳ Request deadline passed, skipping re-ranking")
+        else:
+            doc_ids = self.reranker.rerank(query, doc_ids)
+        return [self.vector_search.get_context(i, hits[i]) for i in doc_ids]
     
-    def _rerank_results(self, query, results):
-        """Re-rank results based on query relevance with enhanced scoring"""
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
-        
-        # Enhanced keyword categories for better intent detection
-        work_keywords = ['work', 'job', 'company', 'employer', 'role', 'position', 'career', 'responsibilities', 'duties']
-        project_keywords = ['project', 'best', 'achievement', 'accomplishment', 'developed', 'built', 'created', 'portfolio']
-        skill_keywords = ['skill', 'technology', 'expertise', 'know', 'experience', 'proficient', 'stack']
-        education_keywords = ['education', 'study', 'degree', 'university', 'college', 'masters', 'bachelors', 'coursework']
-        certification_keywords = ['certification', 'certified', 'certificate', 'credential', 'aws', 'mta']
-        language_keywords = ['language', 'speak', 'communicate', 'multilingual', 'telugu', 'hindi', 'english']
-        leadership_keywords = ['leadership', 'lead', 'mentor', 'volunteering', 'community', 'organize', 'team']
-        research_keywords = ['thesis', 'research', 'publication', 'paper', 'study', 'analysis']
-        personal_keywords = ['hobby', 'hobbies', 'interest', 'personal', 'gaming', 'dota', 'dedication']
-        
-        # Score results based on query intent and content matching
-        scored_results = []
-        for result in results:
-            result_lower = result.lower()
-            score = 0
-            
-            # Category-based scoring (higher weight for specific matches)
-            if any(word in query_words for word in work_keywords):
-                if any(word in result_lower for word in ['acer', 'mindtree', 'tata', 'company', 'employer', 'developer', 'engineer']):
-                    score += 15
-            
-            if any(word in query_words for word in project_keywords):
-                if any(word in result_lower for word in ['project', 'developed', 'built', 'created', 'ecommerce', 'spellcheck', 'chat', 'weather']):
-                    score += 15
-            
-            if any(word in query_words for word in skill_keywords):
-                if any(word in result_lower for word in ['skill', 'technology', 'react', 'nodejs', 'python', 'javascript', 'genai', 'llm']):
-                    score += 15
-            
-            if any(word in query_words for word in education_keywords):
-                if any(word in result_lower for word in ['university', 'college', 'degree', 'education', 'masters', 'bachelors', 'csun', 'northridge']):
-                    score += 15
-            
-            # New category scoring
-            if any(word in query_words for word in certification_keywords):
-                if any(word in result_lower for word in ['certification', 'certified', 'aws', 'mta', 'microsoft', 'credential']):
-                    score += 20  # Higher weight for specific matches
-            
-            if any(word in query_words for word in language_keywords):
-                if any(word in result_lower for word in ['language', 'multilingual', 'telugu', 'hindi', 'english', 'communicate']):
-                    score += 20
-            
-            if any(word in query_words for word in leadership_keywords):
-                if any(word in result_lower for word in ['leadership', 'lead', 'mentor', 'volunteering', 'community', 'acm', 'organize']):
-                    score += 20
-            
-            if any(word in query_words for word in research_keywords):
-                if any(word in result_lower for word in ['thesis', 'research', 'publication', 'sentiment', 'bert', 'roberta', 'nlp']):
-                    score += 20
-            
-            if any(word in query_words for word in personal_keywords):
-                if any(word in result_lower for word in ['hobby', 'hobbies', 'interest', 'gaming', 'dota', 'dedication', 'cricket']):
-                    score += 15
-            
-            # Boost for exact multi-word phrase matches (very strong signal)
-            if len(query_words) > 1:
-                # Check for 2-word and 3-word phrases
-                words_list = query_lower.split()
-                for i in range(len(words_list) - 1):
-                    two_word = f"{words_list[i]} {words_list[i+1]}"
-                    if two_word in result_lower:
-                        score += 10
-                    
-                    if i < len(words_list) - 2:
-                        three_word = f"{words_list[i]} {words_list[i+1]} {words_list[i+2]}"
-                        if three_word in result_lower:
-                            score += 15
-            
-            # Boost for individual keyword matches
-            for word in query_words:
-                if len(word) > 3:  # Ignore short words like "is", "at", "in"
-                    if word in result_lower:
-                        score += 3
+    def _vector_candidates(self, query, candidates, embeddings, mask=None):
+        """(ids, scores) from the vector retriever"""
+        return self.vector_search.search_with_scores(query, candidates, embeddings=embeddings, mask=mask)
+    
+    def _keyword_candidates(self, query, candidates, embeddings=None, mask=None):
+        """(ids, scores) from the keyword retriever"""
+        keyword_hits = self.keyword_search.search_with_scores(query, candidates, mask=mask)
+        keyword_ids = np.array([i for i, _ in keyword_hits], dtype=np.int64)
+        keyword_scores = np.array([score for _, score in keyword_hits], dtype=np.float32)
+        return keyword_ids, keyword_scores
+    
+    def _retrieve_concurrently(self, retrievers, query, candidates, embeddings, timeout=RETRIEVER_TIMEOUT):
+        """
+        Run the retrievers on the shared retrieval pool
+        A retriever that fails or misses the timeout (RETRIEVER_TIMEOUT, or less when the request's
+        deadline is closer) contributes no hits, so search degrades to the other retrievers' results
+        instead of waiting on it
+        """
+        executor = get_retrieval_executor()
+        deadline = time.monotonic() + timeout
+        futures = [
+            (name, executor.submit(fn, query, candidates, embeddings, mask))
+            for name, fn, mask, _ in retrievers
+        ]
+        
+        results = []
+        for name, future in futures:
+            try:
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning(f"⏳ {name} retriever exceeded {timeout:.2f}s, using the other retrievers' results")
+                results.append(_NO_HITS)
+            except Exception as e:
+                logger.error(f"❌ {name} retriever failed: {e}")
+                results.append(_NO_HITS)
+        
+        return results
+    
+    def _fuse_scores(self, ranked_lists):
+        """
+        Combine ranked (ids, scores, weight) lists into one ranking
+        
+        FUSION_METHOD "rrf" uses reciprocal rank fusion; "weighted" sums min-max normalized scores
+        
+        Returns:
+            (doc_ids, fused_scores) arrays, best first
+        """
+        fused = np.zeros(len(self.vector_search.chunks), dtype=np.float32)
+        
+        for ids, scores, weight in ranked_lists:
+            if len(ids) == 0:
+                continue
             
-            # Boost for recency (if metadata indicates recent/current)
-            if any(word in result_lower for word in ['current', 'present', '2024', '2025']):
-                if any(word in query_words for word in ['current', 'now', 'recent', 'latest']):
-                    score += 5
+            if FUSION_METHOD == "weighted":
+                spread = scores.max() - scores.min()
+                contribution = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+            else:
+                contribution = 1.0 / (RRF_K + np.arange(1, len(ids) + 1, dtype=np.float32))
             
-            scored_results.append((score, result))
+            np.add.at(fused, ids, weight * contribution)
         
-        # Sort by score (highest first) and return results
-        scored_results.sort(reverse=True, key=lambda x: x[0])
-        return [result for score, result in scored_results]
\ No newline at end of file
+        candidates = np.unique(np.concatenate([ids for ids, _, _ in ranked_lists])) if ranked_lists else np.empty(0, dtype=np.int64)
+        order = np.argsort(-fused[candidates], kind="stable")
+        doc_ids = candidates[order]
+        return doc_ids, fused[doc_ids]
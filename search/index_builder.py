@@ -0,0 +1,178 @@
+"""
+Offline index build: document chunking and batched, multi-process chunk encoding
+Run as `build-index` (or `python -m search.index_builder`) to write the index directory
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+from typing import Dict, Iterator, List, Tuple
+from config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_DEVICE,
+    INDEX_DIR,
+    INDEX_BUILD_WORKERS,
+    INDEX_BUILD_BATCH_SIZE,
+    ANN_INDEX_TYPE,
+    logger
+)
+from search.ann_index import INDEX_TYPES
+from search.chunker import chunk_spans
+from search.index_store import SOURCE_EXTERNAL, SOURCE_PORTFOLIO
+
+# Per-process model used by pool workers (each worker loads its own copy)
+_worker_model = None
+
+
+def iter_documents(source: str = None) -> Iterator[Dict]:
+    """
+    Stream {"id", "text", "metadata"} documents
+
+    Args:
+        source: Path to a .jsonl (one document per line) or .json (list) file;
+            the built-in portfolio data when omitted
+    """
+    if source is None:
+        from data.portfolio_data import get_portfolio_data
+        yield from get_portfolio_data()
+    elif source.endswith(".jsonl"):
+        with open(source, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield _document(json.loads(line))
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                yield _document(item)
+
+
+def _document(item: Dict) -> Dict:
+    """Normalize a document read from a file"""
+    return {"id": item.get("id"), "text": item["text"], "metadata": item.get("metadata", {})}
+
+
+def count_chunks(source: str = None) -> int:
+    """Number of chunks a source splits into, without keeping its documents in memory"""
+    return sum(len(chunk_spans(item["text"])) for item in iter_documents(source))
+
+
+def _init_worker(model_name: str, device: str, threads: int):
+    """Load the model once per worker process"""
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)  # Split cores between workers instead of oversubscribing
+    except ImportError:
+        pass
+
+    from utils.embedding_registry import get_embedding_model
+    _worker_model = get_embedding_model(model_name, device)
+
+
+def _encode_batch(batch: Tuple[int, List[str]]) -> Tuple[int, np.ndarray]:
+    """Encode one batch in a worker, returning it with its starting row"""
+    start, texts = batch
+    embeddings = _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+    return start, np.asarray(embeddings, dtype=np.float32)
+
+
+def _batches(documents: Iterator[Dict], batch_size: int, ids_out: List[str], documents_out: List[str],
+             metadatas_out: List[Dict], chunks_out: List[Tuple[int, int, int]]):
+    """Chunk streamed documents into (start row, chunk texts) batches, collecting the document store as we go"""
+    texts = []
+    for item in documents:
+        parent = len(documents_out)
+        ids_out.append(item.get("id") or str(parent))
+        documents_out.append(item["text"])
+        metadatas_out.append(item["metadata"])
+        for start, end in chunk_spans(item["text"]):
+            chunks_out.append((parent, start, end))
+            texts.append(item["text"][start:end])
+            if len(texts) == batch_size:
+                yield len(chunks_out) - len(texts), texts
+                texts = []
+    if texts:
+        yield len(chunks_out) - len(texts), texts
+
+
+def encode_corpus(source: str = None, workers: int = INDEX_BUILD_WORKERS, batch_size: int = INDEX_BUILD_BATCH_SIZE,
+                  model_name: str = EMBEDDING_MODEL, device: str = EMBEDDING_DEVICE):
+    """
+    Chunk and encode every document of a source
+
+    Returns:
+        (embeddings, ids, documents, metadatas, chunks); embeddings is a (n_chunks, dim) float32
+        array and chunks the matching (parent, start, end) rows
+    """
+    # Counting first (a cheap pass next to encoding) lets batches land in one preallocated array
+    total = count_chunks(source)
+    ids, documents, metadatas, chunks = [], [], [], []
+    batches = _batches(iter_documents(source), batch_size, ids, documents, metadatas, chunks)
+    embeddings = None
+
+    def store(start, vectors):
+        nonlocal embeddings
+        if embeddings is None:
+            embeddings = np.empty((total, vectors.shape[1]), dtype=np.float32)
+        embeddings[start:start + len(vectors)] = vectors  # Workers finish out of order
+
+    if workers <= 1:
+        # Single process: use the shared model directly
+        _init_worker(model_name, device, os.cpu_count() or 1)
+        for batch in batches:
+            store(*_encode_batch(batch))
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # "spawn" so workers don't inherit torch's thread pools from the parent
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker, initargs=(model_name, device, threads)) as pool:
+            for start, vectors in pool.imap_unordered(_encode_batch, batches):
+                store(start, vectors)
+
+    if embeddings is None:
+        raise ValueError("No documents to index")
+    if len(chunks) != total:
+        raise ValueError(f"Source changed while indexing ({total} chunks counted, {len(chunks)} encoded)")
+    return embeddings, ids, documents, metadatas, np.array(chunks, dtype=np.int64)
+
+
+def build_index(source: str = None, index_dir: str = INDEX_DIR,
+                workers: int = INDEX_BUILD_WORKERS, batch_size: int = INDEX_BUILD_BATCH_SIZE,
+                model_name: str = EMBEDDING_MODEL, device: str = EMBEDDING_DEVICE, index_type: str = ANN_INDEX_TYPE):
+    """Encode a source and write the index directory"""
+    from search.vector_search import VectorSearch
+
+    start_time = time.time()
+    embeddings, ids, documents, metadatas, chunks = encode_corpus(source, workers, batch_size, model_name, device)
+    logger.info(f"✅ Encoded {len(chunks)} chunks of {len(documents)} documents in {time.time() - start_time:.1f}s "
+                f"({workers} workers)")
+
+    vector_search = VectorSearch()
+    vector_search.build_index(embeddings, documents, metadatas, ids=ids, chunks=chunks, index_type=index_type)
+    vector_search.model_name = model_name
+    vector_search.source = SOURCE_PORTFOLIO if source is None else SOURCE_EXTERNAL  # External input isn't rebuilt at startup
+    vector_search.save_index(os.path.abspath(index_dir))
+    return len(documents)
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Build the Boku search index")
+    parser.add_argument("--input", default=None, help=".jsonl or .json documents (default: built-in portfolio data)")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="Where to write the index directory")
+    parser.add_argument("--workers", type=int, default=INDEX_BUILD_WORKERS, help="Encoder processes")
+    parser.add_argument("--batch-size", type=int, default=INDEX_BUILD_BATCH_SIZE, help="Chunks per encode call")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Embedding model")
+    parser.add_argument("--device", default=EMBEDDING_DEVICE, help="Torch device for the encoders")
+    parser.add_argument("--index-type", default=ANN_INDEX_TYPE, choices=("auto",) + INDEX_TYPES,
+                        help="Vector index (auto picks by corpus size and memory budget)")
+    args = parser.parse_args(argv)
+
+    build_index(args.input, args.index_dir, args.workers, args.batch_size, args.model, args.device, args.index_type)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Versioned on-disk format for the search index and document store
+Vectors and document text are memory-mapped, so workers on one host share page cache
+pages and load in constant time; nothing on the load path is unpickled
+
+Layout of an index directory:
+    manifest.json          format version, model, dimension, counts, fingerprint, index type, chunking, source
+    vectors.f32            row-major float32 (chunks x dimension), L2-normalized, one row per chunk
+    index.faiss            only for non-flat FAISS indexes (read with IO_FLAG_MMAP)
+    documents.bin          UTF-8 document text, concatenated
+    documents.offsets.npy  int64 offsets (count + 1) into documents.bin
+    chunks.npy             int64 (chunks x 3): parent document row, start and end offsets
+    metadata.json          ids, content hashes and metadata, one column per field
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single writer assumed
+    fcntl = None
+
+FORMAT_VERSION = 2
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+FAISS_FILE = "index.faiss"
+DOCUMENTS_FILE = "documents.bin"
+OFFSETS_FILE = "documents.offsets.npy"
+CHUNKS_FILE = "chunks.npy"
+METADATA_FILE = "metadata.json"
+
+# Where an index's documents came from: the built-in portfolio data, or build-index --input
+SOURCE_PORTFOLIO = "portfolio"
+SOURCE_EXTERNAL = "external"
+
+
+class MmapFlatIndex:
+    """Exact inner-product search over memory-mapped vectors (same search API as a FAISS index)"""
+
+    def __init__(self, vectors: np.ndarray):
+        """
+        Args:
+            vectors: (n, d) float32 array, usually a read-only np.memmap
+        """
+        self.vectors = vectors
+        self.ntotal = vectors.shape[0]
+        self.d = vectors.shape[1]
+
+    def search(self, queries: np.ndarray, k: int, subset: np.ndarray = None):
+        """
+        Top k (scores, indices) per query row, padded with -1 like FAISS
+
+        Args:
+            subset: Optional row ids to restrict the search to (only those rows are scored)
+        """
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        rows = np.arange(self.ntotal) if subset is None else np.asarray(subset, dtype=np.int64)
+        if len(rows) == 0:
+            return scores, indices
+
+        top = min(k, len(rows))
+        candidates = self.vectors if subset is None else self.vectors[rows]
+        similarities = queries @ candidates.T
+        for row, sims in enumerate(similarities):
+            best = np.argpartition(-sims, top - 1)[:top] if top < len(rows) else np.arange(len(rows))
+            best = best[np.argsort(-sims[best], kind="stable")]
+            scores[row, :top] = sims[best]
+            indices[row, :top] = rows[best]
+        return scores, indices
+
+    def reconstruct_n(self, start: int, count: int) -> np.ndarray:
+        """Stored vectors [start, start + count)"""
+        return np.array(self.vectors[start:start + count])
+
+
+class DocumentStore:
+    """Read-only sequence of document texts backed by an offset-indexed blob"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        return self._blob[self._offsets[index]:self._offsets[index + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class MetadataColumns:
+    """Read-only sequence of metadata dicts stored column by column"""
+
+    def __init__(self, columns: Dict[str, List], count: int):
+        """
+        Args:
+            columns: Field name -> one value per document (None where the field is absent)
+            count: Number of documents
+        """
+        self.columns = columns
+        self._count = count
+        self._value_index = {}  # Field -> {value: row ids}, for filtering
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)
+        return {name: values[index] for name, values in self.columns.items() if values[index] is not None}
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def column(self, name: str) -> List:
+        """All values of one field (None where absent)"""
+        return self.columns.get(name, [None] * self._count)
+
+    def mask(self, filters: Dict) -> np.ndarray:
+        """
+        Boolean row mask for metadata filters
+
+        Args:
+            filters: Field -> allowed value or list of values; every field must match
+        """
+        mask = np.ones(self._count, dtype=bool)
+        for name, allowed in filters.items():
+            if not isinstance(allowed, (list, tuple, set)):
+                allowed = [allowed]
+            rows = self._value_rows(name)
+            field_mask = np.zeros(self._count, dtype=bool)
+            for value in allowed:
+                field_mask[rows.get(value, [])] = True
+            mask &= field_mask
+        return mask
+
+    def _value_rows(self, name: str) -> Dict:
+        """Value -> row ids for a scalar column, built on first use"""
+        if name not in self._value_index:
+            rows = {}
+            for i, value in enumerate(self.column(name)):
+                if isinstance(value, (str, int, float, bool)):
+                    rows.setdefault(value, []).append(i)
+            self._value_index[name] = {value: np.array(ids, dtype=np.int64) for value, ids in rows.items()}
+        return self._value_index[name]
+
+
+def to_columns(metadatas: List[Dict]) -> Dict[str, List]:
+    """Turn a list of metadata dicts into field -> values columns"""
+    names = []
+    for metadata in metadatas:
+        names.extend(name for name in metadata if name not in names)
+    return {name: [metadata.get(name) for metadata in metadatas] for name in names}
+
+
+def write_index_dir(path: str, faiss_index, vectors: np.ndarray, documents: List[str], metadatas: List[Dict],
+                    ids: List[str], hashes: List[str], fingerprint: str, model: str,
+                    chunks: np.ndarray = None, chunking: Dict = None, source: str = SOURCE_PORTFOLIO):
+    """
+    Write an index directory, replacing any existing one atomically
+
+    chunks maps each vector row to (parent document, start, end); without it every
+    document is a single chunk. chunking records the settings the chunks were made with.
+    source says where the documents came from (SOURCE_PORTFOLIO or SOURCE_EXTERNAL)
+
+    Processes that still have the old files mapped keep reading them until they reload.
+    Each writer fills its own temporary directory and the swap happens under a lock file,
+    so concurrent writers (several workers rebuilding at startup) never see each other's files
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=os.path.basename(path) + ".tmp-", dir=parent)
+    try:
+        os.chmod(tmp_path, 0o755)
+        _write_files(tmp_path, faiss_index, vectors, documents, metadatas, ids, hashes, fingerprint, model,
+                     chunks, chunking, source)
+
+        old_path = tmp_path + ".old"
+        with _index_lock(path):
+            if os.path.exists(path):
+                os.rename(path, old_path)
+            os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)  # Only left behind if writing failed
+
+
+@contextmanager
+def _index_lock(path: str, shared: bool = False):
+    """Hold the index directory's lock file (exclusive to swap, shared to open)"""
+    try:
+        lock_file = open(path + ".lock", "a") if fcntl is not None else None
+    except OSError:
+        if not shared:
+            raise
+        lock_file = None  # Read-only location: nobody can be writing there
+    if lock_file is None:
+        yield
+        return
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_files(tmp_path: str, faiss_index, vectors: np.ndarray, documents: List[str], metadatas: List[Dict],
+                 ids: List[str], hashes: List[str], fingerprint: str, model: str,
+                 chunks: np.ndarray = None, chunking: Dict = None, source: str = SOURCE_PORTFOLIO):
+    """Write every file of an index directory into tmp_path"""
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    vectors.tofile(os.path.join(tmp_path, VECTORS_FILE))
+
+    index_type = "flat"
+    if faiss_index is not None and not isinstance(faiss_index, (faiss.IndexFlat, MmapFlatIndex)):
+        index_type = "faiss"
+        faiss.write_index(faiss_index, os.path.join(tmp_path, FAISS_FILE))
+
+    encoded = [text.encode("utf-8") for text in documents]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    with open(os.path.join(tmp_path, DOCUMENTS_FILE), "wb") as f:
+        for text in encoded:
+            f.write(text)
+    np.save(os.path.join(tmp_path, OFFSETS_FILE), offsets)
+
+    if chunks is None:
+        chunks = np.column_stack([np.arange(len(encoded)), np.zeros(len(encoded)), [len(text) for text in documents]])
+    np.save(os.path.join(tmp_path, CHUNKS_FILE), np.asarray(chunks, dtype=np.int64).reshape(-1, 3))
+
+    with open(os.path.join(tmp_path, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump({"id": list(ids), "hash": list(hashes), "metadata": to_columns(metadatas)}, f)
+
+    # The manifest goes last: a directory without one is never loaded
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model": model,
+        "dimension": int(vectors.shape[1]),
+        "count": len(documents),
+        "chunks": int(vectors.shape[0]),
+        "fingerprint": fingerprint,
+        "index_type": index_type,
+        "chunking": chunking,
+        "source": source
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_index_dir(path: str) -> Dict:
+    """
+    Open an index directory without copying vectors or text into memory
+
+    Returns:
+        Dict with manifest, index, vectors, chunks, documents, metadatas, ids and hashes
+
+    Raises:
+        ValueError: If the directory is missing a manifest or uses an unknown format version
+    """
+    # Shared lock: a concurrent writer can't swap the directory out while its files are opened
+    with _index_lock(path, shared=True):
+        return _open_index_dir(path)
+
+
+def _open_index_dir(path: str) -> Dict:
+    """Open the files of an index directory (caller holds the shared lock)"""
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ValueError(f"No index manifest in {path}")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version {manifest.get('format_version')}")
+    manifest.setdefault("source", SOURCE_PORTFOLIO)  # Written before sources were recorded
+
+    count, dimension = manifest["count"], manifest["dimension"]
+    if manifest["chunks"]:
+        vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r",
+                            shape=(manifest["chunks"], dimension))
+        chunks = np.load(os.path.join(path, CHUNKS_FILE), mmap_mode="r", allow_pickle=False)
+    else:
+        vectors = np.empty((0, dimension), dtype=np.float32)
+        chunks = np.empty((0, 3), dtype=np.int64)
+
+    if manifest["index_type"] == "faiss":
+        index = faiss.read_index(os.path.join(path, FAISS_FILE), faiss.IO_FLAG_MMAP)
+    else:
+        index = MmapFlatIndex(vectors)
+
+    offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r", allow_pickle=False)
+    if offsets[-1] > 0:
+        blob = np.memmap(os.path.join(path, DOCUMENTS_FILE), dtype=np.uint8, mode="r")
+    else:
+        blob = np.empty(0, dtype=np.uint8)
+
+    with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+        columns = json.load(f)
+
+    return {
+        "manifest": manifest,
+        "index": index,
+        "vectors": vectors,
+        "chunks": chunks,
+        "documents": DocumentStore(blob, offsets),
+        "metadatas": MetadataColumns(columns["metadata"], count),
+        "ids": columns["id"],
+        "hashes": columns["hash"]
+    }
@@ -1,34 +1,71 @@
 """
 Keyword-based search functionality
-Optimized for efficiency
+BM25 over an inverted index built once at initialization
 """
 
-from utils.keyword_extractor import calculate_keyword_score, normalize_query
+import heapq
+import math
+from collections import Counter, defaultdict
+from config import BM25_K1, BM25_B, KEYWORD_FIELD_BOOST
+from utils.keyword_extractor import normalize_query, tokenize
 
 
 class KeywordSearch:
     """Handles keyword-based search"""
     
     def __init__(self, documents_data, metadatas_data):
-        """Initialize keyword search with documents and metadata"""
+        """Initialize keyword search with documents and metadata, building the inverted index"""
         self.documents_data = documents_data
         self.metadatas_data = metadatas_data
-    
-    def search(self, query, k=5):
-        """Perform keyword-based search"""
-        query_words = normalize_query(query)
         
-        scores = []
+        # {term: [(doc_index, weighted_term_frequency), ...]}
+        self.postings = defaultdict(list)
+        self.doc_lengths = []
+        self._build_index()
+    
+    def _build_index(self):
+        """Tokenize every document once; metadata keywords count KEYWORD_FIELD_BOOST times"""
         for i, (doc, meta) in enumerate(zip(self.documents_data, self.metadatas_data)):
-            # Get keywords from metadata
-            meta_keywords = [kw.lower() for kw in meta.get('keywords', [])]
+            text_terms = Counter(tokenize(doc))
+            keyword_terms = Counter(tokenize(" ".join(meta.get('keywords', []))))
+            
+            frequencies = defaultdict(float)
+            for term, count in text_terms.items():
+                frequencies[term] += count
+            for term, count in keyword_terms.items():
+                frequencies[term] += count * KEYWORD_FIELD_BOOST
             
-            # Calculate keyword match score
-            score = calculate_keyword_score(query_words, meta_keywords, doc)
+            for term, frequency in frequencies.items():
+                self.postings[term].append((i, frequency))
+            self.doc_lengths.append(sum(frequencies.values()))
+        
+        self.avg_doc_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        
+        # Inverse document frequency per term (BM25 variant that never goes negative)
+        num_docs = len(self.doc_lengths)
+        self.idf = {
+            term: math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+    
+    def search_with_scores(self, query, k=5, mask=None):
+        """Return the top k (document_index, bm25_score) pairs, best first (only documents in mask, if given)"""
+        scores = defaultdict(float)
+        
+        for term in normalize_query(query):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
             
-            if score > 0:
-                scores.append((score, i, doc))
+            idf = self.idf[term]
+            for doc_index, frequency in postings:
+                if mask is not None and not mask[doc_index]:
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_index] / self.avg_doc_length
+                scores[doc_index] += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
         
-        # Sort by score and return top k
-        scores.sort(reverse=True, key=lambda x: x[0])
-        return [doc for score, idx, doc in scores[:k]]
\ No newline at end of file
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+    
+    def search(self, query, k=5):
+        """Perform keyword-based search"""
+        return [self.documents_data[i] for i, score in self.search_with_scores(query, k)]
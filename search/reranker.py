@@ -0,0 +1,110 @@
+"""
+Keyword re-ranking of hybrid search candidates
+Document-side features are extracted once when the index is built; a query only
+computes its category weights and the phrase/word matches that depend on its text
+"""
+
+import json
+import re
+import numpy as np
+from typing import Dict, List
+from config import RERANK_KEYWORDS_PATH, logger
+
+
+def load_rerank_keywords(path: str = RERANK_KEYWORDS_PATH) -> Dict:
+    """Load the category and boost tables, or empty tables if the file is unusable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Could not load re-rank keywords from {path}: {e}")
+        return {"categories": []}
+
+
+class Reranker:
+    """Scores candidates by query intent categories, phrase matches and keyword matches"""
+
+    def __init__(self, keywords: Dict = None):
+        """
+        Args:
+            keywords: Parsed keyword tables (defaults to RERANK_KEYWORDS_PATH)
+        """
+        keywords = keywords if keywords is not None else load_rerank_keywords()
+        categories = keywords.get("categories", [])
+
+        self.category_names = [c["name"] for c in categories]
+        self.category_weights = np.array([c["weight"] for c in categories], dtype=np.float32)
+
+        # Query word -> bitmask of the categories it signals
+        self._query_masks: Dict[str, int] = {}
+        for bit, category in enumerate(categories):
+            for term in category["query_terms"]:
+                self._query_masks[term] = self._query_masks.get(term, 0) | (1 << bit)
+        self._bits = np.arange(len(categories), dtype=np.int64)
+
+        # One alternation per category; document terms match as substrings, like `term in text`
+        self._document_patterns = [
+            re.compile("|".join(re.escape(term) for term in category["document_terms"]))
+            for category in categories
+        ]
+
+        phrase_weights = keywords.get("phrase_weights", {})
+        self.two_word_weight = phrase_weights.get("two_word", 10)
+        self.three_word_weight = phrase_weights.get("three_word", 15)
+        word_match = keywords.get("word_match", {})
+        self.word_weight = word_match.get("weight", 3)
+        self.word_min_length = word_match.get("min_length", 4)
+
+        # Filled by index()
+        self.features = np.zeros((0, len(categories)), dtype=np.bool_)
+        self._lowered: List[str] = []
+
+    def index(self, documents: List[str]):
+        """Precompute per-document category features and lowercased text"""
+        self._lowered = [doc.lower() for doc in documents]
+
+        features = np.zeros((len(documents), len(self._document_patterns)), dtype=np.bool_)
+        for column, pattern in enumerate(self._document_patterns):
+            features[:, column] = [pattern.search(text) is not None for text in self._lowered]
+        self.features = features
+
+        logger.info(f"✅ Re-rank features built for {len(documents)} documents")
+
+    def query_weights(self, query_words) -> np.ndarray:
+        """Weight per category for the categories this query signals (zero elsewhere)"""
+        mask = 0
+        for word in query_words:
+            mask |= self._query_masks.get(word, 0)
+        return self.category_weights * ((mask >> self._bits) & 1)
+
+    def score(self, query: str, doc_ids) -> np.ndarray:
+        """Score the given document ids for the query"""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        words_list = query.lower().split()
+        query_words = set(words_list)
+
+        # Category boosts: one dot product against the precomputed features
+        scores = self.features[doc_ids].astype(np.float32) @ self.query_weights(query_words)
+
+        # Substrings that depend on the query text: multi-word phrases and longer keywords
+        boosts = []
+        if len(query_words) > 1:
+            for i in range(len(words_list) - 1):
+                boosts.append((" ".join(words_list[i:i + 2]), self.two_word_weight))
+                if i < len(words_list) - 2:
+                    boosts.append((" ".join(words_list[i:i + 3]), self.three_word_weight))
+        boosts.extend((word, self.word_weight) for word in query_words if len(word) >= self.word_min_length)
+
+        candidates = [self._lowered[i] for i in doc_ids]
+        for text, weight in boosts:
+            scores += weight * np.fromiter((text in doc for doc in candidates), dtype=np.float32, count=len(candidates))
+
+        return scores
+
+    def rerank(self, query: str, doc_ids) -> np.ndarray:
+        """Return doc_ids ordered by score, highest first (ties keep their input order)"""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        if len(doc_ids) == 0:
+            return doc_ids
+        order = np.argsort(-self.score(query, doc_ids), kind="stable")
+        return doc_ids[order]
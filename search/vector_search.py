@@ -5,10 +5,20 @@ Optimized for efficiency
 
 import faiss
 import numpy as np
-import pickle
-import os
-from sentence_transformers import SentenceTransformer
-from config import EMBEDDING_MODEL, MAX_TOKENS, logger
+from config import MAX_TOKENS, INDEX_BUILD_BATCH_SIZE, EMBEDDING_CACHE_PATH, ANN_INDEX_TYPE, ANN_FLAT_MAX_DOCS, logger
+from utils.embedding_registry import get_embedding_model
+from utils.embedding_context import EmbeddingContext
+from search.embedding_cache import EmbeddingCache, content_hash, corpus_fingerprint, portfolio_fingerprint
+from search.index_store import (
+    SOURCE_PORTFOLIO,
+    MetadataColumns,
+    MmapFlatIndex,
+    read_index_dir,
+    to_columns,
+    write_index_dir
+)
+from search.ann_index import build_ann_index, filtered_search, set_search_params
+from search.chunker import ChunkTexts, chunk_documents, chunking_settings, group_by_parent, merge_spans, whole_documents
 
 
 class VectorSearch:
@@ -16,86 +26,221 @@ class VectorSearch:
     
     def __init__(self):
         """Initialize the vector search system"""
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        self.embedding_model = get_embedding_model()
         self.faiss_index = None
+        self.vectors = None  # Normalized chunk vectors (memory-mapped when loaded from disk)
+        self.chunks = np.empty((0, 3), dtype=np.int64)  # Per vector row: parent document, start, end
+        self.chunking = None  # Chunk size / overlap the index was built with
         self.documents_data = []
         self.metadatas_data = []
+        self.ids_data = []
+        self.hashes_data = []  # Content hash of each document's text
+        self.fingerprint = None  # Hash of the whole indexed corpus (None for legacy indexes)
+        self.model_name = None  # Model the stored vectors were built with
+        self.source = SOURCE_PORTFOLIO  # Portfolio data, or external input from build-index --input
     
-    def load_index(self, faiss_index_path, data_path):
-        """Load existing FAISS index and data"""
+    def load_index(self, index_dir):
+        """
+        Open a saved index directory (vectors and text stay memory-mapped)
+        
+        Raises:
+            ValueError: An external index was built with another embedding model than queries use
+        """
         try:
-            self.faiss_index = faiss.read_index(faiss_index_path)
-            
-            with open(data_path, 'rb') as f:
-                data = pickle.load(f)
-                self.documents_data = data['documents']
-                self.metadatas_data = data['metadatas']
+            data = read_index_dir(index_dir)
+        except Exception as e:
+            logger.error(f"❌ Failed to load FAISS index: {e}")
+            return False
+        
+        # Queries are embedded with our model, so vectors from another model can't be searched (or reused)
+        model_name = data['manifest']['model']
+        if model_name != self.embedding_model.model_name:
+            if data['manifest']['source'] == SOURCE_PORTFOLIO:
+                logger.info(f"🔄 Saved index was built with {model_name}, ignoring it")
+                return False
+            raise ValueError(f"Index at {index_dir} was built with {model_name} but queries are embedded with "
+                             f"{self.embedding_model.model_name}; rebuild it with --model {self.embedding_model.model_name}")
+        
+        try:
+            self.faiss_index = set_search_params(data['index'])  # Apply the configured nprobe / efSearch
+            self.vectors = data['vectors']
+            self.chunks = data['chunks']
+            self.chunking = data['manifest']['chunking']
+            self.documents_data = data['documents']
+            self.metadatas_data = data['metadatas']
+            self.ids_data = data['ids']
+            self.hashes_data = data['hashes']
+            self.fingerprint = data['manifest']['fingerprint']
+            self.model_name = model_name
+            self.source = data['manifest']['source']
             
-            logger.info(f"✅ Loaded FAISS index with {len(self.documents_data)} documents")
+            logger.info(f"✅ Loaded FAISS index with {len(self.documents_data)} documents "
+                        f"({len(self.chunks)} chunks, {self.source} source)")
             return True
         except Exception as e:
             logger.error(f"❌ Failed to load FAISS index: {e}")
             return False
     
+    def is_stale(self, portfolio_data):
+        """
+        Whether the loaded index differs from portfolio_data (or was built with other chunking)
+        An index built from external input is never stale: the portfolio data isn't its source
+        (load_index never loads an index built with another model)
+        """
+        if self.source != SOURCE_PORTFOLIO:
+            return False
+        return (self.fingerprint != portfolio_fingerprint(portfolio_data)
+                or self.chunking != chunking_settings())
+    
     def create_index(self, portfolio_data):
-        """Create FAISS index from portfolio data"""
-        # Create embeddings for all documents
-        embeddings = []
-        for item in portfolio_data:
-            embedding = self.embedding_model.encode(item["text"]).tolist()
-            embeddings.append(embedding)
-            self.documents_data.append(item["text"])
-            self.metadatas_data.append(item["metadata"])
-        
-        # Create FAISS index
-        dimension = len(embeddings[0])
-        self.faiss_index = faiss.IndexFlatIP(dimension)
-        embeddings_array = np.array(embeddings).astype('float32')
-        faiss.normalize_L2(embeddings_array)
-        self.faiss_index.add(embeddings_array)
-        
-        logger.info(f"✅ Created FAISS index with {len(portfolio_data)} documents")
+        """
+        Create FAISS index from portfolio data, one vector per chunk
+        Only chunks whose text is not in the loaded index or the embedding cache are encoded
+        """
+        if not portfolio_data:
+            raise ValueError("Cannot create an index from an empty portfolio")
+        
+        documents = [item["text"] for item in portfolio_data]
+        chunks = chunk_documents(documents)
+        texts = list(ChunkTexts(documents, chunks))
+        hashes = [content_hash(text) for text in texts]
+        
+        # Embeddings we already have: the on-disk cache, then the currently loaded index
+        cache = EmbeddingCache(EMBEDDING_CACHE_PATH, self.embedding_model.model_name)
+        known = self._indexed_embeddings()
+        found = [known.get(h) if h in known else cache.get(h) for h in hashes]
+        missing = [row for row, vector in enumerate(found) if vector is None]
+        
+        # Encode the rest in batches
+        encoded = None
+        if missing:
+            encoded = np.asarray(self.embedding_model.encode(
+                [texts[row] for row in missing], batch_size=INDEX_BUILD_BATCH_SIZE,
+                convert_to_numpy=True, show_progress_bar=False
+            ), dtype=np.float32)
+        
+        dimension = encoded.shape[1] if encoded is not None else len(found[0])
+        embeddings = np.empty((len(texts), dimension), dtype=np.float32)
+        for row, vector in enumerate(found):
+            if vector is not None:
+                embeddings[row] = vector
+        if missing:
+            embeddings[missing] = encoded
+        
+        logger.info(f"🔄 Embedded {len(missing)} new or changed chunks, reused {len(texts) - len(missing)}")
+        self.build_index(
+            embeddings, documents, [item["metadata"] for item in portfolio_data],
+            ids=[item.get("id", str(i)) for i, item in enumerate(portfolio_data)], chunks=chunks
+        )
+        
+        # The cache only speeds up the next build; failing to write it must not fail this one
+        try:
+            cache.save(hashes, embeddings)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not save embedding cache {EMBEDDING_CACHE_PATH}: {e}")
+    
+    def _indexed_embeddings(self):
+        """Map chunk content hash -> vector for the currently loaded index (empty if unavailable)"""
+        if self.vectors is None or len(self.chunks) != len(self.vectors):
+            return {}
+        return dict(zip((content_hash(text) for text in ChunkTexts(self.documents_data, self.chunks)), self.vectors))
+    
+    def build_index(self, embeddings, documents, metadatas, ids=None, chunks=None, index_type=ANN_INDEX_TYPE):
+        """
+        Create the FAISS index from precomputed embeddings (normalized in place)
+        
+        Args:
+            embeddings: One row per chunk
+            chunks: (parent, start, end) rows from chunk_documents; None when each embedding is a whole document
+        """
+        self.documents_data = list(documents)
+        self.chunks = chunks if chunks is not None else whole_documents(self.documents_data)
+        self.chunking = chunking_settings() if chunks is not None else None
+        self.metadatas_data = MetadataColumns(to_columns(metadatas), len(self.documents_data))
+        self.ids_data = list(ids) if ids is not None else [str(i) for i in range(len(self.documents_data))]
+        self.hashes_data = [content_hash(text) for text in self.documents_data]
+        self.fingerprint = corpus_fingerprint(self.ids_data, self.hashes_data, self.metadatas_data)
+        self.model_name = self.embedding_model.model_name
+        self.source = SOURCE_PORTFOLIO
+        
+        faiss.normalize_L2(embeddings)
+        self.faiss_index = build_ann_index(embeddings, index_type)
+        self.vectors = embeddings
+        
+        logger.info(f"✅ Created FAISS index with {len(self.documents_data)} documents ({len(self.chunks)} chunks)")
     
-    def save_index(self, faiss_index_path, data_path):
-        """Save FAISS index and data to files"""
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(faiss_index_path), exist_ok=True)
-        os.makedirs(os.path.dirname(data_path), exist_ok=True)
-        
-        # Save FAISS index
-        faiss.write_index(self.faiss_index, faiss_index_path)
-        
-        # Save documents and metadata
-        data = {
-            'documents': self.documents_data,
-            'metadatas': self.metadatas_data
-        }
-        with open(data_path, 'wb') as f:
-            pickle.dump(data, f)
+    def save_index(self, index_dir):
+        """Save the index, documents and metadata as an index directory"""
+        write_index_dir(
+            index_dir, self.faiss_index, self.vectors, list(self.documents_data), list(self.metadatas_data),
+            self.ids_data, self.hashes_data, self.fingerprint, self.model_name,
+            chunks=self.chunks, chunking=self.chunking, source=self.source
+        )
         
         logger.info(f"✅ Saved FAISS index with {len(self.documents_data)} documents")
     
-    def search(self, query, k=10):
-        """Perform vector search on the index"""
+    def metadata_mask(self, filters):
+        """Boolean mask of chunks whose document metadata matches filters ({field: value or values})"""
+        return self.metadatas_data.mask(filters)[self.chunks[:, 0]]
+    
+    def search_with_scores(self, query, k=10, embeddings=None, mask=None):
+        """
+        Return the top k (chunk indices, cosine scores) as arrays, best first
+        Reuses the request's EmbeddingContext if given; with a mask, only matching chunks are searched
+        """
         if self.faiss_index is None:
-            return []
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        allowed = None
+        if mask is not None:
+            allowed = np.flatnonzero(mask)
+            if len(allowed) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
         
-        # Encode query
-        query_embedding = self.embedding_model.encode(query).astype('float32')
-        query_embedding = query_embedding.reshape(1, -1)
+        # Encode query (copied, since FAISS normalizes in place)
+        embeddings = embeddings or EmbeddingContext(self.embedding_model)
+        query_embedding = np.array(embeddings.embed(query), dtype='float32').reshape(1, -1)
         faiss.normalize_L2(query_embedding)
         
-        # Search FAISS index
-        scores, indices = self.faiss_index.search(query_embedding, k)
+        # Search FAISS index (it pads with -1 when k exceeds the corpus)
+        if allowed is None:
+            scores, indices = self.faiss_index.search(query_embedding, k)
+        elif len(allowed) <= ANN_FLAT_MAX_DOCS:
+            # A small filtered subset is cheapest (and exact) to scan directly
+            scores, indices = MmapFlatIndex(self.vectors).search(query_embedding, k, subset=allowed)
+        else:
+            scores, indices = filtered_search(self.faiss_index, query_embedding, k, allowed)
+        valid = (indices[0] >= 0) & (indices[0] < len(self.chunks))
+        return indices[0][valid], scores[0][valid]
+    
+    def get_context(self, index, chunk_ids=None):
+        """
+        Document text for prompt use
+        
+        With chunk_ids (hits in this document, best first), only those chunks are returned, merged
+        and up to MAX_TOKENS characters; otherwise the document is truncated if too long
+        """
+        text = self.documents_data[index]
+        if not chunk_ids:
+            return text[:MAX_TOKENS] + "..." if len(text) > MAX_TOKENS else text
         
-        # Get relevant documents
-        contexts = []
-        for idx in indices[0]:
-            if idx < len(self.documents_data):
-                context = self.documents_data[idx]
-                # Truncate context if too long
-                if len(context) > MAX_TOKENS:
-                    context = context[:MAX_TOKENS] + "..."
-                contexts.append(context)
+        # Add hit chunks in rank order while the merged text fits (the best one always does)
+        spans = []
+        for chunk_id in chunk_ids:
+            _, start, end = self.chunks[chunk_id]
+            merged = merge_spans(spans + [(int(start), int(end))])
+            if spans and sum(end - start for start, end in merged) > MAX_TOKENS:
+                continue
+            spans = merged
         
-        return contexts
\ No newline at end of file
+        context = " ... ".join(text[start:end] for start, end in spans)
+        if spans[0][0] > 0:
+            context = "..." + context
+        if spans[-1][1] < len(text.rstrip()):
+            context += "..."
+        return context
+    
+    def search(self, query, k=10, embeddings=None):
+        """Perform vector search on the index, one context per matching document"""
+        indices, _ = self.search_with_scores(query, k, embeddings=embeddings)
+        return [self.get_context(parent, chunk_ids) for parent, chunk_ids in group_by_parent(indices, self.chunks).items()]
@@ -37,10 +37,11 @@ setup(
     entry_points={
         "console_scripts": [
             "boku=app:main",
+            "build-index=search.index_builder:main",
         ],
     },
     include_package_data=True,
     package_data={
-        "": ["*.md", "*.txt", "*.yml", "*.yaml"],
+        "": ["*.md", "*.txt", "*.yml", "*.yaml", "*.json"],
     },
 )
@@ -0,0 +1,53 @@
+"""
+Test the vector index factory
+"""
+import sys
+import os
+import faiss
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.ann_index import (
+    INDEX_TYPES, build_ann_index, choose_index_type, filtered_search, index_type_name, set_search_params
+)
+
+
+def test_ann_index():
+    print("🚀 Testing ANN index factory...")
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((4000, 32)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+
+    for index_type in INDEX_TYPES:
+        index = build_ann_index(vectors.copy(), index_type)
+        assert index_type_name(index) == index_type and index.ntotal == 4000
+        set_search_params(index, nprobe=64, ef_search=128)
+        _, ids = index.search(vectors[:20], 1)
+        assert (ids[:, 0] == np.arange(20)).mean() >= 0.9, index_type
+    print("✅ Every index type finds stored vectors")
+
+    # Filters are enforced inside the index: only allowed ids come back, still k of them
+    allowed = np.arange(0, 4000, 7)
+    for index_type in INDEX_TYPES:
+        index = set_search_params(build_ann_index(vectors.copy(), index_type), nprobe=64, ef_search=128)
+        _, ids = filtered_search(index, vectors[:20], 5, allowed)
+        assert np.isin(ids, allowed).all() and (ids >= 0).all(), index_type
+    print("✅ Filtered search returns only allowed ids")
+
+    # Too few vectors to train IVF falls back to exact search
+    assert index_type_name(build_ann_index(vectors[:50].copy(), "ivf_pq")) == "flat"
+    print("✅ Small corpora fall back to flat")
+
+    # Auto selection: exact when small, then the best index that fits the memory budget
+    assert choose_index_type(1000, 384) == "flat"
+    assert choose_index_type(200000, 384, memory_budget_mb=1024) == "hnsw"
+    assert choose_index_type(200000, 384, memory_budget_mb=300) == "ivf_flat"
+    assert choose_index_type(200000, 384, memory_budget_mb=50) == "ivf_pq"
+    print("✅ Auto selection follows corpus size and memory budget")
+
+
+if __name__ == "__main__":
+    test_ann_index()
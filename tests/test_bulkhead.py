@@ -0,0 +1,98 @@
+"""
+Test the upstream bulkhead (concurrency limit, bounded queue, load shedding)
+"""
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm.resilience import Bulkhead, CircuitBreaker, UpstreamOverloaded
+from llm.response_generator import ResponseGenerator
+
+
+def test_bulkhead():
+    print("🚀 Testing upstream bulkhead...")
+
+    bulkhead = Bulkhead(max_concurrent=2, max_queue=1, queue_timeout=0.05)
+    bulkhead.acquire()
+    bulkhead.acquire()
+    assert not bulkhead.is_full()
+
+    # The third caller queues; with the queue full a fourth is rejected immediately
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(bulkhead.acquire(timeout=5)))
+    waiter.start()
+    while bulkhead.get_stats()["queued"] == 0:
+        time.sleep(0.001)
+    assert bulkhead.is_full()
+    started = time.monotonic()
+    try:
+        bulkhead.acquire()
+        assert False, "a full queue must reject"
+    except UpstreamOverloaded:
+        pass
+    assert time.monotonic() - started < 0.05
+    print("✅ Calls beyond the limit queue, a full queue rejects fast")
+
+    # A released slot goes straight to the queued caller
+    bulkhead.release()
+    waiter.join(timeout=5)
+    assert granted == [None] and bulkhead.get_stats()["active"] == 2
+
+    # Waiting longer than the queue timeout gives up without holding a slot
+    try:
+        bulkhead.acquire()
+        assert False, "a queued call must time out"
+    except UpstreamOverloaded:
+        pass
+    stats = bulkhead.get_stats()
+    assert stats["queued"] == 0 and stats["rejected"] == 1 and stats["timed_out"] == 1
+    bulkhead.release()
+    bulkhead.release()
+    print("✅ Slots are handed over in order and queue timeouts shed load")
+
+    # Coroutines share the same limit
+    async_bulkhead = Bulkhead(max_concurrent=2, max_queue=10, queue_timeout=5)
+    running = []
+    peak = []
+
+    async def call():
+        async with async_bulkhead.aslot():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(8)))
+
+    asyncio.run(run())
+    assert max(peak) == 2 and async_bulkhead.get_stats()["active"] == 0
+    print("✅ Async callers never exceed the concurrency limit")
+
+    # A stream turned away by a full bulkhead must not use up the half-open circuit's probe
+    generator = ResponseGenerator()
+    generator.bulkhead = Bulkhead(max_concurrent=1, max_queue=0)
+    generator.bulkhead.acquire()
+    generator.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    generator.breaker.record_failure()
+    time.sleep(0.02)
+
+    async def stream():
+        return [piece async for piece in generator.astream_response("Where does he work?", ["He works at Acer."])]
+
+    try:
+        asyncio.run(stream())
+        assert False, "a full bulkhead must reject the stream"
+    except UpstreamOverloaded:
+        pass
+    assert generator.breaker.allow_request()
+    print("✅ Rejected streams leave the circuit's probe for the next caller")
+
+
+if __name__ == "__main__":
+    test_bulkhead()
@@ -0,0 +1,72 @@
+"""
+Test the FAISS index behind the semantic cache's "faiss" backend
+"""
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import SemanticCache
+from utils.cache_index import FaissCacheIndex
+
+
+def _unit_vectors(count, dimension=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_cache_index():
+    print("🚀 Testing FAISS semantic cache index...")
+
+    vectors = _unit_vectors(200)
+
+    # Flat mode: exact search, physical removal
+    index = FaissCacheIndex(32, hnsw_threshold=50)
+    ids = [index.add(vector) for vector in vectors[:10]]
+    assert ids == list(range(10)) and not index.is_hnsw
+    entry_id, score = index.search(vectors[3])
+    assert entry_id == 3 and score > 0.99
+    index.remove(3)
+    assert index.search(vectors[3])[0] != 3 and index.index.ntotal == 9
+    print("✅ Flat index finds and removes entries")
+
+    # Growing past the threshold migrates to HNSW with the same live entries
+    for vector in vectors[10:60]:
+        index.add(vector)
+    assert index.is_hnsw and len(index) == 59
+    assert all(index.search(vectors[i])[0] == i for i in (0, 20, 59))
+    print("✅ Index migrates to HNSW once it grows past the threshold")
+
+    # HNSW removals are tombstoned: never returned, then compacted away
+    index.remove(20)
+    assert 20 in index._tombstones and index.search(vectors[20])[0] != 20
+    for i in range(21, 30):
+        index.remove(i)
+    assert len(index._tombstones) == 10 and index.index.ntotal == 59
+    for vector in vectors[60:200]:
+        index.add(vector)
+    for i in range(60, 140):
+        index.remove(i)
+    assert len(index._tombstones) <= max(64, len(index) // 10)
+    assert index.index.ntotal == len(index) + len(index._tombstones)
+    assert all(index.search(vectors[i])[0] == i for i in (0, 150, 199))
+    assert index.search(vectors[100])[0] != 100
+    print("✅ Removed HNSW entries are skipped and compacted away")
+
+    # The cache's faiss backend evicts in LRU order like the matrix backend
+    cache = SemanticCache(max_dynamic_cache=2, backend="faiss", persistent_path=None)
+    dimension = cache._ann.dimension
+    cache_vectors = _unit_vectors(3, dimension, seed=1)
+    for i in range(3):
+        cache._insert(f"question {i}", cache_vectors[i], f"answer {i}")
+    with cache._lock:
+        assert cache._lookup(cache_vectors[0]) is None
+        assert cache._lookup(cache_vectors[2]) == "answer 2"
+    assert len(cache._ann) == 2 and sorted(cache._slot_queries) == [1, 2]
+    print("✅ FAISS backend evicts the least recently used entry")
+
+
+if __name__ == "__main__":
+    test_cache_index()
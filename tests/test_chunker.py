@@ -0,0 +1,51 @@
+"""
+Test sentence-aware chunking and parent aggregation
+"""
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.chunker import ChunkTexts, chunk_documents, chunk_spans, group_by_parent, merge_spans
+
+
+def test_chunker():
+    print("🚀 Testing document chunker...")
+
+    sentences = [f"Sentence number {i} talks about React and Python projects." for i in range(12)]
+    text = " ".join(sentences)
+
+    spans = chunk_spans(text, size=200, overlap=70)
+    assert len(spans) > 1
+    assert all(end - start <= 200 for start, end in spans)
+    for start, end in spans:
+        # Chunks start and end on sentence boundaries
+        assert text[start:end].startswith("Sentence") and text[start:end].endswith(".")
+    for (_, previous_end), (next_start, _) in zip(spans, spans[1:]):
+        assert next_start < previous_end  # Consecutive chunks overlap
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    print("✅ Chunks follow sentence boundaries with overlap")
+
+    # Short documents stay whole; a sentence longer than the chunk size is split on words
+    assert chunk_spans("One short sentence.", size=200) == [(0, 19)]
+    long_spans = chunk_spans("word " * 100, size=50, overlap=0)
+    assert all(end - start <= 50 for start, end in long_spans) and len(long_spans) > 5
+    print("✅ Short documents stay whole, long sentences are split")
+
+    documents = ["Short one.", text]
+    chunks = chunk_documents(documents, size=200, overlap=70)
+    assert chunks[0].tolist() == [0, 0, 10] and (chunks[1:, 0] == 1).all()
+    texts = ChunkTexts(documents, chunks)
+    assert texts[0] == "Short one." and len(list(texts)) == len(chunks)
+
+    # Hits map back to parents in first-hit order, deduplicated
+    hits = group_by_parent(np.array([2, 0, 1, 3]), chunks)
+    assert list(hits) == [1, 0] and hits[1] == [2, 1, 3]
+    assert merge_spans([(50, 90), (0, 10), (11, 20), (80, 120)]) == [(0, 20), (50, 120)]
+    print("✅ Chunk hits aggregate to parent documents")
+
+
+if __name__ == "__main__":
+    test_chunker()
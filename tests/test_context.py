@@ -21,7 +21,7 @@ def test_context():
         print(f"👤 User: {query}")
         
         start = time.time()
-        response = engine.chat(query)
+        response = engine.chat(query, session_id="context-test")
         elapsed = time.time() - start
         
         print(f"🤖 Alfred ({elapsed:.2f}s): {response}\n")
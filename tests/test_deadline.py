@@ -0,0 +1,77 @@
+"""
+Test per-request deadlines
+"""
+import sys
+import os
+import time
+import asyncio
+import httpx
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import REQUEST_DEADLINE, REQUEST_DEADLINE_MAX
+from utils.deadline import Deadline, DeadlineExceeded, cap_timeout, check_deadline, request_deadline
+from llm.response_generator import ResponseGenerator
+
+
+async def _stalled_stream():
+    """One token, then an upstream that stops sending (each read would wait its full timeout)"""
+    yield b'data: {"choices": [{"delta": {"content": "He works at Acer. "}}]}\n\n'
+    await asyncio.sleep(5)
+    yield b"data: [DONE]\n\n"
+
+
+def test_deadline():
+    print("🚀 Testing request deadlines...")
+
+    deadline = Deadline(0.2)
+    assert 0 < deadline.remaining() <= 0.2 and not deadline.expired()
+    assert deadline.cap(30) <= 0.2 and deadline.cap(0.05) == 0.05
+    assert cap_timeout(None, 30) == 30 and cap_timeout(deadline, 30) <= 0.2
+    check_deadline(None, "retrieval")
+    deadline.check("retrieval")
+    print("✅ Stage timeouts shrink to the time left")
+
+    time.sleep(0.25)
+    assert deadline.expired() and deadline.remaining() == 0
+    try:
+        check_deadline(deadline, "the upstream call")
+        assert False, "an expired deadline must raise"
+    except DeadlineExceeded as e:
+        assert "the upstream call" in str(e)
+    print("✅ An expired deadline stops the next stage")
+
+    # Clients may shorten the budget, or lengthen it up to the cap; junk values use the default
+    assert request_deadline(5).seconds == 5
+    if REQUEST_DEADLINE_MAX > 0:
+        assert request_deadline(REQUEST_DEADLINE_MAX * 10).seconds == REQUEST_DEADLINE_MAX
+    for junk in (-1, float("nan"), float("inf"), float("-inf")):
+        default = request_deadline(junk)
+        assert (default is None) if REQUEST_DEADLINE <= 0 else default.seconds == REQUEST_DEADLINE
+    print("✅ Header overrides are capped and fall back to the default")
+
+    # A stalled stream ends at the deadline, not a read timeout later
+    generator = ResponseGenerator()
+    generator._async_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, content=_stalled_stream()))
+    )
+
+    async def stream():
+        pieces = []
+        try:
+            async for piece in generator.astream_response("Where does he work?", ["He works at Acer."],
+                                                          deadline=Deadline(0.5)):
+                pieces.append(piece)
+        except DeadlineExceeded:
+            return pieces
+        assert False, "a stalled stream must hit the deadline"
+
+    started = time.monotonic()
+    asyncio.run(stream())
+    assert time.monotonic() - started < 1.5
+    print("✅ Streams stop at the deadline")
+
+
+if __name__ == "__main__":
+    test_deadline()
@@ -0,0 +1,72 @@
+"""
+Test the content-hash embedding cache used by incremental index rebuilds
+"""
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import search.vector_search as vector_search
+from search.embedding_cache import EmbeddingCache, content_hash, corpus_fingerprint
+from search.vector_search import VectorSearch
+
+
+def test_embedding_cache():
+    print("🚀 Testing embedding cache...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.npz")
+        hashes = [content_hash("Surya works at Acer."), content_hash("Surya knows React.")]
+        vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+
+        EmbeddingCache(path, "model-a").save(hashes, vectors)
+
+        cache = EmbeddingCache(path, "model-a")
+        assert len(cache) == 2
+        assert np.array_equal(cache.get(hashes[1]), vectors[1])
+        assert cache.get(content_hash("Surya knows Vue.")) is None
+        print("✅ Embeddings round-trip by content hash")
+
+        # Vectors from a different model are never reused
+        assert len(EmbeddingCache(path, "model-b")) == 0
+        print("✅ Cache is keyed by model")
+
+        # Saving the current corpus drops deleted documents
+        cache.save(hashes[:1], vectors[:1])
+        assert EmbeddingCache(path, "model-a").get(hashes[1]) is None
+        print("✅ Deleted documents are pruned")
+
+        # Every save writes its own temp file and renames it into place
+        assert os.listdir(tmp) == ["cache.npz"]
+        print("✅ Saves leave no temp files behind")
+
+    # A cache that can't be written doesn't fail the build; an empty portfolio fails clearly
+    portfolio = [{"id": "work", "text": "Surya works at Acer America.", "metadata": {"category": "experience"}}]
+    original_path = vector_search.EMBEDDING_CACHE_PATH
+    vector_search.EMBEDDING_CACHE_PATH = "/proc/nope/cache.npz"
+    try:
+        search = VectorSearch()
+        search.create_index(portfolio)
+        assert search.faiss_index.ntotal == 1
+        try:
+            search.create_index([])
+            assert False, "an empty portfolio must be rejected"
+        except ValueError:
+            pass
+    finally:
+        vector_search.EMBEDDING_CACHE_PATH = original_path
+    print("✅ Index builds survive an unwritable cache and reject an empty portfolio")
+
+    # Any change to ids, text or metadata changes the corpus fingerprint
+    base = corpus_fingerprint(["a"], hashes[:1], [{"category": "experience"}])
+    assert base == corpus_fingerprint(["a"], hashes[:1], [{"category": "experience"}])
+    assert base != corpus_fingerprint(["a"], hashes[1:], [{"category": "experience"}])
+    assert base != corpus_fingerprint(["a"], hashes[:1], [{"category": "skills"}])
+    print("✅ Stale indexes are detected")
+
+
+if __name__ == "__main__":
+    test_embedding_cache()
@@ -0,0 +1,79 @@
+"""
+Test hedged upstream requests
+"""
+import sys
+import os
+import asyncio
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm.hedging import HedgePolicy, hedged
+from llm.resilience import Bulkhead
+
+
+def _policy(max_ratio=1.0, samples=20):
+    policy = HedgePolicy(percentile=95, max_ratio=max_ratio, min_samples=5, min_delay=0.01, window=60)
+    for _ in range(samples):
+        policy.record_latency(0.02)
+    return policy
+
+
+def test_hedging():
+    print("🚀 Testing hedged requests...")
+
+    assert HedgePolicy(min_samples=5).hedge_delay() is None
+    assert abs(_policy().hedge_delay() - 0.02) < 1e-6
+    print("✅ Hedge delay follows the rolling latency percentile")
+
+    async def run(latencies, policy, bulkhead=None):
+        started, cancelled = [], []
+
+        async def call():
+            number = len(started)
+            started.append(number)
+            try:
+                await asyncio.sleep(latencies[number])
+            except asyncio.CancelledError:
+                cancelled.append(number)
+                raise
+            return number
+
+        result = await hedged(call, policy, bulkhead)
+        await asyncio.sleep(0)
+        return result, started, cancelled
+
+    # A slow first call is hedged, the hedge wins and the first call is cancelled
+    policy = _policy()
+    assert asyncio.run(run([1.0, 0.01], policy)) == (1, [0, 1], [0])
+    assert policy.get_stats()["hedge_wins"] == 1
+
+    # A fast first call is never hedged
+    assert asyncio.run(run([0.001], _policy())) == (0, [0], [])
+    print("✅ Slow requests are hedged and the loser is cancelled")
+
+    # The hedge ratio cap bounds extra requests
+    policy = _policy(max_ratio=0.5)
+    results = [asyncio.run(run([0.05, 0.001], policy))[1] for _ in range(4)]
+    assert sum(len(started) - 1 for started in results) == 2
+    print("✅ Hedges stay within the ratio cap")
+
+    # The hedge needs its own upstream slot: none free means no hedge, and it gives its slot back
+    bulkhead = Bulkhead(max_concurrent=1, max_queue=0)
+    bulkhead.acquire()  # The primary's slot
+    assert asyncio.run(run([0.05, 0.001], _policy(), bulkhead))[1] == [0]
+    bulkhead = Bulkhead(max_concurrent=2, max_queue=0)
+    bulkhead.acquire()
+    assert asyncio.run(run([1.0, 0.01], _policy(), bulkhead))[0] == 1
+    assert bulkhead.get_stats()["active"] == 1
+    print("✅ Hedges never exceed the upstream concurrency limit")
+
+    # A cancelled slow call still counts as (at least) its elapsed latency
+    policy = _policy(samples=5)
+    asyncio.run(run([1.0, 0.01], policy))
+    assert policy.hedge_delay() > 0.02
+    print("✅ Cancelled calls keep the latency percentile honest")
+
+
+if __name__ == "__main__":
+    test_hedging()
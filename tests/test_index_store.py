@@ -0,0 +1,165 @@
+"""
+Test the memory-mapped index directory format
+"""
+import sys
+import os
+import json
+import tempfile
+import threading
+import faiss
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.index_store import SOURCE_EXTERNAL, SOURCE_PORTFOLIO, _index_lock, read_index_dir, write_index_dir
+from search.vector_search import VectorSearch
+
+
+def test_index_store():
+    print("🚀 Testing index directory format...")
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 16)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    documents = [f"Document {i} about Surya — ünïcode" for i in range(50)]
+    metadatas = [{"category": "skills" if i % 2 else "experience", "keywords": ["react"]} for i in range(50)]
+    metadatas[3]["priority"] = "high"
+    ids = [f"doc_{i}" for i in range(50)]
+    hashes = [f"hash_{i}" for i in range(50)]
+
+    flat = faiss.IndexFlatIP(16)
+    flat.add(vectors)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index")
+        write_index_dir(path, flat, vectors, documents, metadatas, ids, hashes, "fp", "model-a")
+        data = read_index_dir(path)
+
+        assert isinstance(data["vectors"], np.memmap)
+        assert data["manifest"]["fingerprint"] == "fp" and data["manifest"]["count"] == 50
+        assert list(data["documents"]) == documents
+        assert list(data["metadatas"]) == metadatas
+        assert data["ids"] == ids and data["hashes"] == hashes
+        print("✅ Documents and metadata round-trip")
+
+        # The memory-mapped flat index returns what FAISS would
+        queries = vectors[:5]
+        expected_scores, expected_ids = flat.search(queries, 7)
+        scores, found_ids = data["index"].search(queries, 7)
+        assert np.array_equal(found_ids, expected_ids)
+        assert np.allclose(scores, expected_scores, atol=1e-5)
+        _, padded = data["index"].search(queries[:1], 60)
+        assert (padded[0, 50:] == -1).all()
+        print("✅ Memory-mapped flat search matches FAISS")
+
+        # Metadata filters become a row mask, and subset search only returns those rows
+        mask = data["metadatas"].mask({"category": ["skills"], "priority": "high"})
+        assert np.flatnonzero(mask).tolist() == [3]
+        skills = np.flatnonzero(data["metadatas"].mask({"category": "skills"}))
+        _, subset_ids = data["index"].search(queries, 7, subset=skills)
+        assert np.isin(subset_ids, skills).all()
+        print("✅ Metadata masks restrict the search")
+
+        # Other FAISS index types are stored natively and mapped on load
+        hnsw = faiss.IndexHNSWFlat(16, 8, faiss.METRIC_INNER_PRODUCT)
+        hnsw.add(vectors)
+        write_index_dir(path, hnsw, vectors, documents, metadatas, ids, hashes, "fp2", "model-a")
+        data = read_index_dir(path)
+        assert data["manifest"]["index_type"] == "faiss" and data["index"].ntotal == 50
+        print("✅ Native FAISS indexes load with IO_FLAG_MMAP")
+
+        # Concurrent writers (workers rebuilding at once) each swap in a complete index
+        errors = []
+
+        def write(worker):
+            try:
+                for i in range(5):
+                    write_index_dir(path, flat, vectors, documents, metadatas, ids, hashes, f"w{worker}-{i}", "model-a")
+                    read_index_dir(path)
+            except Exception as e:
+                errors.append(e)
+
+        writers = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        assert not errors, errors
+        assert read_index_dir(path)["manifest"]["fingerprint"].endswith("-4")
+        assert sorted(os.listdir(tmp)) == ["index", "index.lock"]  # No temporary directories left behind
+        print("✅ Concurrent writers never corrupt the index")
+
+        # An index embedded with another model is never searched: portfolio indexes get rebuilt,
+        # external ones (which startup can't rebuild) are refused
+        search = VectorSearch()
+        other_model = search.embedding_model.model_name + "-other"
+        write_index_dir(path, flat, vectors, documents, metadatas, ids, hashes, "fp", other_model, source=SOURCE_PORTFOLIO)
+        assert search.load_index(path) is False and search.faiss_index is None
+        write_index_dir(path, flat, vectors, documents, metadatas, ids, hashes, "fp", other_model, source=SOURCE_EXTERNAL)
+        try:
+            search.load_index(path)
+            assert False, "an external index from another model must be refused"
+        except ValueError as e:
+            assert other_model in str(e)
+        print("✅ Indexes built with another embedding model are never loaded")
+
+        # Chunk rows, chunking settings and source round-trip; manifests from before sources default to portfolio
+        chunks = np.array([[i // 2, 0, 5] for i in range(50)])
+        write_index_dir(path, flat, vectors, documents[:25], metadatas[:25], ids[:25], hashes[:25], "fp3", "model-a",
+                        chunks=chunks, chunking={"max_chars": 5}, source=SOURCE_EXTERNAL)
+        data = read_index_dir(path)
+        assert np.array_equal(data["chunks"], chunks) and data["manifest"]["chunking"] == {"max_chars": 5}
+        assert data["manifest"]["source"] == SOURCE_EXTERNAL
+        manifest_path = os.path.join(path, "manifest.json")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        del manifest["source"]
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        assert read_index_dir(path)["manifest"]["source"] == SOURCE_PORTFOLIO
+        print("✅ Chunks, chunking settings and source round-trip")
+
+        # A failed write leaves the previous index in place and no temporary directory behind
+        try:
+            write_index_dir(path, flat, vectors[0], documents, metadatas, ids, hashes, "broken", "model-a")
+            assert False, "a 1-D vector array can't be written"
+        except IndexError:
+            pass
+        assert read_index_dir(path)["manifest"]["fingerprint"] == "fp3"
+        assert sorted(os.listdir(tmp)) == ["index", "index.lock"]
+        print("✅ A failed write keeps the previous index")
+
+        # A reader holding the shared lock keeps a writer from swapping the directory underneath it
+        swapped = threading.Event()
+
+        def swap():
+            write_index_dir(path, flat, vectors, documents, metadatas, ids, hashes, "fp4", "model-a")
+            swapped.set()
+
+        with _index_lock(path, shared=True):
+            writer = threading.Thread(target=swap)
+            writer.start()
+            assert not swapped.wait(0.3)
+            assert read_index_dir(path)["manifest"]["fingerprint"] == "fp3"
+        writer.join()
+        assert swapped.is_set() and read_index_dir(path)["manifest"]["fingerprint"] == "fp4"
+        print("✅ Writers wait for readers holding the lock")
+
+        # Where no lock file can be created, reads still work but writes refuse to swap unlocked
+        locked_out = os.path.join(tmp, "readonly")
+        write_index_dir(locked_out, flat, vectors, documents, metadatas, ids, hashes, "fp", "model-a")
+        os.remove(locked_out + ".lock")
+        os.mkdir(locked_out + ".lock")
+        assert read_index_dir(locked_out)["manifest"]["count"] == 50
+        try:
+            write_index_dir(locked_out, flat, vectors, documents, metadatas, ids, hashes, "fp2", "model-a")
+            assert False, "a write must not swap without the lock"
+        except OSError:
+            pass
+        assert read_index_dir(locked_out)["manifest"]["fingerprint"] == "fp"
+        print("✅ Reads work without a lock file, writes don't")
+
+
+if __name__ == "__main__":
+    test_index_store()
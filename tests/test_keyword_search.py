@@ -0,0 +1,53 @@
+"""
+Test BM25 keyword search over the inverted index
+"""
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.keyword_search import KeywordSearch
+
+
+def test_keyword_search():
+    print("🚀 Testing BM25 keyword search...")
+
+    documents = [
+        "Kubernetes cluster operations",
+        "Kubernetes deployment pipelines for a large platform team with many services and long running batch jobs",
+        "Python developer",
+        "Python developer with Django",
+        "Java developer"
+    ]
+    metadatas = [{"keywords": []}, {"keywords": []}, {"keywords": []}, {"keywords": ["django"]}, {"keywords": []}]
+    search = KeywordSearch(documents, metadatas)
+
+    # Rare terms outweigh common ones: "django" (1 doc) beats "developer" (3 docs)
+    assert search.idf["django"] > search.idf["developer"]
+    assert search.search_with_scores("django developer", k=1)[0][0] == 3
+
+    # Same term frequency, shorter document ranks first
+    ranked = [i for i, _ in search.search_with_scores("kubernetes", k=5)]
+    assert ranked == [0, 1]
+    print("✅ Ranking follows IDF and length normalization")
+
+    # Scores come back best first and only for documents containing a query term
+    hits = search.search_with_scores("python developer", k=5)
+    assert [i for i, _ in hits] == [2, 3, 4]
+    assert all(a[1] >= b[1] for a, b in zip(hits, hits[1:]))
+
+    # A mask restricts results to the allowed documents
+    mask = np.array([False, False, False, True, True])
+    assert {i for i, _ in search.search_with_scores("python developer", k=5, mask=mask)} == {3, 4}
+    print("✅ Masks filter the results")
+
+    # Queries with no indexed terms return nothing
+    assert search.search_with_scores("quantum blockchain", k=5) == []
+    assert search.search("quantum blockchain") == []
+    print("✅ Unknown terms return no results")
+
+
+if __name__ == "__main__":
+    test_keyword_search()
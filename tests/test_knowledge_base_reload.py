@@ -0,0 +1,92 @@
+"""
+Test knowledge base hot reload (validation, swap, listeners)
+"""
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.knowledge_base as knowledge_base
+from data.portfolio_data import get_portfolio_data
+from search.embedding_cache import portfolio_fingerprint
+
+
+class _StubVectorSearch:
+    def __init__(self, fingerprint, documents, ntotal=None):
+        self.fingerprint = fingerprint
+        self.documents_data = documents
+        self.chunks = np.zeros((len(documents), 3), dtype=np.int64)
+        self.faiss_index = type("Index", (), {"ntotal": len(documents) if ntotal is None else ntotal})()
+
+
+class _StubEngine:
+    """Stands in for HybridSearch so reloads run without the embedding model"""
+
+    def __init__(self, fingerprint="0" * 64, documents=(), results=None, ntotal=None):
+        self.vector_search = _StubVectorSearch(fingerprint, list(documents), ntotal)
+        self.results = list(documents) if results is None else results
+
+    def search(self, query, k=10, **kwargs):
+        return self.results[:k]
+
+    def save_index(self, index_dir):
+        raise AssertionError("stub engines are never rebuilt, so never saved")
+
+
+def test_knowledge_base_reload():
+    print("🚀 Testing knowledge base hot reload...")
+
+    real_engine = knowledge_base.HybridSearch
+    knowledge_base.HybridSearch = _StubEngine
+    try:
+        kb = knowledge_base.KnowledgeBase()
+    finally:
+        knowledge_base.HybridSearch = real_engine
+    versions = []
+    kb.add_reload_listener(versions.append)
+
+    builds = []
+
+    def build_with(engine):
+        def build(data):
+            builds.append(engine)
+            return engine, False
+        kb._build_engine = build
+
+    current = portfolio_fingerprint(get_portfolio_data())
+    good = _StubEngine(current, ["He works at Acer America"])
+    build_with(good)
+    result = kb.reload()
+    assert result["reloaded"] and result["generation"] == 1 and result["version"] == current[:16]
+    assert kb.search_engine is good and kb.is_initialized and versions == [current[:16]]
+    print("✅ A successful reload swaps the engine, bumps the generation and notifies listeners")
+
+    # Unchanged portfolio data without force does nothing
+    result = kb.reload()
+    assert not result["reloaded"] and result["reason"] == "unchanged"
+    assert len(builds) == 1 and kb.generation == 1 and versions == [current[:16]]
+    print("✅ Unchanged data is not rebuilt")
+
+    # Engines that fail validation never go live
+    for broken in (_StubEngine("1" * 64, []),
+                   _StubEngine("2" * 64, ["doc"], ntotal=5),
+                   _StubEngine("3" * 64, ["doc"], results=[])):
+        build_with(broken)
+        result = kb.reload(force=True)
+        assert not result["reloaded"] and "error" in result
+        assert kb.search_engine is good and kb.generation == 1 and versions == [current[:16]]
+    print("✅ A failed validation keeps the old engine")
+
+    # A forced reload swaps in a new version
+    newer = _StubEngine("f" * 64, ["He now leads the GenAI team"])
+    build_with(newer)
+    result = kb.reload(force=True)
+    assert result["reloaded"] and kb.search_engine is newer and kb.generation == 2
+    assert versions == [current[:16], "f" * 16]
+    print("✅ Forced reloads re-key listeners to the new version")
+
+
+if __name__ == "__main__":
+    test_knowledge_base_reload()
@@ -0,0 +1,91 @@
+"""
+Test the persistent (SQLite) tier of the semantic cache
+"""
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import SemanticCache
+from utils.persistent_cache import _TRIM_EVERY, PersistentCacheStore
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).standard_normal(8).astype(np.float32)
+
+
+def test_persistent_cache():
+    print("🚀 Testing persistent semantic cache...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.db")
+
+        # A second store on the same file (another worker) sees the first one's entries
+        first = PersistentCacheStore(path, ttl_seconds=0, max_entries=100, model_name="model-a", namespace="v1")
+        second = PersistentCacheStore(path, ttl_seconds=0, max_entries=100, model_name="model-a", namespace="v1")
+        first.put("where does he work", _vector(0), "At Acer America")
+        rows = second.load_since(0)
+        assert [(query, response) for _, query, _, response, _ in rows] == [("where does he work", "At Acer America")]
+        assert np.array_equal(rows[0][2], _vector(0)) and rows[0][4] is None
+        assert second.load_since(rows[0][0]) == []
+        print("✅ Workers share entries through the database")
+
+        # Entries are namespaced by knowledge base version (and model)
+        second.set_namespace("v2")
+        assert second.load_since(0) == []
+        second.put("where does he work", _vector(1), "At Acer America, on GenAI")
+        assert [row[3] for row in first.load_since(0)] == ["At Acer America"]
+        other_model = PersistentCacheStore(path, ttl_seconds=0, max_entries=100, model_name="model-b", namespace="v1")
+        assert other_model.load_since(0) == []
+        print("✅ Other knowledge base versions and models don't see each other's entries")
+
+        # Expired entries are never loaded
+        short = PersistentCacheStore(path, ttl_seconds=0.2, max_entries=100, model_name="model-a", namespace="ttl")
+        expires_at = short.put("what are his skills", _vector(2), "React and Python")
+        assert expires_at is not None and len(short.load_since(0)) == 1
+        time.sleep(0.3)
+        assert short.load_since(0) == []
+        print("✅ Entries expire after their TTL")
+
+        # Periodic trims keep the newest max_entries rows
+        small = PersistentCacheStore(os.path.join(tmp, "small.db"), ttl_seconds=0, max_entries=10,
+                                     model_name="model-a")
+        for i in range(_TRIM_EVERY):
+            small.put(f"question {i}", _vector(i), f"answer {i}")
+        rows = small.load_since(0)
+        assert [row[1] for row in rows] == [f"question {i}" for i in range(_TRIM_EVERY - 10, _TRIM_EVERY)]
+        print("✅ The store is trimmed to its size limit, oldest first")
+
+        for store in (first, second, other_model, short, small):
+            store.close()
+
+        # Degraded answers (built from context while the LLM is down) are never persisted
+        cache_path = os.path.join(tmp, "semantic.db")
+        cache = SemanticCache(persistent_path=cache_path)
+        cache.set_kb_version("v1")
+        cache.add_to_dynamic_cache(
+            "where does he work these days",
+            "Based on my records: He works at Acer America as a Software Engineer building GenAI tools.",
+        )
+        cache.add_to_dynamic_cache(
+            "what projects has he shipped",
+            "Based on the available information: Surya built a portfolio chatbot with hybrid search...",
+        )
+        assert len(cache.dynamic_cache) == 0
+        reader = PersistentCacheStore(cache_path, namespace="v1")
+        assert reader.load_since(0) == []
+        cache.add_to_dynamic_cache(
+            "where does he work these days",
+            "Surya works at Acer America as a Software Engineer, building GenAI tools for internal teams.",
+        )
+        assert [row[1] for row in reader.load_since(0)] == ["where does he work these days"]
+        reader.close()
+        print("✅ Degraded fallback answers are never persisted")
+
+
+if __name__ == "__main__":
+    test_persistent_cache()
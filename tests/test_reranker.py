@@ -0,0 +1,44 @@
+"""
+Test keyword re-ranking with precomputed document features
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.reranker import Reranker
+
+
+def test_reranker():
+    print("🚀 Testing re-ranker...")
+
+    documents = [
+        "Surya enjoys cricket and gaming in his free time.",
+        "Surya is a Software Engineer at Acer America since 2024.",
+        "Surya holds an AWS Certified Cloud Practitioner certification.",
+        "Surya studied at California State University, Northridge."
+    ]
+    reranker = Reranker()
+    reranker.index(documents)
+    assert reranker.features.shape == (4, len(reranker.category_names))
+    print("✅ Document features built once at index time")
+
+    # Intent categories pull matching documents to the front
+    assert list(reranker.rerank("where does he work", [0, 1, 2, 3]))[0] == 1
+    assert list(reranker.rerank("is he aws certified?", [0, 1, 2, 3]))[0] == 2
+    assert list(reranker.rerank("which university", [0, 1, 2, 3]))[0] == 3
+    print("✅ Query categories boost matching documents")
+
+    # Multi-word phrases count on top of single words
+    scores = reranker.score("software engineer", [1, 3])
+    assert scores[0] == reranker.two_word_weight + 2 * reranker.word_weight
+    print("✅ Phrase and keyword boosts applied")
+
+    # No signal keeps the incoming (fused) order
+    assert list(reranker.rerank("xyz", [3, 0, 2, 1])) == [3, 0, 2, 1]
+    print("✅ Ties keep input order")
+
+
+if __name__ == "__main__":
+    test_reranker()
@@ -0,0 +1,79 @@
+"""
+Test upstream retry classification, backoff, retry budget and circuit breaker
+"""
+import sys
+import os
+import time
+import httpx
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm.resilience import CircuitBreaker, DegradedResponse, RetryBudget, backoff_delay, is_retryable, retry_after
+from llm.response_generator import ResponseGenerator
+
+
+def _status_error(status, headers=None):
+    request = httpx.Request("POST", "https://api.perplexity.ai/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+def test_resilience():
+    print("🚀 Testing upstream resilience...")
+
+    assert is_retryable(httpx.ReadTimeout("slow")) and is_retryable(httpx.ConnectError("down"))
+    assert is_retryable(_status_error(429)) and is_retryable(_status_error(503))
+    assert not is_retryable(_status_error(400)) and not is_retryable(_status_error(401))
+    assert not is_retryable(ValueError("bad json"))
+    assert retry_after(_status_error(429, {"Retry-After": "2"})) == 2.0
+    assert retry_after(_status_error(429)) is None
+    print("✅ Errors are classified as retryable or not")
+
+    delays = [backoff_delay(attempt, base=0.5, cap=4) for attempt in range(6) for _ in range(50)]
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert max(backoff_delay(0, base=0.5, cap=4) for _ in range(50)) <= 0.5
+    print("✅ Backoff is jittered and capped")
+
+    budget = RetryBudget(ratio=0.2, min_retries=1, window=10)
+    for _ in range(10):
+        budget.record_request()
+    assert budget.try_acquire_retry() and budget.try_acquire_retry()
+    assert not budget.try_acquire_retry()
+    assert budget.get_stats()["rejected"] == 1
+    print("✅ Retry budget caps retries at a fraction of requests")
+
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow_request()
+
+    # After the reset timeout a single probe goes through; its failure re-opens the circuit
+    time.sleep(0.12)
+    assert breaker.allow_request() and not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # A successful probe closes it
+    time.sleep(0.12)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow_request()
+    assert breaker.get_stats()["short_circuited"] == 2
+    print("✅ Circuit opens on failures and closes after a successful probe")
+
+    # Answers built from context while upstream is down are reported as degraded, so they aren't cached
+    generator = ResponseGenerator()
+    generator.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    generator.breaker.record_failure()
+    try:
+        generator.generate_response("Where does he work?", ["He works at Acer America."])
+        assert False, "an open circuit must report a degraded answer"
+    except DegradedResponse as e:
+        assert "Acer America" in e.text
+    print("✅ Fallback answers are flagged as degraded")
+
+
+if __name__ == "__main__":
+    test_resilience()
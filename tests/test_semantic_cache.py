@@ -0,0 +1,81 @@
+"""
+Test the dynamic tier of the semantic cache: LRU eviction, slot reuse and expiry
+"""
+import sys
+import os
+import time
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import SemanticCache
+
+
+class _FixedEmbeddings:
+    """Stands in for a request's EmbeddingContext with known vectors per query"""
+
+    def __init__(self, dimension):
+        self.dimension = dimension
+        self.vectors = {}
+
+    def embed(self, text):
+        if text not in self.vectors:
+            vector = np.random.default_rng(len(self.vectors)).standard_normal(self.dimension).astype(np.float32)
+            self.vectors[text] = vector / np.linalg.norm(vector)
+        return self.vectors[text]
+
+
+def _answer(i):
+    return f"Answer number {i}: Surya built this while working on GenAI tooling at Acer America."
+
+
+def test_semantic_cache():
+    print("🚀 Testing semantic cache slots and eviction...")
+
+    cache = SemanticCache(max_dynamic_cache=3, backend="matrix", persistent_path=None)
+    embeddings = _FixedEmbeddings(cache._embeddings.shape[1])
+
+    def add(i):
+        cache.add_to_dynamic_cache(f"question {i}", _answer(i), embeddings=embeddings)
+
+    def get(i):
+        return cache.get_cached_response(f"question {i}", embeddings=embeddings)
+
+    for i in range(3):
+        add(i)
+    assert [get(i) for i in range(3)] == [_answer(i) for i in range(3)]
+    assert [cache.dynamic_cache[f"question {i}"][0] for i in range(3)] == [0, 1, 2]
+    print("✅ Entries fill fresh slots and are found by similarity")
+
+    # The least recently used entry is evicted and its slot is handed to the newcomer
+    get(0)
+    add(3)
+    assert get(1) is None
+    assert get(0) == _answer(0) and get(3) == _answer(3)
+    assert cache.dynamic_cache["question 3"][0] == 1 and cache._high_water == 3
+    print("✅ LRU eviction frees a slot that the next entry reuses")
+
+    # A removed entry is never matched again, even though its old vector is still in the matrix
+    cache._remove_dynamic("question 2")
+    assert get(2) is None and not cache._occupied[2] and cache._free_slots == [2]
+    add(4)
+    assert cache.dynamic_cache["question 4"][0] == 2 and cache._high_water == 3
+    assert get(4) == _answer(4)
+    print("✅ Freed slots are masked out of lookups until reused")
+
+    # Expired entries miss and release their slot
+    slot = cache.dynamic_cache["question 4"][0]
+    cache.dynamic_cache["question 4"][3] = time.time() - 1
+    assert get(4) is None and "question 4" not in cache.dynamic_cache and cache._free_slots == [slot]
+    print("✅ Expired entries are dropped on lookup")
+
+    # A knowledge base change empties the dynamic tier
+    cache.set_kb_version("v2")
+    assert not cache.dynamic_cache and not cache._occupied.any()
+    assert get(0) is None
+    print("✅ Changing the knowledge base version clears learned answers")
+
+
+if __name__ == "__main__":
+    test_semantic_cache()
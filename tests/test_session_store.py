@@ -0,0 +1,46 @@
+"""
+Test per-session conversation history limits
+"""
+import sys
+import os
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.session_store import SessionStore
+
+
+def test_session_store():
+    print("🚀 Testing session store...")
+
+    store = SessionStore(max_turns=2, max_tokens=1000, ttl_seconds=60, max_total_tokens=100)
+
+    # Sessions don't see each other's turns
+    store.append_turn("alice", "Where does he work?", "At Acer America.")
+    store.append_turn("bob", "What are his skills?", "React and Python.")
+    assert [m["content"] for m in store.get_history("alice")] == ["Where does he work?", "At Acer America."]
+    assert store.get_history("carol") == ()
+    print("✅ Histories are isolated per session")
+
+    # Only the last max_turns turns are kept
+    for i in range(5):
+        store.append_turn("alice", f"question {i}", f"answer {i}")
+    assert [m["content"] for m in store.get_history("alice")] == ["question 3", "answer 3", "question 4", "answer 4"]
+    print("✅ Per-session turn cap enforced")
+
+    # The least recently active session is evicted above the global token cap
+    store.append_turn("dave", "x" * 320, "y")
+    assert store.get_history("bob") == ()
+    assert store.get_stats()["total_tokens"] <= 100
+    print("✅ Global memory cap evicts idle sessions")
+
+    # Idle sessions expire
+    store.ttl_seconds = 0
+    time.sleep(0.01)
+    assert store.get_history("dave") == ()
+    print("✅ Idle sessions expire")
+
+
+if __name__ == "__main__":
+    test_session_store()
@@ -0,0 +1,141 @@
+"""
+Test single-flight request coalescing
+"""
+import sys
+import os
+import asyncio
+import threading
+import time
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.chat_engine import ChatEngine
+from utils.single_flight import SingleFlight, history_scope, normalize_question
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_single_flight():
+    print("🚀 Testing single-flight coalescing...")
+
+    assert normalize_question("  Where does he WORK?") == normalize_question("where does he work")
+
+    flights = SingleFlight(similarity_threshold=0.85)
+    leader_flight, leader = flights.join("Where does he work?", _unit([1, 0, 0]), scope="v1")
+    same_text, text_leader = flights.join("where does he work", None, scope="v1")
+    similar, similar_leader = flights.join("Where is he working now?", _unit([0.95, 0.1, 0]), scope="v1")
+    assert leader and not text_leader and not similar_leader
+    assert same_text is leader_flight and similar is leader_flight
+    print("✅ Matching text and similar embeddings join the leader")
+
+    # Different questions, or another knowledge base version, start their own flight
+    _, unrelated_leader = flights.join("What are his skills?", _unit([0, 1, 0]), scope="v1")
+    _, other_scope_leader = flights.join("Where does he work?", _unit([1, 0, 0]), scope="v2")
+    assert unrelated_leader and other_scope_leader
+    print("✅ Unrelated questions and other versions are not coalesced")
+
+    # The same follow-up after different conversations must not share an answer
+    history_a = [{"role": "user", "content": "Tell me about his blog"}, {"role": "assistant", "content": "He writes on Medium."}]
+    history_b = [{"role": "user", "content": "What is his thesis?"}, {"role": "assistant", "content": "It is on GenAI."}]
+    assert history_scope([]) is None and history_scope(history_a) == history_scope(list(history_a))
+    _, leader_a = flights.join("Where can I read that?", _unit([0, 0, 1]), scope=("v1", history_scope(history_a)))
+    _, leader_b = flights.join("Where can I read that?", _unit([0, 0, 1]), scope=("v1", history_scope(history_b)))
+    _, same_a = flights.join("Where can I read that?", _unit([0, 0, 1]), scope=("v1", history_scope(history_a)))
+    assert leader_a and leader_b and not same_a
+    print("✅ Sessions with different history answer on their own")
+
+    # Followers in threads and coroutines all receive the leader's answer
+    answers = []
+    thread = threading.Thread(target=lambda: answers.append(leader_flight.result(timeout=5)))
+    thread.start()
+
+    async def follow():
+        return await leader_flight.async_result(timeout=5)
+
+    async def run():
+        follower = asyncio.ensure_future(follow())
+        await asyncio.sleep(0.01)
+        flights.complete(leader_flight, "He works at Acer America")
+        return await follower
+
+    assert asyncio.run(run()) == "He works at Acer America"
+    thread.join()
+    assert answers == ["He works at Acer America"]
+    print("✅ Thread and async followers share the answer")
+
+    # A finished flight is retired; a failed leader (None) sends followers off on their own
+    _, leader = flights.join("Where does he work?", _unit([1, 0, 0]), scope="v1")
+    assert leader
+    flight, _ = flights.join("where does he work", None, scope="v1")
+    flights.complete(flight, None)
+    assert flight.result(timeout=1) is None
+
+    # A follower that times out gets None without cancelling the flight for others
+    slow, _ = flights.join("Tell me about his education", None, scope="v1")
+    assert asyncio.run(slow.async_result(timeout=0.05)) is None
+    assert not slow.future.cancelled()
+    print("✅ Failed leaders and timeouts fall back to answering alone")
+
+    # In the engine, only requests on the same knowledge base version and history share an upstream call
+    engine = _engine_with_slow_generator()
+    engine._record_turn("a", "Tell me about his blog", "He writes on Medium.")
+    question = "Which conference talks has he given about retrieval?"
+    answers = []
+
+    def ask(session_id=None):
+        thread = threading.Thread(target=lambda: answers.append(engine.chat(question, session_id)))
+        thread.start()
+        time.sleep(0.1)
+        return thread
+
+    threads = [ask(), ask(), ask("a")]
+    engine.knowledge_base.version = "v2"
+    threads.append(ask())
+    assert engine.response_generator.calls == [(question, 0), (question, 2), (question, 0)]
+    engine.response_generator.release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(answers) == 4 and set(answers) == {_ANSWER}
+    print("✅ The engine coalesces per knowledge base version and conversation history")
+
+
+_ANSWER = "Surya spoke about hybrid retrieval for portfolio assistants at a local GenAI meetup."
+
+
+class _StubKnowledgeBase:
+    version = "v1"
+
+    def search(self, query, k=5, embeddings=None, filters=None, deadline=None):
+        return ["Surya gave a talk on hybrid retrieval at a GenAI meetup."]
+
+
+class _SlowGenerator:
+    """Records each upstream call and holds it open until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def generate_response(self, query, context, history=None, deadline=None):
+        self.calls.append((query, len(history or [])))
+        self.release.wait(5)
+        return _ANSWER
+
+
+def _engine_with_slow_generator():
+    engine = ChatEngine()
+    engine.knowledge_base = _StubKnowledgeBase()
+    engine.response_generator = _SlowGenerator()
+    engine.semantic_cache.add_to_dynamic_cache = lambda *args, **kwargs: None  # Every request misses the cache
+    engine.single_flight = SingleFlight(engine.semantic_cache.similarity_threshold)
+    engine.is_ready = True
+    return engine
+
+
+if __name__ == "__main__":
+    test_single_flight()
@@ -0,0 +1,50 @@
+"""
+Test that streamed cleanup matches the one-shot response cleanup
+"""
+import sys
+import os
+import random
+import re
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm.stream_cleaner import StreamingCleaner
+
+
+def clean_all_at_once(text):
+    """Same rules as ResponseGenerator._clean_response"""
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    text = re.sub(r'\[Info \d+\]', '', text)
+    text = re.sub(r'\[\d+\]', '', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def stream(text, rng):
+    """Feed text to a StreamingCleaner in random-sized chunks"""
+    cleaner = StreamingCleaner()
+    out = ""
+    i = 0
+    while i < len(text):
+        j = i + rng.randint(1, 6)
+        out += cleaner.feed(text[i:j])
+        i = j
+    return out + cleaner.flush()
+
+
+def test_stream_cleaner():
+    print("🚀 Testing incremental response cleanup...")
+
+    pieces = ["Surya ", "works", " at ", "Acer", "[1]", "[Info 2]", "<think>hmm\n ok</think>",
+              "  \n", ".", " x < y ", "[not a citation]", "\t", " 🦇"]
+    rng = random.Random(7)
+
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 15)))
+        assert stream(text, rng) == clean_all_at_once(text), repr(text)
+
+    print("✅ Streamed output matches one-shot cleanup")
+
+
+if __name__ == "__main__":
+    test_stream_cleaner()
@@ -5,31 +5,83 @@ Includes both static pre-defined cache and dynamic LRU cache
 """
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from typing import Optional, List, Dict, Tuple
 from collections import OrderedDict
 import random
-from config import logger
+import sqlite3
+import threading
+import time
+from config import (
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_BACKEND,
+    SEMANTIC_CACHE_DB_PATH,
+    SEMANTIC_CACHE_SYNC_INTERVAL,
+    logger
+)
+from utils.embedding_registry import get_embedding_model
+from utils.embedding_context import EmbeddingContext
+from utils.cache_index import FaissCacheIndex
+from utils.persistent_cache import PersistentCacheStore
+
+# Openers of the answers built from raw context when the LLM is unavailable; these must never be cached
+DEGRADED_PREFIXES = (
+    "Based on my records:",
+    "Based on the available information:",
+    "I don't have specific information",
+    "I don't have enough information",
+)
 
 
 class SemanticCache:
     """Cache responses using semantic similarity with hybrid static + dynamic caching"""
     
-    def __init__(self, similarity_threshold=0.85, max_dynamic_cache=50):
-        """Initialize semantic cache with embedding model"""
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, similarity_threshold=0.85, max_dynamic_cache=SEMANTIC_CACHE_MAX_ENTRIES,
+                 backend=SEMANTIC_CACHE_BACKEND, persistent_path=SEMANTIC_CACHE_DB_PATH):
+        """
+        Initialize semantic cache with embedding model
+        
+        Args:
+            similarity_threshold: Minimum cosine similarity for a cache hit
+            max_dynamic_cache: Maximum number of learned query-response pairs
+            backend: "matrix" for brute-force lookups, "faiss" for an ANN index over the dynamic cache
+            persistent_path: SQLite file shared by workers on this host (empty/None keeps the cache in memory only)
+        """
+        if backend not in ("matrix", "faiss"):
+            raise ValueError(f"Unknown semantic cache backend: {backend}")
+        
+        self.model = get_embedding_model()
         self.similarity_threshold = similarity_threshold
         self.max_dynamic_cache = max_dynamic_cache
+        self.backend = backend
         
         # Static cache (pre-defined common questions)
         self.static_cache = self._initialize_static_cache()
         
-        # Dynamic cache (learns from traffic)
-        self.dynamic_cache = OrderedDict()  # {query: (embedding, response, access_count)}
+        # In FAISS mode the dynamic embeddings live in the index instead of the matrix
+        self._ann = FaissCacheIndex(self._embeddings.shape[1]) if backend == "faiss" else None
+        
+        # Dynamic cache (learns from traffic): {query: [slot, response, access_count, expires_at]}, kept in LRU order
+        self.dynamic_cache = OrderedDict()
+        self._slot_queries = {}  # {slot: query}
+        self._free_slots = []
+        self._high_water = 0  # Dynamic slots [0, _high_water) have been handed out at least once
+        self._occupied = np.zeros(max_dynamic_cache, dtype=bool)
+        
+        # Lookups and inserts may run concurrently on executor threads
+        self._lock = threading.RLock()
+        
+        # Knowledge base version the dynamic answers were generated from
+        self.kb_version = None
+        
+        # Persistent tier: warm the dynamic cache from disk, then pull other workers' writes periodically
+        self._store = PersistentCacheStore(persistent_path) if persistent_path else None
+        self._last_synced_id = 0
+        self._last_sync_time = 0.0
+        self._sync_from_store()
         
         logger.info(f"✅ Semantic cache initialized:")
         logger.info(f"   - Static cache: {len(self.static_cache)} categories")
-        logger.info(f"   - Dynamic cache: max {max_dynamic_cache} entries")
+        logger.info(f"   - Dynamic cache: max {max_dynamic_cache} entries ({backend} backend)")
     
     def _initialize_static_cache(self) -> Dict:
         """Initialize cache with common queries and their variations"""
@@ -101,40 +153,61 @@ class SemanticCache:
             }
         }
         
-        # Pre-compute embeddings for all cached queries
+        # Pre-compute normalized embeddings for all cached queries, one row per query
         cache = {}
+        static_rows = []
+        self._static_row_categories = []
         for category, data in cache_data.items():
-            embeddings = self.model.encode(data["queries"])
+            static_rows.append(_normalize_rows(self.model.encode(data["queries"])))
+            self._static_row_categories.extend([category] * len(data["queries"]))
             cache[category] = {
-                "embeddings": embeddings,
                 "responses": data["responses"],
                 "last_used_index": 0  # For rotation
             }
         
+        # Static and dynamic embeddings share one pre-normalized float32 matrix:
+        # rows [0, n_static) are static queries, the rest are dynamic slots
+        static_embeddings = np.vstack(static_rows)
+        self._static_count = len(static_embeddings)
+        dynamic_rows = self.max_dynamic_cache if self.backend == "matrix" else 0
+        self._embeddings = np.zeros((self._static_count + dynamic_rows, static_embeddings.shape[1]), dtype=np.float32)
+        self._embeddings[:self._static_count] = static_embeddings
+        
         return cache
     
-    def get_cached_response(self, query: str) -> Optional[str]:
+    def get_cached_response(self, query: str, embeddings: Optional[EmbeddingContext] = None) -> Optional[str]:
         """
         Check if query is similar to cached queries and return response
         Checks both static and dynamic caches
         
         Args:
             query: User's question
+            embeddings: Request-scoped embedding context to reuse the query vector
             
         Returns:
             Cached response if found, None otherwise
         """
-        query_embedding = self.model.encode([query])[0]
+        query_embedding = self._embed(query, embeddings)
+        
+        with self._lock:
+            return self._lookup(query_embedding)
+    
+    def _lookup(self, query_embedding: np.ndarray) -> Optional[str]:
+        """Static then dynamic lookup for an embedded query (caller holds the lock)"""
+        if self._store is not None and time.time() - self._last_sync_time >= SEMANTIC_CACHE_SYNC_INTERVAL:
+            self._sync_from_store()
+        
+        # One matrix-vector product scores static and dynamic entries together
+        similarities = self._similarities(query_embedding)
         
         # First, check static cache (pre-defined common questions)
-        for category, data in self.static_cache.items():
-            similarities = np.dot(data["embeddings"], query_embedding) / (
-                np.linalg.norm(data["embeddings"], axis=1) * np.linalg.norm(query_embedding)
-            )
-            
-            max_similarity = np.max(similarities)
+        if self._static_count:
+            best_row = int(np.argmax(similarities[:self._static_count]))
+            max_similarity = similarities[best_row]
             
             if max_similarity >= self.similarity_threshold:
+                category = self._static_row_categories[best_row]
+                data = self.static_cache[category]
                 logger.info(f"✅ Static cache hit for '{category}' (similarity: {max_similarity:.2f})")
                 
                 # Rotate through response variations
@@ -146,29 +219,30 @@ class SemanticCache:
                 return response
         
         # Second, check dynamic cache (learned from traffic)
-        max_dynamic_similarity = 0.0
+        slot, max_dynamic_similarity = self._best_dynamic_slot(query_embedding, similarities)
         
-        for cached_query, (cached_embedding, cached_response, access_count) in self.dynamic_cache.items():
-            similarity = np.dot(cached_embedding, query_embedding) / (
-                np.linalg.norm(cached_embedding) * np.linalg.norm(query_embedding)
-            )
+        if slot is not None and max_dynamic_similarity >= self.similarity_threshold:
+            cached_query = self._slot_queries[slot]
+            entry = self.dynamic_cache[cached_query]
             
-            if similarity > max_dynamic_similarity:
-                max_dynamic_similarity = similarity
+            if entry[3] is not None and entry[3] <= time.time():
+                logger.info("⌛ Dynamic cache entry expired")
+                self._remove_dynamic(cached_query)
+                return None
             
-            if similarity >= self.similarity_threshold:
-                logger.info(f"✅ Dynamic cache hit (similarity: {similarity:.2f}, accessed {access_count} times)")
-                
-                # Update access count and move to end (most recently used)
-                self.dynamic_cache.move_to_end(cached_query)
-                self.dynamic_cache[cached_query] = (cached_embedding, cached_response, access_count + 1)
-                
-                return cached_response
+            logger.info(f"✅ Dynamic cache hit (similarity: {max_dynamic_similarity:.2f}, accessed {entry[2]} times)")
+            
+            # Update access count and move to end (most recently used)
+            entry[2] += 1
+            self.dynamic_cache.move_to_end(cached_query)
+            
+            return entry[1]
         
         logger.info(f"❌ Cache miss (max similarity: {max_dynamic_similarity:.2f})")
         return None
     
-    def add_to_dynamic_cache(self, query: str, response: str):
+    def add_to_dynamic_cache(self, query: str, response: str, embeddings: Optional[EmbeddingContext] = None,
+                             kb_version: Optional[str] = None):
         """
         Add a new query-response pair to dynamic cache
         Implements LRU eviction when cache is full
@@ -176,6 +250,8 @@ class SemanticCache:
         Args:
             query: User's question
             response: Generated response
+            embeddings: Request-scoped embedding context to reuse the query vector
+            kb_version: Knowledge base version the response was generated from (skipped if outdated)
         """
         # Don't cache very short or very long responses
         if len(response) < 50 or len(response) > 1000:
@@ -187,38 +263,150 @@ class SemanticCache:
             logger.info("⚠️ Not caching: response contains error/apology")
             return
         
-        query_embedding = self.model.encode([query])[0]
+        # Don't cache degraded fallbacks (the upstream may be back on the next request)
+        if response.startswith(DEGRADED_PREFIXES):
+            logger.info("⚠️ Not caching: degraded fallback answer")
+            return
+        
+        query_embedding = self._embed(query, embeddings)
         
-        # Check if similar query already exists
-        for cached_query, (cached_embedding, _, _) in self.dynamic_cache.items():
-            similarity = np.dot(cached_embedding, query_embedding) / (
-                np.linalg.norm(cached_embedding) * np.linalg.norm(query_embedding)
-            )
+        with self._lock:
+            if kb_version is not None and kb_version != self.kb_version:
+                logger.info("⚠️ Not caching: knowledge base changed while answering")
+                return
+            
+            # Check if similar query already exists
+            _, similarity = self._best_dynamic_slot(query_embedding)
             if similarity >= 0.95:  # Very similar, don't add duplicate
                 logger.info(f"⚠️ Not caching: similar query exists (similarity: {similarity:.2f})")
                 return
+            
+            expires_at = None
+            if self._store is not None:
+                expires_at = self._store.put(query, query_embedding, response)
+            
+            self._insert(query, query_embedding, response, expires_at)
+            logger.info(f"💾 Added to dynamic cache (total: {len(self.dynamic_cache)})")
+    
+    def set_kb_version(self, version: str):
+        """
+        Key dynamic answers on a knowledge base version
+        Answers learned from an older version are dropped; the persistent tier switches to this version's entries
+        """
+        with self._lock:
+            if version == self.kb_version:
+                return
+            
+            for query in list(self.dynamic_cache):
+                self._remove_dynamic(query)
+            self.kb_version = version
+            
+            if self._store is not None:
+                self._store.set_namespace(version)
+                self._last_synced_id = 0
+                self._sync_from_store()
+        
+        logger.info(f"🔄 Semantic cache keyed on knowledge base version {version}")
+    
+    def _sync_from_store(self):
+        """Load entries written to the persistent tier (by this or any other worker) since the last sync"""
+        self._last_sync_time = time.time()
+        if self._store is None:
+            return
+        
+        try:
+            rows = self._store.load_since(self._last_synced_id)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Persistent cache sync failed: {e}")
+            return
         
-        # Add to cache
-        self.dynamic_cache[query] = (query_embedding, response, 1)
+        for row_id, query, query_embedding, response, expires_at in rows:
+            self._last_synced_id = row_id
+            if query in self.dynamic_cache:
+                self.dynamic_cache[query][1] = response
+                self.dynamic_cache[query][3] = expires_at
+            else:
+                self._insert(query, query_embedding, response, expires_at)
         
-        # Evict least recently used if cache is full
-        if len(self.dynamic_cache) > self.max_dynamic_cache:
+        if rows:
+            logger.info(f"🔄 Synced {len(rows)} entries from persistent cache (total: {len(self.dynamic_cache)})")
+    
+    def _insert(self, query: str, query_embedding: np.ndarray, response: str, expires_at: Optional[float] = None):
+        """Store a dynamic entry, evicting the least recently used one if the cache is full"""
+        if len(self.dynamic_cache) >= self.max_dynamic_cache:
             evicted_query = next(iter(self.dynamic_cache))
-            del self.dynamic_cache[evicted_query]
+            self._remove_dynamic(evicted_query)
             logger.info(f"🗑️  Evicted from dynamic cache: '{evicted_query[:50]}...'")
         
-        logger.info(f"💾 Added to dynamic cache (total: {len(self.dynamic_cache)})")
+        if self._ann is not None:
+            slot = self._ann.add(query_embedding)
+        else:
+            # Reuse a freed slot before growing into fresh ones
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                slot = self._high_water
+                self._high_water += 1
+            self._embeddings[self._static_count + slot] = query_embedding
+            self._occupied[slot] = True
+        
+        self._slot_queries[slot] = query
+        self.dynamic_cache[query] = [slot, response, 1, expires_at]
+    
+    def _remove_dynamic(self, query: str):
+        """Drop a dynamic entry and release its matrix slot or index id"""
+        slot = self.dynamic_cache.pop(query)[0]
+        del self._slot_queries[slot]
+        
+        if self._ann is not None:
+            self._ann.remove(slot)
+        else:
+            self._occupied[slot] = False
+            self._free_slots.append(slot)
+    
+    def _similarities(self, query_embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a normalized query against every static row and used dynamic slot"""
+        return self._embeddings[:self._static_count + self._high_water] @ query_embedding
+    
+    def _best_dynamic_slot(self, query_embedding: np.ndarray, similarities: Optional[np.ndarray] = None) -> Tuple[Optional[int], float]:
+        """Find the most similar dynamic entry, via the ANN index or the similarity vector"""
+        if not self.dynamic_cache:
+            return None, 0.0
+        
+        if self._ann is not None:
+            return self._ann.search(query_embedding)
+        
+        if similarities is None:
+            similarities = self._similarities(query_embedding)
+        dynamic = np.where(self._occupied[:self._high_water], similarities[self._static_count:], -np.inf)
+        slot = int(np.argmax(dynamic))
+        return slot, float(dynamic[slot])
+    
+    def _embed(self, query: str, embeddings: Optional[EmbeddingContext]) -> np.ndarray:
+        """Embed a query, reusing the request's context when one is supplied"""
+        return (embeddings or EmbeddingContext(self.model)).embed(query)
     
     def get_cache_stats(self) -> Dict:
         """Get cache statistics"""
-        total_accesses = sum(count for _, _, count in self.dynamic_cache.values())
+        total_accesses = sum(entry[2] for entry in self.dynamic_cache.values())
         return {
             "static_categories": len(self.static_cache),
             "dynamic_entries": len(self.dynamic_cache),
+            "backend": self.backend,
+            "persistent": self._store is not None,
+            "kb_version": self.kb_version,
             "dynamic_total_accesses": total_accesses
         }
 
 
+def _normalize_rows(matrix) -> np.ndarray:
+    """L2-normalize each row of a matrix as float32"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
 def is_greeting_only(query: str) -> bool:
     """
     Check if query is just a greeting without a question
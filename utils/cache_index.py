@@ -0,0 +1,107 @@
+"""
+FAISS-backed index for the dynamic semantic cache
+Exact inner-product search while small, HNSW once the cache grows past a threshold
+"""
+
+import faiss
+import numpy as np
+from typing import Optional, Tuple
+from config import (
+    SEMANTIC_CACHE_HNSW_THRESHOLD,
+    SEMANTIC_CACHE_HNSW_M,
+    SEMANTIC_CACHE_HNSW_EF_SEARCH,
+    logger
+)
+
+
+class FaissCacheIndex:
+    """Maps dynamic cache entries to FAISS ids and answers nearest-neighbour lookups"""
+
+    def __init__(self, dimension, hnsw_threshold=SEMANTIC_CACHE_HNSW_THRESHOLD,
+                 hnsw_m=SEMANTIC_CACHE_HNSW_M, ef_search=SEMANTIC_CACHE_HNSW_EF_SEARCH):
+        """
+        Args:
+            dimension: Embedding dimension
+            hnsw_threshold: Live entry count at which the flat index is migrated to HNSW
+            hnsw_m: HNSW graph degree
+            ef_search: HNSW search breadth (higher = better recall, slower)
+        """
+        self.dimension = dimension
+        self.hnsw_threshold = hnsw_threshold
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+
+        self._next_id = 0
+        self._live_ids = set()
+        # HNSW can't delete, so removed ids are tombstoned until the next compaction
+        self._tombstones = set()
+        self.is_hnsw = False
+        self.index = self._new_flat_index()
+
+    def __len__(self):
+        return len(self._live_ids)
+
+    def _new_flat_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+
+    def _new_hnsw_index(self):
+        hnsw = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efSearch = self.ef_search
+        return faiss.IndexIDMap2(hnsw)
+
+    def add(self, vector: np.ndarray) -> int:
+        """Add a normalized vector and return the id it is stored under"""
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self.index.add_with_ids(
+            np.asarray(vector, dtype=np.float32).reshape(1, -1),
+            np.array([entry_id], dtype=np.int64)
+        )
+        self._live_ids.add(entry_id)
+
+        if not self.is_hnsw and len(self._live_ids) >= self.hnsw_threshold:
+            self._rebuild(hnsw=True)
+
+        return entry_id
+
+    def remove(self, entry_id: int):
+        """Remove an entry (physically for flat, tombstoned for HNSW)"""
+        self._live_ids.discard(entry_id)
+
+        if not self.is_hnsw:
+            self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+            return
+
+        self._tombstones.add(entry_id)
+        # Compact once dead entries make up a sizeable share of the graph
+        if len(self._tombstones) > max(64, len(self._live_ids) // 10):
+            self._rebuild(hnsw=len(self._live_ids) >= self.hnsw_threshold)
+
+    def search(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """Return the id and inner product of the closest live entry (or None, 0.0)"""
+        if not self._live_ids:
+            return None, 0.0
+
+        # Ask for enough neighbours to see past tombstones
+        k = min(self.index.ntotal, 1 + len(self._tombstones), 64)
+        scores, ids = self.index.search(np.asarray(vector, dtype=np.float32).reshape(1, -1), k)
+
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id in self._live_ids:
+                return int(entry_id), float(score)
+        return None, 0.0
+
+    def _rebuild(self, hnsw: bool):
+        """Re-create the index from its live vectors, optionally switching to HNSW"""
+        ids = faiss.vector_to_array(self.index.id_map)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        keep = np.isin(ids, np.fromiter(self._live_ids, dtype=np.int64, count=len(self._live_ids)))
+
+        self.index = self._new_hnsw_index() if hnsw else self._new_flat_index()
+        if keep.any():
+            self.index.add_with_ids(vectors[keep], ids[keep])
+
+        self.is_hnsw = hnsw
+        self._tombstones.clear()
+        logger.info(f"🔁 Rebuilt semantic cache index ({'HNSW' if hnsw else 'flat'}, {len(self._live_ids)} entries)")
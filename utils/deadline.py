@@ -0,0 +1,69 @@
+"""
+Per-request deadlines
+One Deadline travels with a request through retrieval and generation; every stage sizes
+its own timeout to the time that is left instead of running its full configured timeout
+"""
+
+import math
+import time
+from typing import Optional
+from config import REQUEST_DEADLINE, REQUEST_DEADLINE_MAX
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget runs out before a stage can finish"""
+
+
+class Deadline:
+    """The moment (monotonic clock) by which a request must be answered"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """Whether the budget is spent"""
+        return self.remaining() <= 0
+
+    def cap(self, timeout: float) -> float:
+        """The shorter of timeout and the time left"""
+        return min(timeout, self.remaining())
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if there is no time left for stage"""
+        if self.expired():
+            raise DeadlineExceeded(f"{self.seconds:.1f}s request deadline passed before {stage}")
+
+
+def request_deadline(seconds: Optional[float] = None) -> Optional[Deadline]:
+    """
+    Deadline for a new request
+
+    Args:
+        seconds: Requested budget (e.g. from the X-Request-Timeout header), capped at
+            REQUEST_DEADLINE_MAX; None, non-positive or non-finite (nan, inf) uses REQUEST_DEADLINE
+
+    Returns:
+        The deadline, or None when deadlines are disabled (REQUEST_DEADLINE = 0)
+    """
+    # nan compares false both ways, so it must be rejected before any comparison
+    if seconds is None or not math.isfinite(seconds) or seconds <= 0:
+        seconds = REQUEST_DEADLINE
+    elif REQUEST_DEADLINE_MAX > 0:
+        seconds = min(seconds, REQUEST_DEADLINE_MAX)
+    return Deadline(seconds) if seconds > 0 else None
+
+
+def cap_timeout(deadline: Optional[Deadline], timeout: float) -> float:
+    """timeout shortened to the deadline's remaining time (unchanged without a deadline)"""
+    return timeout if deadline is None else deadline.cap(timeout)
+
+
+def check_deadline(deadline: Optional[Deadline], stage: str):
+    """Raise DeadlineExceeded if deadline has passed (no-op without a deadline)"""
+    if deadline is not None:
+        deadline.check(stage)
@@ -0,0 +1,94 @@
+"""
+Request-scoped embedding reuse
+Makes sure each distinct string is embedded at most once per request,
+backed by a small process-wide LRU of recent results
+"""
+
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import EMBEDDING_LRU_SIZE
+from utils.embedding_registry import LazyEmbeddingModel, get_embedding_model
+
+
+class EmbeddingLRU:
+    """Thread-safe bounded LRU of text -> embedding vectors"""
+
+    def __init__(self, maxsize: int = EMBEDDING_LRU_SIZE):
+        """Initialize an empty LRU holding at most `maxsize` vectors"""
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[np.ndarray]:
+        """Return the cached vector for `key`, or None"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: Tuple, vector: np.ndarray):
+        """Store a vector, evicting the least recently used entry if full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """Get LRU statistics"""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_recent_embeddings = EmbeddingLRU()
+
+
+def get_embedding_lru() -> EmbeddingLRU:
+    """Get the process-wide LRU of recent embeddings"""
+    return _recent_embeddings
+
+
+class EmbeddingContext:
+    """Per-request memo of embeddings, threaded through cache lookup, search and cache insert"""
+
+    def __init__(self, model: Optional[LazyEmbeddingModel] = None, lru: Optional[EmbeddingLRU] = None):
+        """
+        Args:
+            model: Embedding model to use (defaults to the shared registry model)
+            lru: Process-wide LRU to consult before encoding (defaults to the shared one)
+        """
+        self.model = model or get_embedding_model()
+        self.lru = lru if lru is not None else _recent_embeddings
+        self._vectors: Dict[str, np.ndarray] = {}
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Get the L2-normalized float32 embedding of `text`
+
+        The returned array is shared and read-only; copy it before modifying in place.
+        """
+        vector = self._vectors.get(text)
+        if vector is not None:
+            return vector
+
+        key = (self.model.model_name, self.model.device, text)
+        vector = self.lru.get(key)
+        if vector is None:
+            vector = np.asarray(self.model.encode([text])[0], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+            vector.flags.writeable = False
+            self.lru.put(key, vector)
+
+        self._vectors[text] = vector
+        return vector
@@ -0,0 +1,97 @@
+"""
+Process-wide registry of sentence embedding models
+Every component shares one lazily loaded copy of each model per process
+"""
+
+import threading
+from typing import Dict, Tuple
+from config import EMBEDDING_MODEL, EMBEDDING_DEVICE, logger
+
+
+class LazyEmbeddingModel:
+    """Thin wrapper that loads a SentenceTransformer on first use"""
+
+    def __init__(self, model_name: str, device: str):
+        """Remember what to load without touching the weights yet"""
+        self.model_name = model_name
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the underlying model has been loaded"""
+        return self._model is not None
+
+    @property
+    def model(self):
+        """The underlying SentenceTransformer, loaded on first access"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    # Imported here so processes that never embed don't pay for torch
+                    from sentence_transformers import SentenceTransformer
+
+                    logger.info(f"🔄 Loading embedding model '{self.model_name}' on {self.device}...")
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+                    logger.info(f"✅ Embedding model loaded ({self.memory_footprint() / 1024 / 1024:.1f} MB)")
+        return self._model
+
+    def encode(self, *args, **kwargs):
+        """Encode text(s) with the shared model"""
+        return self.model.encode(*args, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """Dimension of the vectors produced by the model"""
+        return self.model.get_sentence_embedding_dimension()
+
+    def memory_footprint(self) -> int:
+        """Approximate bytes held by the model weights and buffers (0 if not loaded)"""
+        if self._model is None:
+            return 0
+
+        total = 0
+        for tensor in list(self._model.parameters()) + list(self._model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
+
+
+_registry: Dict[Tuple[str, str], LazyEmbeddingModel] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL, device: str = EMBEDDING_DEVICE) -> LazyEmbeddingModel:
+    """
+    Get the shared embedding model for a (model name, device) pair
+
+    Args:
+        model_name: SentenceTransformer model name or path
+        device: Torch device the model runs on (e.g. "cpu", "cuda")
+
+    Returns:
+        Lazily loaded model shared by every caller in this process
+    """
+    key = (model_name, device)
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = LazyEmbeddingModel(model_name, device)
+        return _registry[key]
+
+
+def get_registry_stats() -> Dict:
+    """Report which models are registered, loaded, and how much memory they hold"""
+    with _registry_lock:
+        models = list(_registry.values())
+
+    return {
+        "models": [
+            {
+                "model": m.model_name,
+                "device": m.device,
+                "loaded": m.is_loaded,
+                "memory_mb": round(m.memory_footprint() / 1024 / 1024, 1)
+            }
+            for m in models
+        ],
+        "total_memory_mb": round(sum(m.memory_footprint() for m in models) / 1024 / 1024, 1)
+    }
@@ -0,0 +1,53 @@
+"""
+Shared thread pools for CPU-bound pipeline stages
+Keeps embedding, FAISS search and cache work off the asyncio event loop
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import CPU_EXECUTOR_WORKERS, RETRIEVAL_EXECUTOR_WORKERS
+
+_executor = None
+# Separate pool for retriever fan-out: its callers may already be running on the CPU pool,
+# and waiting on tasks queued behind themselves there could deadlock
+_retrieval_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """Get the process-wide bounded executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="boku-cpu")
+    return _executor
+
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """Get the process-wide executor used to run retrievers concurrently"""
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        with _executor_lock:
+            if _retrieval_executor is None:
+                _retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_EXECUTOR_WORKERS, thread_name_prefix="boku-retrieval")
+    return _retrieval_executor
+
+
+async def run_in_cpu_executor(func, *args, **kwargs):
+    """Run a blocking function on the shared executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors():
+    """Stop the shared executors (called on application shutdown)"""
+    global _executor, _retrieval_executor
+    with _executor_lock:
+        for executor in (_executor, _retrieval_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        _executor = None
+        _retrieval_executor = None
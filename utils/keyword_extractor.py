@@ -26,19 +26,9 @@ def extract_keywords(text):
     ]
 
 
-def calculate_keyword_score(query_words, document_keywords, document_text):
-    """Calculate keyword match score between query and document"""
-    # Extract words from document text
-    doc_words = set(re.findall(r'\b[a-zA-Z0-9]+\b', document_text.lower()))
-    
-    # Calculate keyword matches (weighted higher)
-    keyword_matches = len(query_words.intersection(set(document_keywords)))
-    
-    # Calculate general word matches
-    word_matches = len(query_words.intersection(doc_words))
-    
-    # Weighted score: keywords are more important than general words
-    return keyword_matches * 2 + word_matches * 1
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens (keeps repeats, for term frequencies)"""
+    return re.findall(r'\b[a-zA-Z0-9]+\b', text.lower())
 
 
 def normalize_query(query):
@@ -0,0 +1,111 @@
+"""
+Persistent tier for the semantic cache
+SQLite store shared by every worker on a host, so learned answers survive restarts
+"""
+
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import List, Optional, Tuple
+from config import (
+    EMBEDDING_MODEL,
+    SEMANTIC_CACHE_DB_PATH,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    logger
+)
+
+# How many writes between expiry/size trims
+_TRIM_EVERY = 64
+
+
+class PersistentCacheStore:
+    """Query/embedding/response rows in SQLite (WAL mode, safe for concurrent workers)"""
+
+    def __init__(self, path=SEMANTIC_CACHE_DB_PATH, ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES, model_name=EMBEDDING_MODEL, namespace=None):
+        """
+        Args:
+            path: SQLite database file
+            ttl_seconds: Lifetime of an entry (0 keeps entries until trimmed by size)
+            max_entries: Maximum rows kept per host, oldest are dropped first
+            model_name: Embedding model the stored vectors belong to
+            namespace: Extra key separating entries (e.g. the knowledge base version)
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self.set_namespace(namespace)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL,
+                UNIQUE(model, query)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_semantic_cache_expires ON semantic_cache(expires_at)")
+
+        logger.info(f"✅ Persistent semantic cache at {path}")
+
+    def set_namespace(self, namespace: Optional[str]):
+        """Switch which entries are read and written; rows are keyed by model and namespace"""
+        self._key = f"{self.model_name}@{namespace}" if namespace else self.model_name
+
+    def put(self, query: str, embedding: np.ndarray, response: str) -> Optional[float]:
+        """Insert or replace an entry and return its expiry timestamp (None if it never expires)"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds > 0 else None
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO semantic_cache (model, query, embedding, response, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key, query, np.asarray(embedding, dtype=np.float32).tobytes(), response, now, expires_at)
+            )
+            self._writes += 1
+            if self._writes % _TRIM_EVERY == 0:
+                self._trim(now)
+
+        return expires_at
+
+    def load_since(self, last_id: int) -> List[Tuple[int, str, np.ndarray, str, Optional[float]]]:
+        """Unexpired entries written (by any worker) after `last_id`, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, query, embedding, response, expires_at FROM semantic_cache "
+                "WHERE id > ? AND model = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY id",
+                (last_id, self._key, time.time())
+            ).fetchall()
+
+        return [
+            (row_id, query, np.frombuffer(blob, dtype=np.float32), response, expires_at)
+            for row_id, query, blob, response, expires_at in rows
+        ]
+
+    def _trim(self, now: float):
+        """Drop expired rows, then the oldest rows beyond max_entries"""
+        self._conn.execute("DELETE FROM semantic_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM semantic_cache WHERE id IN "
+            "(SELECT id FROM semantic_cache ORDER BY id DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
@@ -3,6 +3,15 @@ Query expansion utilities for better search results
 Optimized and consolidated
 """
 
+# Document categories (metadata "category") that can answer each query intent
+INTENT_CATEGORIES = {
+    'work': ['experience'],
+    'projects': ['projects', 'achievements', 'awards'],
+    'skills': ['skills', 'certifications', 'languages'],
+    'education': ['education', 'certifications'],
+    'contact': ['contact', 'summary']
+}
+
 def expand_query(query, history=None):
     """Expand query with synonyms and related terms for better search"""
     query_lower = query.lower()
@@ -112,4 +121,12 @@ def classify_query_intent(query):
     elif any(word in query_lower for word in ['contact', 'email', 'phone', 'reach', 'location']):
         return 'contact'
     else:
-        return 'general'
\ No newline at end of file
+        return 'general'
+
+
+def intent_filters(intent):
+    """Metadata filters for a query intent, or None when the intent does not narrow the search"""
+    categories = INTENT_CATEGORIES.get(intent)
+    if not categories:
+        return None
+    return {'category': categories}
@@ -0,0 +1,140 @@
+"""
+Single-flight request coalescing
+Concurrent requests for the same question share one in-flight answer instead of each
+running retrieval and an upstream call
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from config import SINGLE_FLIGHT_WAIT_TIMEOUT, logger
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase words only, so case, spacing and punctuation differences coalesce"""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def history_scope(history: List[Dict]) -> Optional[str]:
+    """
+    Fingerprint of a conversation history for flight scopes (None when there is none)
+
+    The history shapes query expansion and the prompt, so only requests with the same
+    history may share an answer
+    """
+    if not history:
+        return None
+    return hashlib.sha256(json.dumps(history, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One in-flight answer that followers can wait on from threads or coroutines"""
+
+    def __init__(self, key: str, embedding: Optional[np.ndarray], scope: Hashable):
+        self.key = key
+        self.embedding = embedding
+        self.scope = scope
+        self.followers = 0
+        self.future = Future()
+
+    def result(self, timeout: float = SINGLE_FLIGHT_WAIT_TIMEOUT):
+        """Block until the leader finishes; None if it failed or took longer than timeout"""
+        try:
+            return self.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.warning(f"⏳ Coalesced request waited {timeout}s for its leader, answering on its own")
+            return None
+
+    async def async_result(self, timeout: float = SINGLE_FLIGHT_WAIT_TIMEOUT):
+        """Await the leader's answer; None if it failed or took longer than timeout"""
+        try:
+            # Shielded so a timed-out follower doesn't cancel the result for everyone else
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.future)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏳ Coalesced request waited {timeout}s for its leader, answering on its own")
+            return None
+
+
+class SingleFlight:
+    """Registry of in-flight questions matched by normalized text or embedding similarity"""
+
+    def __init__(self, similarity_threshold: float = 0.85):
+        """
+        Args:
+            similarity_threshold: Minimum cosine similarity for two questions to share an answer
+                (the semantic cache threshold, so coalescing never merges what the cache wouldn't)
+        """
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._by_key: Dict[Tuple[Hashable, str], Flight] = {}
+        self._flights: List[Flight] = []
+        self._led = 0
+        self._coalesced = 0
+
+    def join(self, text: str, embedding: Optional[np.ndarray] = None, scope: Hashable = None) -> Tuple[Flight, bool]:
+        """
+        Find or start the flight for a question
+
+        Args:
+            text: The question
+            embedding: Its L2-normalized embedding (None matches on text only)
+            scope: Flights only match within one scope (e.g. the knowledge base version)
+
+        Returns:
+            (flight, is_leader); the leader must call complete() when done, followers wait on the flight
+        """
+        key = normalize_question(text)
+        with self._lock:
+            flight = self._by_key.get((scope, key)) or self._similar(embedding, scope)
+            if flight is not None:
+                flight.followers += 1
+                self._coalesced += 1
+                logger.info(f"🔗 Coalesced with an in-flight request ({flight.followers} waiting)")
+                return flight, False
+
+            flight = Flight(key, embedding, scope)
+            self._by_key[(scope, key)] = flight
+            self._flights.append(flight)
+            self._led += 1
+            return flight, True
+
+    def _similar(self, embedding: Optional[np.ndarray], scope: Hashable) -> Optional[Flight]:
+        """Most similar in-flight question above the threshold (caller holds the lock)"""
+        if embedding is None:
+            return None
+        best, best_similarity = None, self.similarity_threshold
+        for flight in self._flights:
+            if flight.embedding is None or flight.scope != scope:
+                continue
+            similarity = float(np.dot(flight.embedding, embedding))
+            if similarity >= best_similarity:
+                best, best_similarity = flight, similarity
+        return best
+
+    def complete(self, flight: Flight, result=None):
+        """
+        Publish the leader's answer and retire the flight
+
+        A result of None (the leader failed or was abandoned) sends followers to answer on their own
+        """
+        with self._lock:
+            if self._by_key.get((flight.scope, flight.key)) is flight:
+                del self._by_key[(flight.scope, flight.key)]
+            self._flights.remove(flight)
+        flight.future.set_result(result)
+
+    def get_stats(self) -> Dict:
+        """Get coalescing statistics"""
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "led": self._led,
+                "coalesced": self._coalesced
+            }